@@ -0,0 +1,35 @@
+from dataclasses import dataclass
+from typing import Tuple
+
+
+@dataclass
+class AugmentationSettings:
+    """Ranges from which the parameters of each augmented variant
+    are drawn uniformly"""
+
+    rotation_deg: Tuple[float, float] = (-1.0, 1.0)
+    """Rotation around the image center"""
+
+    scale: Tuple[float, float] = (0.97, 1.03)
+    """Scaling around the image center"""
+
+    shift: Tuple[float, float] = (-0.02, 0.02)
+    """Translation, as a fraction of the image width and height"""
+
+    contrast: Tuple[float, float] = (0.7, 1.1)
+    """Multiplies the deviations from the mean intensity of the image"""
+
+    brightness: Tuple[float, float] = (-20.0, 20.0)
+    """Added to the intensity (0-255)"""
+
+    tint: Tuple[float, float] = (0.92, 1.05)
+    """Multiplies each color channel independently (background tint)"""
+
+    noise_std: Tuple[float, float] = (0.0, 8.0)
+    """Standard deviation of the gaussian noise (0-255)"""
+
+    blur_sigma: Tuple[float, float] = (0.0, 1.2)
+    """Sigma of the gaussian blur in pixels, small values do no blur"""
+
+    jpeg_quality: Tuple[int, int] = (30, 95)
+    """Quality of the JPEG compression the variant goes through"""
@@ -0,0 +1,93 @@
+from typing import List
+
+import cv2
+import numpy as np
+
+from .AugmentationSettings import AugmentationSettings
+
+
+def augment_variants(
+    bitmap: np.ndarray,
+    seeds: List[int],
+    settings: AugmentationSettings
+) -> np.ndarray:
+    """Produces one augmented variant of the bitmap for each seed,
+    returns them as a (variants, height, width, 3) BGR uint8 batch,
+    or a (variants, height, width) batch for a grayscale bitmap.
+
+    The photometric changes (contrast, brightness, tint and noise) run
+    as vectorized operations over the whole batch, the geometric jitter,
+    blur and JPEG compression run in cv2 per variant. A variant depends
+    only on its seed, not on the other variants in the batch.
+    """
+    if bitmap.ndim == 3 and bitmap.shape[2] == 4:
+        bitmap = cv2.cvtColor(bitmap, cv2.COLOR_BGRA2BGR)
+    grayscale = bitmap.ndim == 2
+    channels = 1 if grayscale else 3
+    height, width = bitmap.shape[:2]
+    count = len(seeds)
+    if count == 0:
+        return np.zeros((0,) + bitmap.shape, dtype=np.uint8)
+
+    # draw all the parameters of a variant from its own generator
+    rngs = [np.random.default_rng(seed) for seed in seeds]
+    def draw(low_high, size=None) -> np.ndarray:
+        return np.array([rng.uniform(*low_high, size=size) for rng in rngs])
+    rotation = draw(settings.rotation_deg)
+    scale = draw(settings.scale)
+    shift = draw(settings.shift, size=2) * np.array([width, height])
+    contrast = draw(settings.contrast)
+    brightness = draw(settings.brightness)
+    tint = draw(settings.tint, size=3)
+    noise_std = draw(settings.noise_std)
+    blur_sigma = draw(settings.blur_sigma)
+    jpeg_quality = np.array([
+        rng.integers(settings.jpeg_quality[0], settings.jpeg_quality[1] + 1)
+        for rng in rngs
+    ])
+    noise = np.stack([
+        rng.standard_normal((height, width, 1), dtype=np.float32)
+        for rng in rngs
+    ])
+
+    # small affine jitter, the uncovered border repeats the edge pixels
+    batch = np.empty((count, height, width, channels), dtype=np.float32)
+    for i in range(count):
+        matrix = cv2.getRotationMatrix2D(
+            (width / 2, height / 2), rotation[i], scale[i]
+        )
+        matrix[:, 2] += shift[i]
+        batch[i] = cv2.warpAffine(
+            bitmap, matrix, (width, height),
+            flags=cv2.INTER_LINEAR,
+            borderMode=cv2.BORDER_REPLICATE
+        ).reshape(height, width, channels)
+
+    # photometric changes over the whole batch,
+    # gray images are tinted by the mean of the channel factors
+    if grayscale:
+        tint = tint.mean(axis=1, keepdims=True)
+    means = batch.mean(axis=(1, 2, 3), keepdims=True)
+    batch -= means
+    batch *= contrast[:, None, None, None].astype(np.float32)
+    batch += means + brightness[:, None, None, None].astype(np.float32)
+    batch *= tint[:, None, None, :].astype(np.float32)
+    batch += noise * noise_std[:, None, None, None].astype(np.float32)
+    variants = np.clip(batch, 0, 255).astype(np.uint8)
+
+    # blur and compression artifacts
+    for i in range(count):
+        if blur_sigma[i] >= 0.3:
+            variants[i] = cv2.GaussianBlur(
+                variants[i], (0, 0), sigmaX=blur_sigma[i]
+            ).reshape(height, width, channels)
+        success, buffer = cv2.imencode(
+            ".jpg", variants[i],
+            [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality[i])]
+        )
+        assert success, "Could not compress the variant"
+        variants[i] = cv2.imdecode(
+            buffer, cv2.IMREAD_UNCHANGED
+        ).reshape(height, width, channels)
+
+    return variants[..., 0] if grayscale else variants
@@ -0,0 +1,19 @@
+import hashlib
+from typing import Optional
+
+
+def derive_augmentation_seed(
+    page_seed: int,
+    staff_index: Optional[int],
+    variant_index: int,
+    view_index: int = 0
+) -> int:
+    """Derives the seed of an augmented variant of the page (or of one
+    of its staves) from the seed the page was rendered with"""
+    sample = "page" if staff_index is None else "s" + str(staff_index)
+    if view_index > 0:
+        sample = "v" + str(view_index) + "/" + sample
+    digest = hashlib.sha256(
+        f"{page_seed}/augment/{sample}/{variant_index}".encode("utf-8")
+    ).digest()
+    return int.from_bytes(digest[:8], "big")
@@ -0,0 +1,83 @@
+import time
+from pathlib import Path
+from typing import Dict
+
+from .primus.PrimusContainer import PrimusContainer
+from .primus.start_primus_musicxml_iterator import \
+    start_primus_musicxml_iterator
+from .semantic.group_musicxml_incipits_by_page import \
+    group_musicxml_incipits_by_page
+from .semantic.plan_pages_from_measure_counts import \
+    plan_pages_from_measure_counts
+from .semantic.pull_page_from_musicxml_iterator import (SPLICE_ENGINES,
+                                                        assemble_page_content)
+
+
+def benchmark_page_assembly(
+    primus_tgz_path: Path,
+    primus_container_folder: Path,
+    tmp_folder: Path,
+    musescore_cache_folder: Path,
+    page_count: int,
+    seed: int = 42
+):
+    """Times the assembly of planned pages with each splice engine
+    and checks that the engines produce the same kern"""
+
+    container = PrimusContainer(primus_container_folder)
+    planned_pages = plan_pages_from_measure_counts(
+        measure_counts=container.measure_counts,
+        seed=seed
+    )[:page_count]
+
+    primus_musicxml_iterator = start_primus_musicxml_iterator(
+        primus_tgz_path=primus_tgz_path,
+        tmp_folder=tmp_folder,
+        musescore_batch_size=100,
+        primus_container_folder=primus_container_folder,
+        musescore_cache_folder=musescore_cache_folder,
+        incipit_ids=[
+            incipit_id
+            for page in planned_pages
+            for incipit_id in page.incipit_ids
+        ]
+    )
+    pages = list(group_musicxml_incipits_by_page(
+        primus_musicxml_iterator=primus_musicxml_iterator,
+        planned_pages=planned_pages
+    ))
+
+    seconds: Dict[str, float] = {engine: 0.0 for engine in SPLICE_ENGINES}
+    matching_kern = 0
+    for planned_page, incipits in pages:
+        kerns: Dict[str, str] = {}
+        for engine in SPLICE_ENGINES:
+            start_time = time.perf_counter()
+            page_content = assemble_page_content(
+                incipits=incipits,
+                page_layout=planned_page.layout,
+                splice_engine=engine
+            )
+            seconds[engine] += time.perf_counter() - start_time
+            kerns[engine] = page_content.kern
+        if len(set(kerns.values())) == 1:
+            matching_kern += 1
+
+    print("Assembled pages:", len(pages))
+    for engine in SPLICE_ENGINES:
+        ms_per_page = seconds[engine] / max(len(pages), 1) * 1000
+        print(f"Engine {engine}: {ms_per_page:.1f} ms/page")
+    print("Pages with identical kern:", matching_kern)
+
+
+# .venv/bin/python3 -m app.benchmark_page_assembly
+if __name__ == "__main__":
+    from .config import (MUSESCORE_CACHE_FOLDER, PRIMUS_CONTAINER_FOLDER,
+                         PRIMUS_TGZ_PATH, TMP_FOLDER)
+    benchmark_page_assembly(
+        primus_tgz_path=PRIMUS_TGZ_PATH,
+        primus_container_folder=PRIMUS_CONTAINER_FOLDER,
+        tmp_folder=TMP_FOLDER,
+        musescore_cache_folder=MUSESCORE_CACHE_FOLDER,
+        page_count=100
+    )
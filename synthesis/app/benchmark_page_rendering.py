@@ -0,0 +1,157 @@
+import multiprocessing
+import random
+import resource
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import smashcima as sc
+
+from .primus.PrimusContainer import PrimusContainer
+from .primus.start_primus_musicxml_iterator import \
+    start_primus_musicxml_iterator
+from .semantic.group_musicxml_incipits_by_page import \
+    group_musicxml_incipits_by_page
+from .semantic.plan_pages_from_measure_counts import \
+    plan_pages_from_measure_counts
+from .semantic.pull_page_from_musicxml_iterator import assemble_page_content
+from .synthesis.ModelC import ModelC
+from .synthesis.ModelM import ModelM
+from .synthesis.RenderProfile import RenderProfile
+
+
+MODEL_CLASSES = {"M": ModelM, "C": ModelC}
+
+
+def benchmark_page_rendering(
+    primus_tgz_path: Path,
+    primus_container_folder: Path,
+    tmp_folder: Path,
+    musescore_cache_folder: Path,
+    page_count: int,
+    dataset_domain: str = "C",
+    seed: int = 42
+):
+    """Times the synthesis and rendering of the pages of a domain with
+    the most staves, with the render profile of the model and with the
+    legacy one (paper in the layout DPI, glyphs in the asset DPI).
+    The paper sprite is reported to check the paper DPI of each profile
+    (a pre-generated texture bank is resampled to it).
+    Each profile runs in a fresh process, so that its peak memory
+    is measured separately."""
+    model_class = MODEL_CLASSES[dataset_domain]
+    container = PrimusContainer(primus_container_folder)
+    planned_pages = [
+        page for page in plan_pages_from_measure_counts(
+            measure_counts=container.measure_counts,
+            seed=seed
+        )
+        if page.dataset_domain == dataset_domain
+    ]
+    planned_pages.sort(
+        key=lambda page: len(page.layout.measures_per_staff),
+        reverse=True
+    )
+    planned_pages = planned_pages[:page_count]
+
+    primus_musicxml_iterator = start_primus_musicxml_iterator(
+        primus_tgz_path=primus_tgz_path,
+        tmp_folder=tmp_folder,
+        musescore_batch_size=100,
+        primus_container_folder=primus_container_folder,
+        musescore_cache_folder=musescore_cache_folder,
+        incipit_ids=[
+            incipit_id
+            for page in planned_pages
+            for incipit_id in page.incipit_ids
+        ]
+    )
+    musicxmls = [
+        assemble_page_content(
+            incipits=incipits,
+            page_layout=planned_page.layout
+        ).musicxml
+        for planned_page, incipits in group_musicxml_incipits_by_page(
+            primus_musicxml_iterator=primus_musicxml_iterator,
+            planned_pages=planned_pages
+        )
+    ]
+    print("Pages:", len(musicxmls), "with staves:", sorted(set(
+        len(page.layout.measures_per_staff) for page in planned_pages
+    )))
+
+    profiles = {
+        "legacy": RenderProfile(
+            dpi=model_class.RENDER_PROFILE.dpi,
+            paper_dpi=model_class.DPI,
+            sprite_dpi=None
+        ),
+        "current": model_class.RENDER_PROFILE
+    }
+    for name, profile in profiles.items():
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            stats = pool.apply(
+                _render_pages, (dataset_domain, profile, musicxmls, seed)
+            )
+        pages = max(len(musicxmls), 1)
+        print(
+            f"Profile {name} {profile}:\n"
+            f"    synthesis {stats['synthesis_seconds'] / pages * 1000:.1f}"
+            f" ms/page, render {stats['render_seconds'] / pages * 1000:.1f}"
+            f" ms/page, peak RSS {stats['peak_rss_kib'] / 1024:.0f} MiB,"
+            f" bitmap {stats['bitmap_shape']},"
+            f" paper {stats['paper_shape']} at {stats['paper_dpi']:.0f} DPI"
+        )
+
+
+def _render_pages(
+    dataset_domain: str,
+    profile: RenderProfile,
+    musicxmls: List[str],
+    seed: int
+) -> Dict[str, Any]:
+    """Renders the pages in the current (fresh) process"""
+    model = MODEL_CLASSES[dataset_domain](
+        random.Random(seed), render_profile=profile
+    )
+    synthesis_seconds = 0.0
+    render_seconds = 0.0
+    bitmap_shape: Tuple[int, ...] = ()
+    paper: Optional[sc.Sprite] = None
+    for musicxml in musicxmls:
+        start_time = time.perf_counter()
+        scene = model(data=musicxml, format=".musicxml")
+        synthesis_seconds += time.perf_counter() - start_time
+
+        # the paper is the largest sprite of the page
+        paper = max(
+            (sprite for sprite, _ in sc.Sprite.traverse_sprites(
+                scene.pages[0].space
+            )),
+            key=lambda sprite: sprite.bitmap.size
+        )
+
+        start_time = time.perf_counter()
+        bitmap_shape = scene.render(scene.pages[0]).shape
+        render_seconds += time.perf_counter() - start_time
+    return {
+        "synthesis_seconds": synthesis_seconds,
+        "render_seconds": render_seconds,
+        "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "bitmap_shape": bitmap_shape,
+        "paper_shape": paper.bitmap.shape if paper is not None else (),
+        "paper_dpi": paper.dpi if paper is not None else 0.0
+    }
+
+
+# .venv/bin/python3 -m app.benchmark_page_rendering
+if __name__ == "__main__":
+    from .config import (MUSESCORE_CACHE_FOLDER, PRIMUS_CONTAINER_FOLDER,
+                         PRIMUS_TGZ_PATH, TMP_FOLDER)
+    benchmark_page_rendering(
+        primus_tgz_path=PRIMUS_TGZ_PATH,
+        primus_container_folder=PRIMUS_CONTAINER_FOLDER,
+        tmp_folder=TMP_FOLDER,
+        musescore_cache_folder=MUSESCORE_CACHE_FOLDER,
+        page_count=20
+    )
@@ -1,49 +1,223 @@
 import csv
+import dataclasses
+import functools
 import hashlib
 import itertools
+import json
 import logging
+import os
 import random
+import time
 import traceback
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Any, Callable, Iterable, List, Optional
+from typing import (Any, Callable, Dict, List, Mapping, Optional,
+                    TextIO, Tuple)
 
-import cv2
 import numpy as np
 import smashcima as sc
 
-from .kern.slice_kern_measures import slice_kern_measures
+from .augmentation.augment_variants import augment_variants
+from .augmentation.AugmentationSettings import AugmentationSettings
+from .augmentation.derive_augmentation_seed import derive_augmentation_seed
+from .kern.count_kern_tokens import count_kern_tokens
+from .kern.KernDocument import KernDocument
+from .kern.KernVocabulary import KernVocabulary
+from .kern.tokenize_skern import tokenize_skern
+from .output.AsyncFileWriter import AsyncFileWriter
+from .output.BufferingFileWriter import BufferingFileWriter
+from .output.LabelArrays import LabelArrays
+from .output.SampleManifest import SampleManifest
+from .output.ShardWriter import ShardWriter, sample_key
+from .pipeline.PipelineStage import PipelineStage
+from .pipeline.StreamingPipeline import StreamingPipeline
+from .synthesis.derive_page_seed import derive_page_seed
 from .synthesis.ModelC import ModelC
 from .synthesis.ModelM import ModelM
-from .primus.start_primus_musicxml_iterator import \
-    start_primus_musicxml_iterator
+from .primus.index_measure_counts import index_measure_counts
+from .primus.ingest_primus import ingest_primus
+from .primus.PrimusContainer import PrimusContainer
+from .primus.Quarantine import Quarantine
+from .primus.start_primus_musicxml_iterator import (
+    MusicXmlIncipit, start_primus_musicxml_iterator)
 from .semantic.PageContent import PageContent
-from .semantic.PageLayout import PageLayout
-from .semantic.pull_page_from_musicxml_iterator import \
-    pull_page_from_musicxml_iterator
+from .semantic.group_musicxml_incipits_by_page import \
+    group_musicxml_incipits_by_page
+from .semantic.plan_pages_from_measure_counts import (
+    plan_pages_from_measure_counts, wasted_measures)
+from .semantic.PlannedPage import PlannedPage
+from .semantic.pull_page_from_musicxml_iterator import assemble_page_content
+from .stages.stage_fingerprints import (crude_musicxml_fingerprint,
+                                        kern_fragment_fingerprint,
+                                        page_content_fingerprint,
+                                        page_plan_fingerprint,
+                                        refined_musicxml_fingerprint,
+                                        rendered_fingerprint)
+from .stages.StageStore import StageStore
+
+
+# the whole page plan is stored as one record under this key
+PAGE_PLAN_KEY = "plan"
+
+# how the samples are stored in the output folder, either as individual
+# files or packed into tar shards (see ShardWriter and ShardReader)
+OUTPUT_BACKENDS = ["files", "shards"]
 
 
 def build_synthetic_dataset(
     primus_tgz_path: Path,
+    primus_container_folder: Path,
+    musescore_cache_folder: Path,
+    quarantine_path: Path,
+    stages_folder: Path,
     tmp_folder: Path,
-    output_folder: Path
+    output_folder: Path,
+    seed: int = 42,
+    synthesis_workers: int = 0,
+    assembly_workers: int = 1,
+    output_backend: str = "files",
+    vocabulary_path: Optional[Path] = None,
+    augmented_variants: int = 0,
+    augmentation: Optional[AugmentationSettings] = None,
+    page_views: int = 1,
+    grayscale: bool = False
 ):
-    rng = random.Random(42)
+    """Builds the synthetic dataset in stages: ingest, crude MusicXML,
+    refined MusicXML, page plan, page content and rendered samples.
+
+    Each stage materializes its outputs in the stages folder, together with
+    a fingerprint of its version and settings. A rerun resumes from the last
+    completed unit of each stage and a change in a stage (e.g. the render
+    settings of a model) only re-runs that stage and the ones after it.
+
+    Each page is rendered with random generators seeded from the master
+    seed and the page identifier. With a positive number of synthesis
+    workers, pages are rendered in a pool of processes (each with its own
+    models) and the results are merged in the plan order, so the output
+    is the same for any number of workers.
+
+    The incipit conversion, page assembly, rendering and writing of
+    the results run as a streaming pipeline with bounded queues between
+    the stages, the queue depths are printed at the end.
+
+    With the "shards" output backend, the samples are packed into tar
+    shards in the "shards" folder (one set of shards for the pages and
+    one for the staves of each domain) instead of individual files.
+    The CSV files list the same paths for both backends, with shards
+    they are the names of the shard members.
+
+    Given a vocabulary path, the kern of the samples is also written
+    as integer label arrays (in the manifest order), with the vocabulary
+    extended by any new tokens.
+
+    With augmented variants, each page and staff sample is followed
+    by that many augmented copies of its image (sharing its kern file),
+    produced right after rendering with seeds derived from the page seed.
+
+    With more page views, each synthesized page is rendered that many
+    times, under differently sampled page transforms (tilt and shift),
+    and the staves are cropped from each view. The layout and glyphs
+    are synthesized only once.
+
+    In the grayscale mode, the pages are rendered as single-channel
+    bitmaps and all the images (crops and augmented variants included)
+    stay single-channel, down to the written JPEG files.
+    """
+    assert output_backend in OUTPUT_BACKENDS
+    assert page_views >= 1
+    augmentation = augmentation or AugmentationSettings()
+    augmentation_fingerprint = None
+    if augmented_variants > 0:
+        augmentation_fingerprint = {
+            "variants": augmented_variants,
+            "settings": dataclasses.asdict(augmentation)
+        }
+
+    # one-time conversion of the tgz archive into a random-access container
+    if not PrimusContainer.is_ingested(primus_container_folder):
+        ingest_primus(
+            primus_tgz_path=primus_tgz_path,
+            container_folder=primus_container_folder
+        )
+    if not PrimusContainer.has_measure_counts(primus_container_folder):
+        index_measure_counts(primus_container_folder)
+    measure_counts = PrimusContainer(primus_container_folder).measure_counts
+    
+    # materialized outputs of the stages
+    crude_store = StageStore(
+        stages_folder / "crude_musicxml",
+        crude_musicxml_fingerprint()
+    )
+    refined_store = StageStore(
+        stages_folder / "refined_musicxml",
+        refined_musicxml_fingerprint()
+    )
+    kern_fragment_store = StageStore(
+        stages_folder / "kern_fragments",
+        kern_fragment_fingerprint()
+    )
+    plan_store = StageStore(
+        stages_folder / "page_plan",
+        page_plan_fingerprint(seed, measure_counts)
+    )
+    content_store = StageStore(
+        stages_folder / "page_content",
+        page_content_fingerprint(seed, measure_counts)
+    )
+    rendered_stores = {
+        "M": StageStore(
+            stages_folder / "rendered_M",
+            rendered_fingerprint(
+                ModelM, seed, measure_counts,
+                output_backend, augmentation_fingerprint, page_views,
+                grayscale
+            )
+        ),
+        "C": StageStore(
+            stages_folder / "rendered_C",
+            rendered_fingerprint(
+                ModelC, seed, measure_counts,
+                output_backend, augmentation_fingerprint, page_views,
+                grayscale
+            )
+        ),
+    }
     
-    M_model = ModelM(rng)
-    C_model = ModelC(rng)
+    # plan all the pages up front, then process only the unrendered ones
+    planned_pages = _load_page_plan(
+        plan_store=plan_store,
+        measure_counts=measure_counts,
+        seed=seed,
+        quarantine_path=quarantine_path
+    )
+    planned_pages = [
+        page for page in planned_pages
+        if page.identifier not in rendered_stores[page.dataset_domain]
+    ]
 
-    # iterate over primus incipits in MusicXML form
+    # iterate over primus incipits in MusicXML form, in the plan order
     primus_musicxml_iterator = start_primus_musicxml_iterator(
         primus_tgz_path=primus_tgz_path,
         tmp_folder=tmp_folder,
         musescore_batch_size=100,
-        with_tqdm=True
+        with_tqdm=True,
+        primus_container_folder=primus_container_folder,
+        mei_conversion_workers=os.cpu_count() or 0,
+        musescore_cache_folder=musescore_cache_folder,
+        musescore_workers=os.cpu_count() or 1,
+        quarantine_path=quarantine_path,
+        auto_tune_batch_size=True,
+        crude_store=crude_store,
+        refined_store=refined_store,
+        incipit_ids=[
+            incipit_id
+            for page in planned_pages
+            for incipit_id in page.incipit_ids
+        ]
     )
 
-    # slice the stream to only selected incipits
-    # primus_musicxml_iterator = itertools.islice(
-    #     primus_musicxml_iterator, 10
-    # )
+    # slice the stream to only selected pages
+    # planned_pages = planned_pages[:10]
 
     # open all the output CSV files (pages and staves for both domains)
     output_folder.mkdir(parents=True, exist_ok=True)
@@ -51,64 +225,448 @@ def build_synthetic_dataset(
         open(output_folder / "M_staves_all.csv", "w") as M_staves_csv_file, \
         open(output_folder / "C_pages_all.csv", "w") as C_pages_csv_file, \
         open(output_folder / "C_staves_all.csv", "w") as C_staves_csv_file:
-        M_pages_csv = csv.writer(M_pages_csv_file)
-        M_staves_csv = csv.writer(M_staves_csv_file)
-        C_pages_csv = csv.writer(C_pages_csv_file)
-        C_staves_csv = csv.writer(C_staves_csv_file)
-
-        # until incipits get exhausted
-        while True:
-            dataset_domain = rng.choice(["C", "M"])
-            
-            page_layout = (
-                PageLayout.sample_M_domain(rng)
-                if dataset_domain == "M"
-                else PageLayout.sample_C_domain(rng)
-            )
+        csv_files = {
+            "M": (M_pages_csv_file, M_staves_csv_file),
+            "C": (C_pages_csv_file, C_staves_csv_file),
+        }
+        csv_writers = {
+            domain: (csv.writer(pages_file), csv.writer(staves_file))
+            for domain, (pages_file, staves_file) in csv_files.items()
+        }
 
-            try:
-                page_content = pull_page_from_musicxml_iterator(
-                    primus_musicxml_iterator=primus_musicxml_iterator,
-                    page_layout=page_layout
+        # shards of the pages and of the staves of each domain
+        shard_writers: Optional[Dict[str, Tuple[ShardWriter, ShardWriter]]] \
+            = None
+        if output_backend == "shards":
+            shard_writers = {
+                domain: (
+                    ShardWriter(output_folder / "shards" / (domain + "_pages")),
+                    ShardWriter(output_folder / "shards" / (domain + "_staves"))
                 )
-            except:
-                logging.exception("Error loading page content:")
-                continue
+                for domain in csv_files.keys()
+            }
 
-            if page_content is None:
-                break
+        # restore rows of the pages rendered by previous runs
+        for domain, rendered_store in rendered_stores.items():
+            pages_csv, staves_csv = csv_writers[domain]
+            for _, rendered in rendered_store.items():
+                pages_csv.writerows(rendered["pages"])
+                staves_csv.writerows(rendered["staves"])
 
-            try:
-                use_M = (dataset_domain == "M")
-                synthesize_page(
-                    dataset_domain=dataset_domain,
-                    page_content=page_content,
+        # assembly and rendering overlap with the incipit conversion
+        # (and with each other), the rows are written in the plan order
+        pipeline = StreamingPipeline([
+            PipelineStage(
+                name="assemble",
+                function=functools.partial(
+                    _assemble_page,
+                    content_store=content_store,
+                    kern_fragment_store=kern_fragment_store
+                ),
+                workers=assembly_workers,
+                queue_size=2 * max(synthesis_workers, 1)
+            ),
+            PipelineStage(
+                name="render",
+                function=functools.partial(
+                    _render_page,
                     output_folder=output_folder,
-                    pages_csv_writerow=(
-                        M_pages_csv.writerow
-                        if use_M else C_pages_csv.writerow
-                    ),
-                    staves_csv_writerow=(
-                        M_staves_csv.writerow
-                        if use_M else C_staves_csv.writerow
-                    ),
-                    model=(M_model if use_M else C_model),
-                    rng=rng
+                    seed=seed,
+                    output_backend=output_backend,
+                    augmented_variants=augmented_variants,
+                    augmentation=augmentation,
+                    page_views=page_views,
+                    grayscale=grayscale
+                ),
+                workers=max(synthesis_workers, 1),
+                kind="process" if synthesis_workers > 0 else "thread",
+                initializer=_init_synthesis_process,
+                initargs=(seed, grayscale)
+            ),
+        ])
+        for planned_page, rendered, files in pipeline.run(
+            group_musicxml_incipits_by_page(
+                primus_musicxml_iterator=primus_musicxml_iterator,
+                planned_pages=planned_pages
+            )
+        ):
+            if shard_writers is not None:
+                _write_page_to_shards(
+                    rendered, files,
+                    shard_writers[planned_page.dataset_domain], output_folder
                 )
-            except:
-                logging.exception("Error around synthesis somewhere:")
+            _complete_page(
+                planned_page, rendered,
+                csv_writers, csv_files, rendered_stores
+            )
+        print(pipeline.stats())
+
+        if shard_writers is not None:
+            for pages_shards, staves_shards in shard_writers.values():
+                pages_shards.close()
+                staves_shards.close()
+    
+    # the manifests cover all the rendered pages, including earlier runs
+    for domain, rendered_store in rendered_stores.items():
+        _write_manifests(domain, rendered_store, output_folder)
+
+    # the vocabulary is saved before the labels that use its new tokens
+    if vocabulary_path is not None:
+        vocabulary = KernVocabulary.load_or_create(vocabulary_path)
+        encoded_labels = {
+            name: encoded
+            for domain, rendered_store in rendered_stores.items()
+            for name, encoded in _encode_labels(
+                domain, rendered_store, content_store, vocabulary
+            ).items()
+        }
+        vocabulary.save(vocabulary_path)
+        for name, (keys, sequences) in encoded_labels.items():
+            LabelArrays.from_sequences(
+                keys, sequences, vocabulary.version
+            ).save(output_folder, name)
+
+    for store in [crude_store, refined_store, kern_fragment_store,
+                  plan_store, content_store, *rendered_stores.values()]:
+        store.close()
+
+
+def _write_manifests(
+    dataset_domain: str,
+    rendered_store: StageStore,
+    output_folder: Path
+):
+    """Writes the columnar manifests of the pages and of the staves
+    of a domain, next to the CSV files, and the geometry of the pages
+    (a JSON line for each page in the manifest, null for crashed pages)"""
+    page_samples: List[Dict[str, Any]] = []
+    staff_samples: List[Dict[str, Any]] = []
+    geometry_path = output_folder / (dataset_domain + "_pages_all.geometry.jsonl")
+    tmp_geometry_path = geometry_path.with_name(geometry_path.name + ".tmp")
+    with open(tmp_geometry_path, "w") as geometry_file:
+        for _, rendered in rendered_store.items():
+            page_samples += rendered["page_samples"]
+            staff_samples += rendered["staff_samples"]
+            for page_sample in rendered["page_samples"]:
+                geometry = None
+                if not page_sample["crashed"] \
+                    and page_sample["variant_index"] == 0:
+                    geometry = rendered["geometries"][page_sample["view_index"]]
+                geometry_file.write(json.dumps({
+                    "page_identifier": page_sample["page_identifier"],
+                    "view_index": page_sample["view_index"],
+                    "image_path": page_sample["image_path"],
+                    "kern_path": page_sample["kern_path"],
+                    "geometry": geometry
+                }) + "\n")
+    os.replace(tmp_geometry_path, geometry_path)
+    SampleManifest.from_records(page_samples).save(
+        output_folder / (dataset_domain + "_pages_all.npz")
+    )
+    SampleManifest.from_records(staff_samples).save(
+        output_folder / (dataset_domain + "_staves_all.npz")
+    )
+
+
+def _encode_labels(
+    dataset_domain: str,
+    rendered_store: StageStore,
+    content_store: StageStore,
+    vocabulary: KernVocabulary
+) -> Dict[str, Tuple[List[str], List[np.ndarray]]]:
+    """Encodes the kern of the page and staff samples of a domain
+    (the staff kern is sliced from the page kern by the measure range),
+    returns the kern paths and label sequences by the split name"""
+    keys: Dict[str, List[str]] = {"pages": [], "staves": []}
+    sequences: Dict[str, List[np.ndarray]] = {"pages": [], "staves": []}
+    for page_identifier, rendered in rendered_store.items():
+        page_kern = content_store.get(page_identifier)["kern"]
+        for sample in rendered["page_samples"]:
+            keys["pages"].append(sample["kern_path"])
+            sequences["pages"].append(
+                vocabulary.encode(tokenize_skern(page_kern), extend=True)
+            )
+
+        kern_document = KernDocument.from_kern(page_kern)
+        for sample in rendered["staff_samples"]:
+            staff_kern = kern_document.slice_measures(
+                start_measure_index=sample["start_measure"],
+                end_measure_index=sample["end_measure"]
+            )
+            keys["staves"].append(sample["kern_path"])
+            sequences["staves"].append(
+                vocabulary.encode(tokenize_skern(staff_kern), extend=True)
+            )
+
+    return {
+        dataset_domain + "_" + kind + "_all": (keys[kind], sequences[kind])
+        for kind in ["pages", "staves"]
+    }
+
+
+def _write_page_to_shards(
+    rendered: Dict[str, Any],
+    files: Dict[str, bytes],
+    shard_writers: Tuple[ShardWriter, ShardWriter],
+    output_folder: Path
+):
+    """Packs the files of a rendered page into the page and staff shards
+    (in the plan order, so the shards do not depend on the number of
+    workers), files that belong to no sample (crash reports) are written
+    to the output folder"""
+    files = dict(files)
+    pages_shards, staves_shards = shard_writers
+    for samples, shards in [
+        (rendered["page_samples"], pages_shards),
+        (rendered["staff_samples"], staves_shards)
+    ]:
+        for sample in samples:
+            if sample["crashed"]:
                 continue
+            key = sample_key(sample["image_path"])
+            # augmented variants share the kern file of their original
+            members = {
+                ".jpg": files.pop(sample["image_path"]),
+                ".krn": files[sample["kern_path"]]
+            }
+            if key in shards:
+                continue # packed by a run that was interrupted afterwards
+            shards.add_sample(key, members, metadata=sample)
+
+    for samples in [rendered["page_samples"], rendered["staff_samples"]]:
+        for sample in samples:
+            files.pop(sample["kern_path"], None)
+    for name, data in files.items():
+        path = output_folder / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+
+def _complete_page(
+    planned_page: PlannedPage,
+    rendered: Dict[str, Any],
+    csv_writers: Dict[str, Tuple[Any, Any]],
+    csv_files: Dict[str, Tuple[TextIO, TextIO]],
+    rendered_stores: Dict[str, StageStore]
+):
+    """Writes the CSV rows of a rendered page and remembers the page"""
+    dataset_domain = planned_page.dataset_domain
+    pages_csv, staves_csv = csv_writers[dataset_domain]
+    pages_csv.writerows(rendered["pages"])
+    staves_csv.writerows(rendered["staves"])
+    for csv_file in csv_files[dataset_domain]:
+        csv_file.flush()
+    rendered_stores[dataset_domain].put(planned_page.identifier, rendered)
+
+
+# random generator and models of the current process
+# (the main process or a synthesis worker), created on first use
+_process_rng: Optional[random.Random] = None
+_process_models: Dict[str, sc.orchestration.BaseHandwrittenModel] = {}
+_process_writers: Dict[str, AsyncFileWriter] = {}
+
+
+def _init_synthesis_process(seed: int, grayscale: bool = False):
+    global _process_rng
+    _process_rng = random.Random(seed)
+    _process_writers["files"] = AsyncFileWriter()
+    _process_writers["shards"] = BufferingFileWriter()
+    _process_models["M"] = ModelM(_process_rng, render_profile=(
+        dataclasses.replace(ModelM.RENDER_PROFILE, grayscale=grayscale)
+    ))
+    _process_models["C"] = ModelC(_process_rng, render_profile=(
+        dataclasses.replace(ModelC.RENDER_PROFILE, grayscale=grayscale)
+    ))
+
+
+def _assemble_page(
+    item: Tuple[PlannedPage, List[MusicXmlIncipit]],
+    content_store: StageStore,
+    kern_fragment_store: StageStore
+) -> Tuple[PlannedPage, PageContent]:
+    """Pipeline stage that assembles the content of a planned page"""
+    planned_page, incipits = item
+    page_content = _load_page_content(
+        planned_page=planned_page,
+        incipits=incipits,
+        content_store=content_store,
+        kern_fragment_store=kern_fragment_store
+    )
+
+    # only the parts needed for rendering go to the next stage
+    return planned_page, dataclasses.replace(
+        page_content,
+        incipits=[],
+        music21_score=None
+    )
+
+
+def _render_page(
+    item: Tuple[PlannedPage, PageContent],
+    output_folder: Path,
+    seed: int,
+    output_backend: str,
+    augmented_variants: int,
+    augmentation: AugmentationSettings,
+    page_views: int,
+    grayscale: bool
+) -> Tuple[PlannedPage, Dict[str, Any], Dict[str, bytes]]:
+    """Pipeline stage that renders a page with the models of the current
+    process, returns the record of the rendered page (sample records and
+    CSV rows) and, with the "shards" backend, the encoded files
+    (by their path relative to the output)"""
+    planned_page, page_content = item
+    if _process_rng is None:
+        _init_synthesis_process(seed, grayscale)
+    assert _process_rng is not None
+    writer = _process_writers[output_backend]
+    if isinstance(writer, BufferingFileWriter):
+        writer.take_files() # leftovers of a page whose rendering failed
+
+    # the models share the process generator, re-seed it for the page
+    page_seed = derive_page_seed(seed, page_content.identifier)
+    _process_rng.seed(page_seed)
+    np.random.seed(page_seed % (2 ** 32))
+
+    page_samples: List[Dict[str, Any]] = []
+    staff_samples: List[Dict[str, Any]] = []
+    page_geometries: List[Dict[str, Any]] = []
+    start_time = time.perf_counter()
+    synthesize_page(
+        dataset_domain=planned_page.dataset_domain,
+        page_content=page_content,
+        output_folder=output_folder,
+        page_samples_append=page_samples.append,
+        staff_samples_append=staff_samples.append,
+        page_geometry_append=page_geometries.append,
+        model=_process_models[planned_page.dataset_domain],
+        rng=_process_rng,
+        writer=writer,
+        page_seed=page_seed,
+        augmented_variants=augmented_variants,
+        augmentation=augmentation,
+        page_views=page_views
+    )
+    page_seconds = time.perf_counter() - start_time
+
+    # metadata shared by all the samples of the page
+    for sample in page_samples + staff_samples:
+        sample.update({
+            "dataset_domain": planned_page.dataset_domain,
+            "page_identifier": planned_page.identifier,
+            "incipit_ids": planned_page.incipit_ids,
+            "measures_per_staff": planned_page.layout.measures_per_staff,
+            "page_seed": page_seed,
+            "page_seconds": page_seconds
+        })
+    crashed = any(sample["crashed"] for sample in page_samples)
+    rendered = {
+        "pages": [
+            [sample["image_path"], sample["kern_path"]]
+            for sample in page_samples if not crashed
+        ],
+        "staves": [
+            [sample["image_path"], sample["kern_path"]]
+            for sample in staff_samples
+        ],
+        "crashed": crashed,
+        "page_samples": page_samples,
+        "staff_samples": staff_samples,
+        "geometries": page_geometries # one for each view
+    }
+
+    files: Dict[str, bytes] = {}
+    if isinstance(writer, BufferingFileWriter):
+        files = {
+            path.relative_to(output_folder).as_posix(): data
+            for path, data in writer.take_files().items()
+        }
+    return planned_page, rendered, files
+
+
+def _load_page_plan(
+    plan_store: StageStore,
+    measure_counts: Mapping[str, int],
+    seed: int,
+    quarantine_path: Path
+) -> List[PlannedPage]:
+    """Plans the pages, or loads the plan made by a previous run,
+    so that incipits quarantined since then do not shift the plan"""
+    if PAGE_PLAN_KEY in plan_store:
+        return [
+            PlannedPage.from_record(record)
+            for record in plan_store.get(PAGE_PLAN_KEY)
+        ]
+    
+    planned_pages = plan_pages_from_measure_counts(
+        measure_counts=measure_counts,
+        seed=seed,
+        excluded_incipit_ids=Quarantine(quarantine_path)
+    )
+    print("Planned pages:", len(planned_pages))
+    print("Wasted measures:", wasted_measures(planned_pages, measure_counts))
+
+    # the whole plan is a single record, so it is stored atomically
+    plan_store.put(PAGE_PLAN_KEY, [page.to_record() for page in planned_pages])
+    return planned_pages
+
+
+def _load_page_content(
+    planned_page: PlannedPage,
+    incipits: List[MusicXmlIncipit],
+    content_store: StageStore,
+    kern_fragment_store: StageStore
+) -> PageContent:
+    """Assembles the content of a planned page,
+    or loads it if it has been assembled by a previous run"""
+    if planned_page.identifier in content_store:
+        record = content_store.get(planned_page.identifier)
+        return PageContent(
+            identifier=planned_page.identifier,
+            layout=planned_page.layout,
+            incipits=incipits,
+            music21_score=None,
+            musicxml=record["musicxml"],
+            kern=record["kern"]
+        )
+
+    page_content = assemble_page_content(
+        incipits=incipits,
+        page_layout=planned_page.layout,
+        kern_fragment_store=kern_fragment_store
+    )
+    page_content.identifier = planned_page.identifier
+    content_store.put(planned_page.identifier, {
+        "musicxml": page_content.musicxml,
+        "kern": page_content.kern
+    })
+    return page_content
 
 
 def synthesize_page(
     dataset_domain: str,
     page_content: PageContent,
     output_folder: Path,
-    pages_csv_writerow: Callable[[Iterable[Any]], None],
-    staves_csv_writerow: Callable[[Iterable[Any]], None],
+    page_samples_append: Callable[[Dict[str, Any]], None],
+    staff_samples_append: Callable[[Dict[str, Any]], None],
+    page_geometry_append: Callable[[Dict[str, Any]], None],
     model: sc.orchestration.BaseHandwrittenModel,
-    rng: random.Random
+    rng: random.Random,
+    writer: AsyncFileWriter,
+    page_seed: int = 0,
+    augmented_variants: int = 0,
+    augmentation: Optional[AugmentationSettings] = None,
+    page_views: int = 1
 ):
+    """Renders the page and writes the page and staff samples,
+    the sample records are emitted only once all the files are written
+    (a crashed page emits a page record with no files). The geometry
+    of the staves and measures in the page bitmap is emitted as well.
+
+    With more page views, the synthesized scene is rendered again under
+    newly sampled page transforms (see the resample_page_view method
+    of the models), each view has its own page and staff samples
+    and geometry, the kern files are shared with the first view."""
     page_kern_path = file_path(
         output_folder=output_folder,
         dataset_domain=dataset_domain,
@@ -116,72 +674,170 @@ def synthesize_page(
         staff_index=None,
         format="krn",
     )
-    page_jpg_path = file_path(
-        output_folder=output_folder,
-        dataset_domain=dataset_domain,
-        page_identifier=page_content.identifier,
-        staff_index=None,
-        format="jpg",
-    )
     crashed_musicxml_path = (
         output_folder / "crashed_musicxml" / (
             page_content.identifier + ".musicxml"
         )
     )
 
-    # create folders
-    page_kern_path.parent.mkdir(parents=True, exist_ok=True)
-    page_jpg_path.parent.mkdir(parents=True, exist_ok=True)
-    crashed_musicxml_path.parent.mkdir(parents=True, exist_ok=True)
+    # index the measures once for all the staves
+    kern_document = KernDocument.from_kern(page_content.kern)
+    page_sample: Dict[str, Any] = {
+        "image_path": "",
+        "kern_path": "",
+        "staff_index": -1,
+        "view_index": 0,
+        "variant_index": 0,
+        "augmentation_seed": 0,
+        "crashed": True,
+        "image_width": 0,
+        "image_height": 0,
+        "start_measure": 0,
+        "end_measure": kern_document.measure_count - 1,
+        "staff_count": 0,
+        "kern_token_count": count_kern_tokens(page_content.kern),
+        "synthesis_seconds": 0.0,
+        "render_seconds": 0.0
+    }
 
     # synthesis
     try:
+        start_time = time.perf_counter()
         scene = model(
             data=page_content.musicxml,
             format=".musicxml"
         )
         assert len(scene.pages) == 1, "Expected only one page"
         scene_page = scene.pages[0]
+        page_sample["synthesis_seconds"] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
         page_bitmap = scene.render(scene_page)
+        page_sample["render_seconds"] = time.perf_counter() - start_time
 
     # handle synthesis crash
     except Exception as e:
         logging.exception("Synthesis crash:")
-        with open(crashed_musicxml_path, "w") as f:
-            f.write(page_content.musicxml)
-        with open(crashed_musicxml_path.with_suffix(".log"), "w") as f:
-            print('{}: {}'.format(type(e).__name__, e), file=f)
-            print("".join(traceback.format_exception(
-                type(e), e, e.__traceback__
-            )), file=f)
+        writer.wait([
+            writer.write_text(crashed_musicxml_path, page_content.musicxml),
+            writer.write_text(
+                crashed_musicxml_path.with_suffix(".log"),
+                '{}: {}\n'.format(type(e).__name__, e) + "".join(
+                    traceback.format_exception(type(e), e, e.__traceback__)
+                ) + "\n"
+            )
+        ])
+        page_samples_append(page_sample)
         return
 
-    # store the bitmap for the file
-    cv2.imwrite(str(page_jpg_path), page_bitmap)
+    # the files are encoded and written in the background
+    written: List[Future] = [
+        writer.write_text(page_kern_path, page_content.kern)
+    ]
+    page_samples: List[Dict[str, Any]] = []
+    staff_samples: List[Dict[str, Any]] = []
+    page_geometries: List[Dict[str, Any]] = []
 
-    # store the kern output for the file
-    with open(page_kern_path, "w") as f:
-        f.write(page_content.kern)
-    
-    # write CSV page record
-    pages_csv_writerow([
-        str(page_jpg_path.relative_to(output_folder)),
-        str(page_kern_path.relative_to(output_folder))
-    ])
-
-    for staff_index, staff in enumerate(scene_page.staves):
-        extract_staff_sample(
-            staff=staff,
-            staff_index=staff_index,
-            page_bitmap=page_bitmap,
-            page_content=page_content,
-            scene_page=scene_page,
-            part_measures=scene.score.parts[0].measures,
+    for view_index in range(page_views):
+        # only the rasterization is repeated for the further views,
+        # the staves are cropped before the next transform is sampled
+        if view_index > 0:
+            model.resample_page_view(scene)
+            start_time = time.perf_counter()
+            page_bitmap = scene.render(scene_page)
+            page_sample["render_seconds"] = time.perf_counter() - start_time
+
+        page_jpg_path = file_path(
             output_folder=output_folder,
             dataset_domain=dataset_domain,
-            staves_csv_writerow=staves_csv_writerow,
-            rng=rng
+            page_identifier=page_content.identifier,
+            staff_index=None,
+            format="jpg",
+            view_index=view_index
         )
+        written.append(writer.write_image(page_jpg_path, page_bitmap))
+        page_variants = write_augmented_variants(
+            bitmap=page_bitmap,
+            page_identifier=page_content.identifier,
+            staff_index=None,
+            view_index=view_index,
+            page_seed=page_seed,
+            augmented_variants=augmented_variants,
+            augmentation=augmentation,
+            output_folder=output_folder,
+            dataset_domain=dataset_domain,
+            writer=writer,
+            written=written
+        )
+        view_staff_samples: List[Dict[str, Any]] = []
+        staff_geometries: List[Dict[str, Any]] = []
+
+        for staff_index, staff in enumerate(scene_page.staves):
+            extract_staff_sample(
+                staff=staff,
+                staff_index=staff_index,
+                page_bitmap=page_bitmap,
+                page_content=page_content,
+                kern_document=kern_document,
+                scene_page=scene_page,
+                part_measures=scene.score.parts[0].measures,
+                output_folder=output_folder,
+                dataset_domain=dataset_domain,
+                staff_samples_append=view_staff_samples.append,
+                staff_geometry_append=staff_geometries.append,
+                rng=rng,
+                writer=writer,
+                written=written,
+                page_seed=page_seed,
+                augmented_variants=augmented_variants,
+                augmentation=augmentation,
+                view_index=view_index
+            )
+
+        view_page_sample = {
+            **page_sample,
+            "image_path": str(page_jpg_path.relative_to(output_folder)),
+            "kern_path": str(page_kern_path.relative_to(output_folder)),
+            "view_index": view_index,
+            "crashed": False,
+            "image_width": page_bitmap.shape[1],
+            "image_height": page_bitmap.shape[0],
+            "staff_count": sum(
+                1 for staff_sample in view_staff_samples
+                if staff_sample["variant_index"] == 0
+            )
+        }
+        page_samples.append(view_page_sample)
+        for page_variant in page_variants:
+            page_samples.append({**view_page_sample, **page_variant})
+        for staff_sample in view_staff_samples:
+            # the timings are those of the whole page (and view)
+            staff_sample.update({
+                "staff_count": view_page_sample["staff_count"],
+                "synthesis_seconds": page_sample["synthesis_seconds"],
+                "render_seconds": page_sample["render_seconds"]
+            })
+            staff_samples.append(staff_sample)
+        view_box = scene_page.view_box.rectangle
+        page_geometries.append({
+            "view_box": [
+                view_box.x, view_box.y, view_box.width, view_box.height
+            ],
+            "pixels_per_unit": _pixels_per_unit(scene_page, page_bitmap),
+            "page_transform": _page_transform(scene_page),
+            "image_width": page_bitmap.shape[1],
+            "image_height": page_bitmap.shape[0],
+            "staves": staff_geometries
+        })
+    
+    # emit the sample records, once the files they point to exist
+    writer.wait(written)
+    for sample in page_samples:
+        page_samples_append(sample)
+    for geometry in page_geometries:
+        page_geometry_append(geometry)
+    for sample in staff_samples:
+        staff_samples_append(sample)
 
 
 def extract_staff_sample(
@@ -189,19 +845,50 @@ def extract_staff_sample(
     staff_index: int,
     page_bitmap: np.ndarray,
     page_content: PageContent,
+    kern_document: KernDocument,
     scene_page: sc.Page,
     part_measures: List[sc.Measure],
     output_folder: Path,
     dataset_domain: str,
-    staves_csv_writerow: Callable[[Iterable[Any]], None],
-    rng: random.Random
+    staff_samples_append: Callable[[Dict[str, Any]], None],
+    staff_geometry_append: Callable[[Dict[str, Any]], None],
+    rng: random.Random,
+    writer: AsyncFileWriter,
+    written: List[Future],
+    page_seed: int = 0,
+    augmented_variants: int = 0,
+    augmentation: Optional[AugmentationSettings] = None,
+    view_index: int = 0
 ):
     # extract measure range
-    measure_indices = list(sorted(
-        part_measures.index(staff_measure.measure)
+    staff_measures = sorted((
+        (part_measures.index(staff_measure.measure), staff_measure)
         for staff_measure
         in sc.StaffMeasure.many_of_staff_visual(staff)
-    ))
+    ), key=lambda pair: pair[0])
+    measure_indices = [index for index, _ in staff_measures]
+
+    # remember the geometry, so that crops can be re-derived later
+    staff_bbox = staff.glyph.region.get_bbox_in_space(scene_page.space)
+    staff_geometry: Dict[str, Any] = {
+        "staff_index": staff_index,
+        "staff_height": staff.staff_height * _pixels_per_unit(
+            scene_page, page_bitmap
+        ),
+        "bbox": _pixel_bbox(staff_bbox, scene_page, page_bitmap),
+        "crop_box": None,
+        "measures": [
+            {
+                "measure_index": index,
+                "bbox": _pixel_bbox(
+                    staff_measure.region.get_bbox_in_space(scene_page.space),
+                    scene_page, page_bitmap
+                )
+            }
+            for index, staff_measure in staff_measures
+        ]
+    }
+    staff_geometry_append(staff_geometry)
 
     if len(measure_indices) == 0:
         return # no measures on this staff, ignore it
@@ -212,7 +899,6 @@ def extract_staff_sample(
         == measure_indices, "Measure indicies are not continous"
     
     # compute the bitmap crop box
-    staff_bbox = staff.glyph.region.get_bbox_in_space(scene_page.space)
     dilate_by = staff.staff_height * rng.uniform(0.6, 1.0)
     dilated_box = staff_bbox.dilate(dilate_by)
     dilated_box.y += staff.staff_height * rng.uniform(-0.5, 0.1)
@@ -223,15 +909,16 @@ def extract_staff_sample(
             sc.Rectangle(0, 0, page_bitmap.shape[1], page_bitmap.shape[0])
         ) \
         .snap_shrink()
+    staff_geometry["crop_box"] = [
+        pixels_box.left, pixels_box.top, pixels_box.right, pixels_box.bottom
+    ]
     
     # crop out data
     staff_bitmap = page_bitmap[
         int(pixels_box.top):int(pixels_box.bottom),
-        int(pixels_box.left):int(pixels_box.right),
-        :
+        int(pixels_box.left):int(pixels_box.right)
     ]
-    staff_kern = slice_kern_measures(
-        kern=page_content.kern,
+    staff_kern = kern_document.slice_measures(
         start_measure_index=start_measure_index,
         end_measure_index=end_measure_index
     )
@@ -250,21 +937,120 @@ def extract_staff_sample(
         page_identifier=page_content.identifier,
         staff_index=staff_index,
         format="jpg",
+        view_index=view_index
     )
 
-    staff_kern_path.parent.mkdir(exist_ok=True, parents=True)
-    staff_jpg_path.parent.mkdir(exist_ok=True, parents=True)
+    # further views of the page share the kern of the first one
+    written.append(writer.write_image(staff_jpg_path, staff_bitmap))
+    if view_index == 0:
+        written.append(writer.write_text(staff_kern_path, staff_kern))
 
-    cv2.imwrite(str(staff_jpg_path), staff_bitmap)
+    staff_sample = {
+        "image_path": str(staff_jpg_path.relative_to(output_folder)),
+        "kern_path": str(staff_kern_path.relative_to(output_folder)),
+        "staff_index": staff_index,
+        "view_index": view_index,
+        "variant_index": 0,
+        "augmentation_seed": 0,
+        "crashed": False,
+        "image_width": staff_bitmap.shape[1],
+        "image_height": staff_bitmap.shape[0],
+        "start_measure": start_measure_index,
+        "end_measure": end_measure_index,
+        "kern_token_count": count_kern_tokens(staff_kern)
+    }
+    staff_samples_append(staff_sample)
+    for staff_variant in write_augmented_variants(
+        bitmap=staff_bitmap,
+        page_identifier=page_content.identifier,
+        staff_index=staff_index,
+        view_index=view_index,
+        page_seed=page_seed,
+        augmented_variants=augmented_variants,
+        augmentation=augmentation,
+        output_folder=output_folder,
+        dataset_domain=dataset_domain,
+        writer=writer,
+        written=written
+    ):
+        staff_samples_append({**staff_sample, **staff_variant})
 
-    with open(staff_kern_path, "w") as f:
-        f.write(staff_kern)
 
-    # write to CSV
-    staves_csv_writerow([
-        str(staff_jpg_path.relative_to(output_folder)),
-        str(staff_kern_path.relative_to(output_folder))
-    ])
+def write_augmented_variants(
+    bitmap: np.ndarray,
+    page_identifier: str,
+    staff_index: Optional[int],
+    view_index: int,
+    page_seed: int,
+    augmented_variants: int,
+    augmentation: Optional[AugmentationSettings],
+    output_folder: Path,
+    dataset_domain: str,
+    writer: AsyncFileWriter,
+    written: List[Future]
+) -> List[Dict[str, Any]]:
+    """Writes the augmented variants of a page or staff image, returns
+    the fields in which their sample records differ from the original"""
+    if augmented_variants == 0:
+        return []
+    seeds = [
+        derive_augmentation_seed(
+            page_seed, staff_index, variant_index, view_index
+        )
+        for variant_index in range(1, augmented_variants + 1)
+    ]
+    variants = augment_variants(
+        bitmap, seeds, augmentation or AugmentationSettings()
+    )
+
+    variant_fields: List[Dict[str, Any]] = []
+    for i, (variant_seed, variant_bitmap) in enumerate(zip(seeds, variants)):
+        variant_jpg_path = file_path(
+            output_folder=output_folder,
+            dataset_domain=dataset_domain,
+            page_identifier=page_identifier,
+            staff_index=staff_index,
+            format="jpg",
+            variant_index=i + 1,
+            view_index=view_index
+        )
+        written.append(writer.write_image(variant_jpg_path, variant_bitmap))
+        variant_fields.append({
+            "image_path": str(variant_jpg_path.relative_to(output_folder)),
+            "variant_index": i + 1,
+            "augmentation_seed": variant_seed
+        })
+    return variant_fields
+
+
+def _pixels_per_unit(scene_page: sc.Page, page_bitmap: np.ndarray) -> float:
+    """Scale from the page space units to the page bitmap pixels"""
+    return page_bitmap.shape[1] / scene_page.view_box.rectangle.width
+
+
+def _page_transform(scene_page: sc.Page) -> List[List[float]]:
+    """The 2x3 affine matrix of the sampled page tilt and shift, from
+    the laid-out page space to the space of the view box"""
+    (original_page_space,) = scene_page.space.get_children()
+    return original_page_space.transform.matrix.tolist()
+
+
+def _pixel_bbox(
+    rectangle: sc.Rectangle,
+    scene_page: sc.Page,
+    page_bitmap: np.ndarray
+) -> List[float]:
+    """Converts a rectangle in the page space into a [left, top, right,
+    bottom] box in the page bitmap pixels"""
+    box = rectangle \
+        .relativize_to(scene_page.view_box.rectangle) \
+        .absolutize_to(
+            sc.Rectangle(0, 0, page_bitmap.shape[1], page_bitmap.shape[0])
+        )
+    return [
+        round(box.left, 2), round(box.top, 2),
+        round(box.right, 2), round(box.bottom, 2)
+    ]
 
 
 def file_path(
@@ -273,6 +1059,8 @@ def file_path(
     page_identifier: str,
     staff_index: Optional[int],
     format: str,
+    variant_index: int = 0,
+    view_index: int = 0
 ) -> Path:
     bucket_count = 10
     identifier_hash_sum = sum(
@@ -281,22 +1069,42 @@ def file_path(
     id_hash = str(identifier_hash_sum % bucket_count).zfill(2)
     
     page_or_staff = "page" if staff_index is None else "staff"
+
+    # further views of the page (re-rendered under another transform)
+    view_number = ""
+    if view_index > 0:
+        view_number = "_v" + str(view_index)
     
     staff_number = ""
     if staff_index is not None:
-        staff_number = "_s" + str(staff_number)
+        staff_number = "_s" + str(staff_index)
+
+    # augmented variants of the image
+    variant_number = ""
+    if variant_index > 0:
+        variant_number = "_a" + str(variant_index)
 
     return (
-        output_folder / dataset_domain / page_or_staff /
-        id_hash / (page_identifier + staff_number + "." + format)
+        output_folder / dataset_domain / page_or_staff / id_hash /
+        (page_identifier + view_number + staff_number + variant_number
+            + "." + format)
     )
 
 
 # .venv/bin/python3 -m app.build_synthetic_dataset
 if __name__ == "__main__":
-    from .config import FMT_SYNTHETIC, PRIMUS_TGZ_PATH, TMP_FOLDER
+    from .config import (FMT_SYNTHETIC, MUSESCORE_CACHE_FOLDER,
+                         MUSESCORE_QUARANTINE_PATH, PRIMUS_CONTAINER_FOLDER,
+                         PRIMUS_TGZ_PATH, SKERN_VOCABULARY_PATH,
+                         STAGES_FOLDER, TMP_FOLDER)
     build_synthetic_dataset(
         primus_tgz_path=PRIMUS_TGZ_PATH,
+        primus_container_folder=PRIMUS_CONTAINER_FOLDER,
+        musescore_cache_folder=MUSESCORE_CACHE_FOLDER,
+        quarantine_path=MUSESCORE_QUARANTINE_PATH,
+        stages_folder=STAGES_FOLDER,
         tmp_folder=TMP_FOLDER,
-        output_folder=FMT_SYNTHETIC
+        output_folder=FMT_SYNTHETIC,
+        synthesis_workers=os.cpu_count() or 0,
+        vocabulary_path=SKERN_VOCABULARY_PATH
     )
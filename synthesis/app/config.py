@@ -5,10 +5,33 @@ DATA_FOLDER = (Path(__file__).parent / ".." / ".." / "data").resolve()
 
 PRIMUS_TGZ_PATH = DATA_FOLDER / "primusCalvoRizoAppliedSciences2018.tgz"
 
+PRIMUS_CONTAINER_FOLDER = DATA_FOLDER / "primus-container"
+
 TMP_FOLDER = DATA_FOLDER / "tmp"
 
 FMT_SYNTHETIC = DATA_FOLDER / "FMT-synthetic"
 
+MUSESCORE_CACHE_FOLDER = DATA_FOLDER / "musescore-cache"
+
+MUSESCORE_QUARANTINE_PATH = DATA_FOLDER / "musescore-quarantine.txt"
+
+STAGES_FOLDER = DATA_FOLDER / "stages"
+
+# shared by the synthetic and the real FMT label arrays
+SKERN_VOCABULARY_PATH = DATA_FOLDER / "skern_vocabulary.json"
+
+MUSESCORE_APPIMAGE_PATH = DATA_FOLDER / "musescore.AppImage"
+
+MUSESCORE_EXTRACTED_FOLDER = DATA_FOLDER / "musescore"
+
+# prefer the pre-extracted AppImage (see `make extract-musescore`),
+# as that does not need to be mounted via FUSE on every invocation
 MSCORE_COMMAND = str((
-    DATA_FOLDER / "musescore.AppImage"
+    MUSESCORE_EXTRACTED_FOLDER / "AppRun"
+    if (MUSESCORE_EXTRACTED_FOLDER / "AppRun").is_file()
+    else MUSESCORE_APPIMAGE_PATH
 ).resolve())
+
+# pre-generated paper textures of the synthesis models
+# (see app/synthesis/build_paper_texture_bank.py)
+PAPER_TEXTURE_BANKS_FOLDER = DATA_FOLDER / "paper-texture-banks"
@@ -0,0 +1,191 @@
+import csv
+import json
+import math
+import random
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .kern.KernDocument import KernDocument
+from .output.AsyncFileWriter import AsyncFileWriter
+from .output.ShardReader import ShardReader
+
+
+def derive_crops(
+    dataset_folder: Path,
+    dataset_domain: str,
+    output_folder: Path,
+    measures_per_crop: Optional[int] = None,
+    stride: Optional[int] = None,
+    dilation_range: Tuple[float, float] = (0.6, 1.0),
+    shift_range: Tuple[float, float] = (-0.5, 0.1),
+    seed: int = 42
+):
+    """Cuts a new dataset of crops out of the rendered pages of a synthetic
+    dataset, using the stored page geometry and the page kern, without
+    re-running the synthesis.
+
+    Without measures per crop, each staff is cropped whole (like the staff
+    samples of the build, but with the given padding). Otherwise windows
+    of the given number of measures are cropped from each staff, starting
+    every stride measures (by default the windows do not overlap), plus
+    a window at the end of the staff to cover the remaining measures.
+    Staves with fewer measures than a window are skipped.
+    The padding is drawn from the ranges (in staff heights) like in
+    the build: the box is dilated and then shifted vertically. Windows
+    are dilated only vertically, a horizontal padding would show parts
+    of the neighbouring measures, which are not in the window's kern.
+    """
+    stride = stride or measures_per_crop
+    rng = random.Random(seed)
+    output_folder.mkdir(parents=True, exist_ok=True)
+    writer = AsyncFileWriter()
+
+    crop_count = 0
+    csv_path = output_folder / (dataset_domain + "_crops.csv")
+    with open(csv_path, "w") as csv_file:
+        csv_writer = csv.writer(csv_file)
+        for page_name, geometry, page_bitmap, page_kern in \
+            _iterate_pages(dataset_folder, dataset_domain):
+            kern_document = KernDocument.from_kern(page_kern)
+            written = []
+            rows: List[List[str]] = []
+            for staff in geometry["staves"]:
+                for crop_name, box, start, end in _staff_crops(
+                    staff, measures_per_crop, stride
+                ):
+                    left, top, right, bottom = _jittered_box(
+                        box, staff["staff_height"], rng,
+                        dilation_range, shift_range,
+                        page_bitmap.shape[1], page_bitmap.shape[0],
+                        dilate_horizontally=(measures_per_crop is None)
+                    )
+                    name = page_name + "_" + crop_name
+                    jpg_path = output_folder / dataset_domain / (name + ".jpg")
+                    krn_path = output_folder / dataset_domain / (name + ".krn")
+                    written.append(writer.write_image(
+                        jpg_path, page_bitmap[top:bottom, left:right]
+                    ))
+                    written.append(writer.write_text(
+                        krn_path, kern_document.slice_measures(start, end)
+                    ))
+                    rows.append([
+                        str(jpg_path.relative_to(output_folder)),
+                        str(krn_path.relative_to(output_folder))
+                    ])
+
+            # rows are written once the files they point to exist
+            writer.wait(written)
+            csv_writer.writerows(rows)
+            crop_count += len(rows)
+
+    writer.close()
+    print("Derived crops:", crop_count)
+
+
+def _iterate_pages(
+    dataset_folder: Path,
+    dataset_domain: str
+) -> Iterator[Tuple[str, Dict[str, Any], np.ndarray, str]]:
+    """Yields the name (of the image, so that each view of a page has its
+    own), geometry, bitmap and kern of each rendered page, read from
+    the shards if the dataset has them, else from files"""
+    shards_folder = dataset_folder / "shards" / (dataset_domain + "_pages")
+    reader = ShardReader(shards_folder) if shards_folder.is_dir() else None
+
+    geometry_path = dataset_folder / (
+        dataset_domain + "_pages_all.geometry.jsonl"
+    )
+    with open(geometry_path, "r") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["geometry"] is None:
+                continue # crashed page
+
+            if reader is not None:
+                page_bitmap = reader.read_image(record["image_path"])
+                page_kern = reader.read_text(record["kern_path"])
+            else:
+                page_bitmap = cv2.imread(
+                    str(dataset_folder / record["image_path"]),
+                    cv2.IMREAD_UNCHANGED
+                )
+                page_kern = (dataset_folder / record["kern_path"]).read_text()
+
+            yield Path(record["image_path"]).stem, record["geometry"], \
+                page_bitmap, page_kern
+
+    if reader is not None:
+        reader.close()
+
+
+def _staff_crops(
+    staff: Dict[str, Any],
+    measures_per_crop: Optional[int],
+    stride: Optional[int]
+) -> Iterator[Tuple[str, List[float], int, int]]:
+    """Yields the name, pixel box and measure range of the crops
+    of a staff, the box spans the staff vertically"""
+    measures = staff["measures"]
+    if len(measures) == 0:
+        return
+
+    windows = [measures]
+    if measures_per_crop is not None:
+        assert stride is not None
+        starts = list(range(0, len(measures) - measures_per_crop + 1, stride))
+        # the last window is aligned to the end of the staff, if needed
+        if len(starts) > 0 \
+            and starts[-1] + measures_per_crop < len(measures):
+            starts.append(len(measures) - measures_per_crop)
+        windows = [measures[i:i + measures_per_crop] for i in starts]
+
+    _, staff_top, _, staff_bottom = staff["bbox"]
+    for window in windows:
+        start = window[0]["measure_index"]
+        end = window[-1]["measure_index"]
+        left = staff["bbox"][0] if window is measures else window[0]["bbox"][0]
+        right = staff["bbox"][2] if window is measures \
+            else window[-1]["bbox"][2]
+        name = "s" + str(staff["staff_index"])
+        if window is not measures:
+            name += "_m" + str(start) + "-" + str(end)
+        yield name, [left, staff_top, right, staff_bottom], start, end
+
+
+def _jittered_box(
+    box: List[float],
+    staff_height: float,
+    rng: random.Random,
+    dilation_range: Tuple[float, float],
+    shift_range: Tuple[float, float],
+    width: int,
+    height: int,
+    dilate_horizontally: bool = True
+) -> Tuple[int, int, int, int]:
+    """Dilates and shifts the box, clips it to the page and snaps it
+    inwards to whole pixels"""
+    dilate_by = staff_height * rng.uniform(*dilation_range)
+    shift = staff_height * rng.uniform(*shift_range)
+    dilate_sideways_by = dilate_by if dilate_horizontally else 0
+    left, top, right, bottom = box
+    return (
+        math.ceil(max(left - dilate_sideways_by, 0)),
+        math.ceil(max(top - dilate_by + shift, 0)),
+        math.floor(min(right + dilate_sideways_by, width)),
+        math.floor(min(bottom + dilate_by + shift, height))
+    )
+
+
+# .venv/bin/python3 -m app.derive_crops
+if __name__ == "__main__":
+    from .config import DATA_FOLDER, FMT_SYNTHETIC
+    for domain in ["M", "C"]:
+        derive_crops(
+            dataset_folder=FMT_SYNTHETIC,
+            dataset_domain=domain,
+            output_folder=DATA_FOLDER / "FMT-synthetic-2-measures",
+            measures_per_crop=2
+        )
@@ -0,0 +1,138 @@
+from typing import Iterable, Iterator, List, Optional
+
+from .remove_excessive_kern_header_lines import BLACKLIST_PREFIXES
+
+
+# comments and header lines left out by the clean-up
+_DROPPED_LINE_PREFIXES = ("!!", *BLACKLIST_PREFIXES)
+
+
+class KernDocument:
+    """Cleaned-up **skern of a page, indexed by measures.
+
+    The lines are kept in one list, together with the offsets of all
+    the barline lines. Measure `i` spans from the barline `i - 1`
+    (inclusive) to the barline `i` (exclusive), so the first measure
+    also holds the header lines. Slicing measures is a lookup
+    into the offset table, no line is copied until the slice is joined.
+    """
+
+    def __init__(self, lines: List[str]):
+        self.lines = lines
+        self.barline_offsets: List[int] = [
+            i for i, line in enumerate(lines) if line.startswith("=")
+        ]
+
+    @staticmethod
+    def from_kern(kern: str) -> "KernDocument":
+        """Wraps an already cleaned-up **skern string"""
+        return KernDocument(kern.splitlines())
+
+    @staticmethod
+    def from_music21_kern_output(kern: str) -> "KernDocument":
+        """Cleans up the kern produced by music21 (converter21) in a single
+        pass. Gives the same lines as the `remove_kern_comments`,
+        `remove_kern_measure_numbers`,
+        `remove_kern_leading_and_trailing_barlines`,
+        `remove_excessive_kern_header_lines`, `remove_spine_termination`
+        and `set_skern_type` steps applied one after another."""
+        lines = [
+            "=" if line.startswith("=") else line
+            for line in kern.splitlines()
+            if line and not line.startswith(_DROPPED_LINE_PREFIXES)
+            and not line.isspace()
+        ]
+
+        # leading and trailing barlines (the same line is removed only once)
+        leading = _first_barline_before_content(lines, range(len(lines)))
+        trailing = _first_barline_before_content(
+            lines, range(len(lines) - 1, -1, -1)
+        )
+        if trailing is not None and trailing != leading:
+            del lines[trailing]
+        if leading is not None:
+            del lines[leading]
+
+        if lines[-1] == "*-":
+            lines.pop()
+
+        if lines[0].startswith("**"):
+            lines[0] = "**skern"
+        else:
+            lines.insert(0, "**skern")
+
+        return KernDocument(lines)
+
+    @property
+    def measure_count(self) -> int:
+        return len(self.barline_offsets) + 1
+
+    def to_kern(self) -> str:
+        return "\n".join(self.lines)
+
+    def measure_line_range(
+        self,
+        start_measure_index: int,
+        end_measure_index: int
+    ) -> range:
+        """Indices of the lines of the given measures (both inclusive),
+        including the barline that precedes the start measure"""
+        assert end_measure_index >= start_measure_index
+        start = 0 if start_measure_index == 0 \
+            else self._barline_offset(start_measure_index - 1)
+        end = self._barline_offset(end_measure_index)
+        return range(start, end)
+
+    def _barline_offset(self, barline_index: int) -> int:
+        if barline_index >= len(self.barline_offsets):
+            return len(self.lines)
+        return self.barline_offsets[barline_index]
+
+    def slice_measures(
+        self,
+        start_measure_index: int,
+        end_measure_index: int
+    ) -> str:
+        """Returns the **skern of the given measures (both inclusive),
+        the same output as `slice_kern_measures` on the whole page kern"""
+        return "\n".join(self._iterate_slice(
+            self.measure_line_range(start_measure_index, end_measure_index)
+        ))
+
+    def _iterate_slice(self, line_range: range) -> Iterator[str]:
+        lines = self.lines
+
+        # barlines at the start and end of the content are left out
+        leading_barline = _first_barline_before_content(lines, line_range)
+        trailing_barline = _first_barline_before_content(
+            lines, reversed(line_range)
+        )
+
+        indices: Iterator[int] = iter(line_range)
+        if leading_barline is not None or trailing_barline is not None:
+            indices = (
+                i for i in line_range
+                if i != leading_barline and i != trailing_barline
+            )
+
+        # the first line is replaced by (or prefixed with) the type line
+        first = next(indices, None)
+        yield "**skern"
+        if first is not None and not lines[first].startswith("**"):
+            yield lines[first]
+        for i in indices:
+            yield lines[i]
+
+
+def _first_barline_before_content(
+    lines: List[str],
+    indices: Iterable[int]
+) -> Optional[int]:
+    for i in indices:
+        line = lines[i]
+        if line.startswith("!!") or line.startswith("*") or line.strip() == "":
+            continue
+        if line.startswith("="):
+            return i
+        return None
+    return None
@@ -0,0 +1,42 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+
+@dataclass
+class KernFragment:
+    """Cleaned-up **skern of one MusicXML document (an incipit), split
+    by measures, so that pages can be assembled by concatenation"""
+
+    part_header: List[str]
+    """Instrument lines that follow **skern, if the document starts a page"""
+
+    measures: List[List[str]]
+    """Lines of each measure (without barlines), including the clef, key
+    and meter interpretations the measure starts with"""
+
+    has_tuplets: bool
+    """Whether the fragment starts tuplets, so that its tuplet display
+    interpretations depend on the state left by preceding fragments"""
+
+    tuplet_state: Tuple[bool, bool]
+    """Whether tuplet numbers and brackets are suppressed after
+    the last measure of the fragment"""
+
+    def to_record(self) -> Dict[str, Any]:
+        """Serializes the fragment into a JSON record"""
+        return {
+            "part_header": self.part_header,
+            "measures": self.measures,
+            "has_tuplets": self.has_tuplets,
+            "tuplet_state": list(self.tuplet_state)
+        }
+
+    @staticmethod
+    def from_record(record: Dict[str, Any]) -> "KernFragment":
+        """Deserializes the fragment from a JSON record"""
+        return KernFragment(
+            part_header=record["part_header"],
+            measures=record["measures"],
+            has_tuplets=record["has_tuplets"],
+            tuplet_state=tuple(record["tuplet_state"]) # type: ignore
+        )
@@ -0,0 +1,92 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+
+BLANK_TOKEN = "<blank>"
+UNKNOWN_TOKEN = "<unk>"
+
+# labels are stored as int16
+MAX_VOCABULARY_SIZE = 2 ** 15
+
+
+class KernVocabulary:
+    """Maps skern tokens (see tokenize_skern) to integer ids for CTC labels.
+
+    The id 0 is the CTC blank and the id 1 stands for tokens missing
+    from the vocabulary. The vocabulary only grows, new tokens are appended
+    with the next free ids and the version is incremented, so labels
+    encoded with an older version decode the same with any newer one.
+    """
+
+    def __init__(self, tokens: List[str], version: int):
+        assert tokens[:2] == [BLANK_TOKEN, UNKNOWN_TOKEN]
+        self.tokens = tokens
+        "Tokens by their id"
+
+        self.version = version
+        "Incremented with every change of the saved vocabulary"
+
+        self._ids: Dict[str, int] = {
+            token: i for i, token in enumerate(tokens)
+        }
+        self._saved_size = len(tokens)
+
+    @staticmethod
+    def create() -> "KernVocabulary":
+        return KernVocabulary([BLANK_TOKEN, UNKNOWN_TOKEN], version=0)
+
+    @staticmethod
+    def load(path: Path) -> "KernVocabulary":
+        with open(path, "r") as f:
+            data = json.load(f)
+        return KernVocabulary(data["tokens"], data["version"])
+
+    @staticmethod
+    def load_or_create(path: Path) -> "KernVocabulary":
+        if path.is_file():
+            return KernVocabulary.load(path)
+        return KernVocabulary.create()
+
+    def save(self, path: Path):
+        """Saves the vocabulary, as a new version if tokens were added"""
+        if len(self.tokens) == self._saved_size and path.is_file():
+            return
+        if len(self.tokens) != self._saved_size or self.version == 0:
+            self.version += 1
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "version": self.version,
+                "tokens": self.tokens
+            }, f, indent=0, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._saved_size = len(self.tokens)
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def __contains__(self, token: str) -> bool:
+        return token in self._ids
+
+    def encode(self, tokens: List[str], extend: bool = False) -> np.ndarray:
+        """Turns tokens into an int16 array of ids, unknown tokens
+        are either added to the vocabulary or encoded as <unk>"""
+        if extend:
+            for token in tokens:
+                if token not in self._ids:
+                    self._add(token)
+        ids = [self._ids.get(token, 1) for token in tokens]
+        return np.array(ids, dtype=np.int16)
+
+    def decode(self, ids: np.ndarray) -> List[str]:
+        return [self.tokens[i] for i in ids]
+
+    def _add(self, token: str):
+        assert len(self.tokens) < MAX_VOCABULARY_SIZE, \
+            "The vocabulary does not fit into int16 labels"
+        self._ids[token] = len(self.tokens)
+        self.tokens.append(token)
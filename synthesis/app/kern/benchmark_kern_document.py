@@ -0,0 +1,140 @@
+import random
+import time
+from typing import Callable, List, Tuple
+
+from .KernDocument import KernDocument
+from .remove_excessive_kern_header_lines import \
+    remove_excessive_kern_header_lines
+from .remove_kern_comments import remove_kern_comments
+from .remove_kern_leading_and_trailing_barlines import \
+    remove_kern_leading_and_trailing_barlines
+from .remove_kern_measure_numbers import remove_kern_measure_numbers
+from .remove_spine_termination import remove_spine_termination
+from .set_skern_type import set_skern_type
+
+
+def benchmark_kern_document(
+    measure_counts: List[int] = [20, 100, 500],
+    staff_measures: int = 4,
+    repeats: int = 50,
+    seed: int = 42
+):
+    """Compares the KernDocument clean-up and staff slicing with
+    the step-by-step clean-up and per-staff re-scanning of the page kern,
+    checks that both produce the same strings and prints the timings"""
+    rng = random.Random(seed)
+
+    for measure_count in measure_counts:
+        music21_kern = _generate_music21_kern(measure_count, rng)
+
+        stepwise_kern, stepwise_seconds = _time(
+            lambda: _clean_up_stepwise(music21_kern), repeats
+        )
+        fused_kern, fused_seconds = _time(
+            lambda: KernDocument.from_music21_kern_output(music21_kern) \
+                .to_kern(),
+            repeats
+        )
+        assert stepwise_kern == fused_kern, "Clean-up outputs differ"
+
+        staves = [
+            (start, min(start + staff_measures, measure_count) - 1)
+            for start in range(0, measure_count, staff_measures)
+        ]
+        rescan_slices, rescan_seconds = _time(
+            lambda: [
+                _slice_by_rescanning(fused_kern, start, end)
+                for start, end in staves
+            ],
+            repeats
+        )
+        indexed_slices, indexed_seconds = _time(
+            lambda: [
+                document.slice_measures(start, end)
+                for document in [KernDocument.from_kern(fused_kern)]
+                for start, end in staves
+            ],
+            repeats
+        )
+        assert rescan_slices == indexed_slices, "Staff slices differ"
+
+        print(f"Page with {measure_count} measures:")
+        print(f"  clean-up  stepwise {stepwise_seconds * 1000:.3f} ms, " + \
+            f"fused {fused_seconds * 1000:.3f} ms")
+        print(f"  {len(staves)} staves  rescanning {rescan_seconds * 1000:.3f} ms, " + \
+            f"indexed {indexed_seconds * 1000:.3f} ms")
+
+
+def _time(function: Callable, repeats: int) -> Tuple:
+    """Returns the result and the mean time of the function in seconds"""
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        result = function()
+    return result, (time.perf_counter() - start_time) / repeats
+
+
+def _clean_up_stepwise(kern: str) -> str:
+    """The clean-up as a sequence of individual steps"""
+    lines: List[str] = kern.splitlines(keepends=False)
+    remove_kern_comments(lines)
+    remove_kern_measure_numbers(lines)
+    remove_kern_leading_and_trailing_barlines(lines)
+    remove_excessive_kern_header_lines(lines)
+    remove_spine_termination(lines)
+    set_skern_type(lines)
+    return "\n".join(lines)
+
+
+def _slice_by_rescanning(
+    kern: str,
+    start_measure_index: int,
+    end_measure_index: int
+) -> str:
+    """Slicing that splits and scans the whole page kern for each staff"""
+    current_measure = 0
+    out_lines: List[str] = []
+    for line in kern.splitlines():
+        if line.startswith("="):
+            current_measure += 1
+        if current_measure >= start_measure_index \
+            and current_measure <= end_measure_index:
+            out_lines.append(line)
+    remove_kern_leading_and_trailing_barlines(out_lines)
+    set_skern_type(out_lines)
+    return "\n".join(out_lines)
+
+
+def _generate_music21_kern(measure_count: int, rng: random.Random) -> str:
+    """Generates kern resembling the HumdrumWriter output for a page"""
+    lines = [
+        "!!!system-decoration: s1",
+        "**kern",
+        "*part1",
+        "*staff1",
+        "*I\"Piano",
+        "*I'Pno.",
+        "*clefG2",
+        "*k[f#]",
+        "*G:",
+        "*M3/4",
+        "*met(3)",
+    ]
+    for measure in range(1, measure_count + 1):
+        if rng.random() < 0.1:
+            lines.append("!!linebreak:original")
+        if rng.random() < 0.05:
+            lines.append(rng.choice(["*clefF4", "*clefG2", "*k[b-]"]))
+        for _ in range(3):
+            lines.append(
+                rng.choice(["4", "8", "2"]) + rng.choice("abcdefg") \
+                    + rng.choice(["", "#", "-", "n"]) \
+                    + rng.choice(["", "/", "\\"])
+            )
+        lines.append("=" + str(measure) + rng.choice(["", "", "||"]))
+    lines += ["*-", "!!!RDF**kern: > = above", ""]
+    return "\n".join(lines)
+
+
+# .venv/bin/python3 -m app.kern.benchmark_kern_document
+if __name__ == "__main__":
+    benchmark_kern_document()
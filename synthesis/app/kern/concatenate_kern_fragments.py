@@ -0,0 +1,32 @@
+from typing import List, Optional
+
+from .KernFragment import KernFragment
+
+
+def concatenate_kern_fragments(
+    fragments: List[KernFragment],
+    total_measures: Optional[int] = None
+) -> str:
+    """Builds the **skern of a page from the kern fragments of its
+    incipits, clipped to the given number of measures.
+
+    The header comes from the first fragment (as the page MusicXML keeps
+    the part list of the first incipit) and each fragment carries its own
+    clef, key and meter. Fragments with tuplets must have been converted
+    with the tuplet state left by the fragments before them.
+    """
+    assert len(fragments) > 0
+
+    lines: List[str] = ["**skern"] + fragments[0].part_header
+
+    taken_measures = 0
+    for fragment in fragments:
+        for measure in fragment.measures:
+            if total_measures is not None and taken_measures >= total_measures:
+                break
+            if taken_measures > 0:
+                lines.append("=")
+            lines.extend(measure)
+            taken_measures += 1
+
+    return "\n".join(lines)
@@ -0,0 +1,7 @@
+from .tokenize_skern import tokenize_skern
+
+
+def count_kern_tokens(kern: str) -> int:
+    """Number of tokens of the kern (including the newlines and tabs),
+    the length of the label sequence of the sample"""
+    return len(tokenize_skern(kern))
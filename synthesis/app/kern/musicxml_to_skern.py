@@ -0,0 +1,607 @@
+import xml.etree.ElementTree as ET
+from fractions import Fraction
+from typing import Dict, List, Optional, Tuple
+
+from .concatenate_kern_fragments import concatenate_kern_fragments
+from .KernFragment import KernFragment
+from .remove_excessive_kern_header_lines import \
+    remove_excessive_kern_header_lines
+
+
+# NOTE: This is a direct MusicXML to **skern exporter for single-staff,
+# single-voice MusicXML (what PrIMuS incipits are after MuseScore refinement).
+# It reproduces the output of converter21's HumdrumWriter after it has been
+# cleaned up by clean_up_music21_kern_output, but without building a music21
+# stream. Any notation it does not know how to reproduce exactly raises
+# a ValueError, so that the caller can fall back to the HumdrumWriter path.
+# Use the verify_musicxml_to_skern script to compare both paths.
+
+
+TYPE_TO_QUARTER_LENGTH: Dict[str, Fraction] = {
+    "maxima": Fraction(32),
+    "long": Fraction(16),
+    "breve": Fraction(8),
+    "whole": Fraction(4),
+    "half": Fraction(2),
+    "quarter": Fraction(1),
+    "eighth": Fraction(1, 2),
+    "16th": Fraction(1, 4),
+    "32nd": Fraction(1, 8),
+    "64th": Fraction(1, 16),
+    "128th": Fraction(1, 32),
+    "256th": Fraction(1, 64),
+}
+
+ARTICULATION_TO_KERN: Dict[str, str] = {
+    "staccato": "'",
+    "staccatissimo": "`",
+    "tenuto": "~",
+    "strong-accent": "^^",
+    "accent": "^",
+    "breath-mark": ",",
+}
+
+SHARPS_ORDER = ["f#", "c#", "g#", "d#", "a#", "e#", "b#"]
+FLATS_ORDER = ["b-", "e-", "a-", "d-", "g-", "c-", "f-"]
+
+# tonic of a major key by the number of fifths (from -7 to 7)
+MAJOR_TONICS = [
+    "C-", "G-", "D-", "A-", "E-", "B-", "F",
+    "C",
+    "G", "D", "A", "E", "B", "F#", "C#"
+]
+
+# tonic of a minor key by the number of fifths (from -7 to 7)
+MINOR_TONICS = [
+    "a-", "e-", "b-", "f", "c", "g", "d",
+    "a",
+    "e", "b", "f#", "c#", "g#", "d#", "a#"
+]
+
+# the order in which HumdrumWriter emits interpretations of one time slice
+INTERPRETATION_ORDER = ["clef", "key", "key_designation", "time"]
+
+# note children that have no effect on the kern output
+IGNORED_NOTE_CHILDREN = {
+    "pitch", "rest", "duration", "tie", "voice", "type", "dot",
+    "accidental", "time-modification", "stem", "beam", "notations",
+    "instrument", "staff", "play", "listen",
+}
+
+
+def musicxml_to_skern(musicxml: str) -> str:
+    """Converts a single-part, single-voice MusicXML document into
+    the cleaned-up **skern used by the dataset"""
+    return concatenate_kern_fragments([musicxml_to_kern_fragment(musicxml)])
+
+
+def musicxml_to_kern_fragment(
+    musicxml: str,
+    tuplet_state: Tuple[bool, bool] = (False, False)
+) -> KernFragment:
+    """Converts a single-part, single-voice MusicXML document into
+    a kern fragment, split by measures. The tuplet state is the display
+    state (numbers suppressed, brackets suppressed) left by preceding
+    content, when the document is a continuation of it."""
+    root = ET.fromstring(musicxml)
+    parts = root.findall("part")
+    if len(parts) != 1:
+        raise ValueError("Only single-part MusicXML is supported")
+
+    emitter = _SkernEmitter(tuplet_state)
+    part_header = emitter.part_names(root.find("part-list/score-part"))
+    for measure in parts[0].findall("measure"):
+        emitter.emit_measure(measure)
+
+    return KernFragment(
+        part_header=part_header,
+        measures=emitter.measures,
+        has_tuplets=emitter.has_tuplets,
+        tuplet_state=(
+            emitter.tuplets_suppressed,
+            emitter.tuplet_brackets_suppressed
+        )
+    )
+
+
+class _SkernEmitter:
+    def __init__(self, tuplet_state: Tuple[bool, bool]):
+        self.measures: List[List[str]] = []
+        self.divisions: Optional[int] = None
+        self.middle_line: Optional[int] = None
+        self.tuplets_suppressed, self.tuplet_brackets_suppressed = \
+            tuplet_state
+        self.has_tuplets = False
+        self.measure_length: Optional[Fraction] = None
+        self._pending_interpretations: List[Tuple[str, str]] = []
+
+    @property
+    def lines(self) -> List[str]:
+        """Lines of the measure being emitted"""
+        return self.measures[-1]
+
+    def part_names(self, score_part: Optional[ET.Element]) -> List[str]:
+        if score_part is None:
+            return []
+        lines: List[str] = []
+        name = (score_part.findtext("part-name") or "").strip()
+        abbreviation = (score_part.findtext("part-abbreviation") or "").strip()
+        if name:
+            lines.append('*I"' + name)
+        if abbreviation:
+            lines.append("*I'" + abbreviation)
+        remove_excessive_kern_header_lines(lines)
+        return lines
+
+    def emit_measure(self, measure: ET.Element):
+        self.measures.append([])
+        filled = Fraction(0)
+        for element in measure:
+            if element.tag == "attributes":
+                self._read_attributes(element)
+            elif element.tag == "note":
+                self._flush_interpretations()
+                filled += self._emit_note(element)
+            elif element.tag in ("print", "barline", "sound"):
+                if element.find("ending") is not None:
+                    raise ValueError("Voltas are not supported")
+                continue
+            else:
+                raise ValueError(f"Unsupported measure element <{element.tag}>")
+        
+        # interpretations after the last note belong to this measure
+        self._flush_interpretations()
+
+        # music21 splits the content of overfull measures into voices
+        if self.measure_length is not None and filled > self.measure_length:
+            raise ValueError("Overfull measures are not supported")
+
+    def _flush_interpretations(self):
+        self._pending_interpretations.sort(
+            key=lambda item: INTERPRETATION_ORDER.index(item[0])
+        )
+        for _, line in self._pending_interpretations:
+            self.lines.append(line)
+        self._pending_interpretations = []
+
+    def _read_attributes(self, attributes: ET.Element):
+        for element in attributes:
+            if element.tag == "divisions":
+                self.divisions = int(element.text or "1")
+            elif element.tag == "clef":
+                clef = _kern_clef(element)
+                if clef not in CLEF_MIDDLE_LINES:
+                    raise ValueError("Unsupported clef")
+                self.middle_line = CLEF_MIDDLE_LINES[clef]
+                self._pending_interpretations.append(("clef", clef))
+            elif element.tag == "key":
+                key_signature, key_designation = _kern_key(element)
+                self._pending_interpretations.append(("key", key_signature))
+                if key_designation is not None:
+                    self._pending_interpretations.append(
+                        ("key_designation", key_designation)
+                    )
+            elif element.tag == "time":
+                time_signature, self.measure_length = _kern_time(element)
+                self._pending_interpretations.append(
+                    ("time", time_signature)
+                )
+            elif element.tag in ("staves", "instruments"):
+                if (element.text or "1").strip() != "1":
+                    raise ValueError("Only a single staff is supported")
+            else:
+                raise ValueError(f"Unsupported attribute <{element.tag}>")
+
+    def _emit_note(self, note: ET.Element) -> Fraction:
+        """Emits the note token and returns its duration in quarter notes"""
+        # the document must set up its own context, so that it can be
+        # converted independently of the documents it is concatenated with
+        if self.divisions is None or self.middle_line is None:
+            raise ValueError("Notes before the divisions and the clef")
+        for child in note:
+            if child.tag not in IGNORED_NOTE_CHILDREN:
+                raise ValueError(f"Unsupported note element <{child.tag}>")
+        for attribute in ("color", "size"):
+            if note.get(attribute) is not None:
+                raise ValueError(f"Unsupported note attribute {attribute}")
+        if (note.findtext("voice") or "1").strip() != "1":
+            raise ValueError("Only a single voice is supported")
+        if note.find("type") is not None \
+            and note.find("type").get("size") is not None: # type: ignore
+            raise ValueError("Cue-sized notes are not supported")
+
+        duration = Fraction(
+            int(note.findtext("duration") or "0"),
+            self.divisions
+        )
+        recip, tuplet_start = self._kern_recip(note, duration)
+        notations = note.find("notations")
+
+        prefix = ""
+        postfix = ""
+
+        slur_starts, slur_stops = _kern_slurs(notations)
+        expressions = _kern_expressions(notations)
+        articulations = _kern_articulations(notations)
+        invisible = "yy" if note.get("print-object") == "no" else ""
+
+        rest = note.find("rest")
+        if rest is not None:
+            body = recip + "r" + expressions + self._rest_position(rest) \
+                + invisible
+            token = slur_starts + body + slur_stops
+        else:
+            tie_start, tie_stop = _kern_tie(note, notations)
+            prefix = slur_starts + tie_start
+            postfix = expressions + articulations + _kern_stem(note) \
+                + _kern_beams(note) + invisible + tie_stop + slur_stops
+            token = prefix + recip + _kern_pitch(note) + postfix
+
+        if tuplet_start is not None:
+            self.has_tuplets = True
+            self._emit_tuplet_display(*tuplet_start)
+
+        self.lines.append(token)
+        return duration
+
+    def _emit_tuplet_display(
+        self,
+        suppress_number: bool,
+        suppress_bracket: bool
+    ):
+        # mirrors the *tuplet/*brackettup state tracking of HumdrumWriter
+        if self.tuplets_suppressed:
+            if not suppress_number:
+                self.lines.append("*tuplet")
+                self.tuplets_suppressed = False
+                if self.tuplet_brackets_suppressed != suppress_bracket:
+                    self.lines.append(
+                        "*Xbrackettup" if suppress_bracket else "*brackettup"
+                    )
+                    self.tuplet_brackets_suppressed = suppress_bracket
+        else:
+            if suppress_number:
+                self.lines.append("*Xtuplet")
+                self.tuplets_suppressed = True
+            elif self.tuplet_brackets_suppressed != suppress_bracket:
+                self.lines.append(
+                    "*Xbrackettup" if suppress_bracket else "*brackettup"
+                )
+                self.tuplet_brackets_suppressed = suppress_bracket
+
+    def _kern_recip(
+        self,
+        note: ET.Element,
+        duration: Fraction
+    ) -> Tuple[str, Optional[Tuple[bool, bool]]]:
+        """Returns the kern duration and, if the note starts a tuplet,
+        whether the tuplet number and bracket are suppressed"""
+
+        note_type = note.findtext("type")
+        if note_type is None:
+            # e.g. whole-measure rests
+            if note.find("time-modification") is not None:
+                raise ValueError("Tuplets without a note type")
+            return _recip_from_duration(duration, dots=None), None
+
+        if note_type not in TYPE_TO_QUARTER_LENGTH:
+            raise ValueError(f"Unsupported note type {note_type}")
+        dots = len(note.findall("dot"))
+        type_duration = TYPE_TO_QUARTER_LENGTH[note_type] \
+            * (2 - Fraction(1, 2 ** dots))
+
+        time_modification = note.find("time-modification")
+        if time_modification is None:
+            if type_duration != duration:
+                raise ValueError("Duration does not match the note type")
+            return _recip_from_duration(duration, dots=None), None
+
+        if time_modification.find("normal-type") is not None:
+            raise ValueError("Tuplets with a normal type are not supported")
+        multiplier = Fraction(
+            int(time_modification.findtext("normal-notes") or "1"),
+            int(time_modification.findtext("actual-notes") or "1")
+        )
+        if type_duration * multiplier != duration:
+            raise ValueError("Duration does not match the tuplet note type")
+
+        recip = _recip_from_duration(
+            TYPE_TO_QUARTER_LENGTH[note_type] * multiplier,
+            dots=dots
+        )
+        return recip, _tuplet_start(note.find("notations"))
+
+    def _rest_position(self, rest: ET.Element) -> str:
+        display_step = rest.findtext("display-step")
+        if display_step is None:
+            return ""
+        display_octave = int(rest.findtext("display-octave") or "4")
+        diatonic = _diatonic_number(display_step, display_octave)
+        if diatonic == self.middle_line:
+            return ""
+        return _kern_pitch_name(display_step, display_octave)
+
+
+def _diatonic_number(step: str, octave: int) -> int:
+    return octave * 7 + "CDEFGAB".index(step.upper())
+
+
+CLEF_MIDDLE_LINES: Dict[str, int] = {
+    "*clefG2": _diatonic_number("B", 4),
+    "*clefG1": _diatonic_number("D", 5),
+    "*clefGv2": _diatonic_number("B", 3),
+    "*clefG^2": _diatonic_number("B", 5),
+    "*clefF4": _diatonic_number("D", 3),
+    "*clefF3": _diatonic_number("F", 3),
+    "*clefF5": _diatonic_number("B", 2),
+    "*clefC1": _diatonic_number("G", 4),
+    "*clefC2": _diatonic_number("E", 4),
+    "*clefC3": _diatonic_number("C", 4),
+    "*clefC4": _diatonic_number("A", 3),
+    "*clefC5": _diatonic_number("F", 3),
+}
+
+
+def _recip_from_duration(
+    quarter_length: Fraction,
+    dots: Optional[int]
+) -> str:
+    """Port of converter21's M21Convert.kernRecipFromM21Duration,
+    the dot count is given for tuplets and inferred otherwise"""
+    in_tuplet = dots is not None
+    duration = quarter_length / 4 # in whole notes
+    dots_string = "." * dots if dots is not None else None
+
+    if dots_string is None and duration.numerator != 1:
+        for dot_count, ratio in [(1, Fraction(2, 3)), (2, Fraction(4, 7)),
+                                 (3, Fraction(8, 15))]:
+            if (duration * ratio).numerator == 1:
+                duration = duration * ratio
+                dots_string = "." * dot_count
+                break
+
+    out = str(duration.denominator)
+    if duration.numerator != 1:
+        special = {2: "0", 4: "00", 8: "000", 16: "0000"}
+        if not in_tuplet and not dots_string:
+            special.update({3: "0.", 6: "00.", 12: "000.", 24: "0000."})
+        if duration.denominator == 1 and duration.numerator in special:
+            out = special[duration.numerator]
+        else:
+            out += "%" + str(duration.numerator)
+    out += dots_string or ""
+
+    if in_tuplet:
+        undotted = Fraction(1, duration.denominator) * duration.numerator
+        if undotted.numerator == 1 \
+            and undotted.denominator & (undotted.denominator - 1) == 0:
+            raise ValueError("Tuplet durations that are powers of two")
+
+    return out
+
+
+def _tuplet_start(
+    notations: Optional[ET.Element]
+) -> Optional[Tuple[bool, bool]]:
+    if notations is None:
+        return None
+    tuplets = notations.findall("tuplet")
+    if len(tuplets) == 0:
+        return None
+    if len(tuplets) > 1 or tuplets[0].get("number", "1") != "1":
+        raise ValueError("Nested tuplets are not supported")
+    tuplet = tuplets[0]
+    if tuplet.get("type") != "start":
+        return None
+    if tuplet.find("tuplet-actual") is not None \
+        or tuplet.find("tuplet-normal") is not None \
+        or tuplet.get("line-shape") == "curved":
+        raise ValueError("Unsupported tuplet display")
+
+    suppress_number = tuplet.get("show-number") == "none"
+    bracket = tuplet.get("bracket")
+    if bracket is None:
+        suppress_bracket = suppress_number
+    else:
+        suppress_bracket = bracket == "no"
+    return suppress_number, suppress_bracket
+
+
+def _kern_pitch_name(step: str, octave: int) -> str:
+    if octave >= 4:
+        return step.lower() * (octave - 3)
+    return step.upper() * (4 - octave)
+
+
+def _kern_pitch(note: ET.Element) -> str:
+    pitch = note.find("pitch")
+    if pitch is None:
+        raise ValueError("Unpitched notes are not supported")
+    step = pitch.findtext("step") or "C"
+    octave = int(pitch.findtext("octave") or "4")
+    alter_text = pitch.findtext("alter")
+    alter = Fraction(alter_text) if alter_text is not None else Fraction(0)
+    if alter.denominator != 1:
+        raise ValueError("Microtonal accidentals are not supported")
+
+    output = _kern_pitch_name(step, octave)
+    if alter > 0:
+        output += "#" * int(alter)
+    elif alter < 0:
+        output += "-" * int(-alter)
+
+    accidental = note.find("accidental")
+    if accidental is not None:
+        for attribute in ("parentheses", "bracket", "editorial", "cautionary"):
+            if accidental.get(attribute) == "yes":
+                raise ValueError("Editorial accidentals are not supported")
+        output += "n" if alter == 0 else "X"
+
+    return output
+
+
+def _kern_stem(note: ET.Element) -> str:
+    stem = (note.findtext("stem") or "").strip()
+    if stem == "down":
+        return "\\"
+    if stem == "up":
+        return "/"
+    return ""
+
+
+def _kern_beams(note: ET.Element) -> str:
+    starts = ends = hooks_backward = hooks_forward = 0
+    for beam in note.findall("beam"):
+        beam_type = (beam.text or "").strip()
+        if beam_type == "begin":
+            starts += 1
+        elif beam_type == "end":
+            ends += 1
+        elif beam_type == "backward hook":
+            hooks_backward += 1
+        elif beam_type == "forward hook":
+            hooks_forward += 1
+    return "J" * ends + "k" * hooks_backward + "K" * hooks_forward \
+        + "L" * starts
+
+
+def _kern_tie(
+    note: ET.Element,
+    notations: Optional[ET.Element]
+) -> Tuple[str, str]:
+    """Returns the tie prefix and postfix"""
+    tie_types = [tie.get("type") for tie in note.findall("tie")]
+    if len(tie_types) == 0:
+        return "", ""
+    if "start" in tie_types and "stop" in tie_types:
+        tie_type = "continue"
+    elif len(tie_types) == 1:
+        tie_type = tie_types[0]
+    else:
+        raise ValueError("Unexpected combination of ties")
+
+    tie = "[" if tie_type == "start" else "]" if tie_type == "stop" else "_"
+
+    # placement is only exported on tie starts and continues
+    if tie_type in ("start", "continue") and notations is not None:
+        tied = notations.find("tied")
+        if tied is not None:
+            if tied.get("line-type") not in (None, "solid", "wavy"):
+                raise ValueError("Unsupported tie style")
+            placement = tied.get("placement")
+            if placement is None:
+                placement = {"over": "above", "under": "below"}.get(
+                    tied.get("orientation") or ""
+                )
+            if placement == "above":
+                tie += ">"
+            elif placement == "below":
+                tie += "<"
+
+    if tie_type == "start":
+        return tie, ""
+    return "", tie
+
+
+def _kern_slurs(notations: Optional[ET.Element]) -> Tuple[str, str]:
+    """Returns the slur starts and stops"""
+    if notations is None:
+        return "", ""
+    starts = ""
+    stops = ""
+    for slur in notations.findall("slur"):
+        if slur.get("type") == "start":
+            placement = slur.get("placement")
+            starts += "(" + {"above": ">", "below": "<"}.get(
+                placement or "", ""
+            )
+        elif slur.get("type") == "stop":
+            stops += ")"
+        else:
+            raise ValueError("Unsupported slur type")
+    return starts, stops
+
+
+def _kern_expressions(notations: Optional[ET.Element]) -> str:
+    if notations is None:
+        return ""
+    output = ""
+    for fermata in notations.findall("fermata"):
+        output += ";"
+        if fermata.get("type") == "upright":
+            output += "<"
+    return output
+
+
+def _kern_articulations(notations: Optional[ET.Element]) -> str:
+    if notations is None:
+        return ""
+    for element in notations:
+        if element.tag not in ("tied", "slur", "tuplet", "fermata",
+                               "articulations"):
+            raise ValueError(f"Unsupported notation <{element.tag}>")
+    output = ""
+    for articulations in notations.findall("articulations"):
+        for articulation in articulations:
+            if articulation.tag not in ARTICULATION_TO_KERN:
+                raise ValueError(
+                    f"Unsupported articulation <{articulation.tag}>"
+                )
+            output += ARTICULATION_TO_KERN[articulation.tag]
+            placement = articulation.get("placement")
+            if placement == "below":
+                output += "<"
+            elif placement == "above":
+                output += ">"
+    return output
+
+
+def _kern_clef(clef: ET.Element) -> str:
+    sign = (clef.findtext("sign") or "").strip()
+    line = (clef.findtext("line") or "").strip()
+    octave_change = int(clef.findtext("clef-octave-change") or "0")
+    if sign not in ("G", "F", "C") or not line.isdigit() \
+        or clef.get("print-object") == "no":
+        raise ValueError("Unsupported clef")
+    if octave_change < 0:
+        octave_mark = "v" * -octave_change
+    else:
+        octave_mark = "^" * octave_change
+    return "*clef" + sign + octave_mark + line
+
+
+def _kern_key(key: ET.Element) -> Tuple[str, Optional[str]]:
+    """Returns the key signature and the key designation, if the mode
+    of the key is known"""
+    fifths_text = key.findtext("fifths")
+    if fifths_text is None or key.get("print-object") == "no":
+        raise ValueError("Unsupported key signature")
+    fifths = int(fifths_text)
+    if abs(fifths) > 7:
+        raise ValueError("Unsupported key signature")
+
+    if fifths >= 0:
+        key_signature = "*k[" + "".join(SHARPS_ORDER[:fifths]) + "]"
+    else:
+        key_signature = "*k[" + "".join(FLATS_ORDER[:-fifths]) + "]"
+
+    mode = key.findtext("mode")
+    if mode is None:
+        return key_signature, None
+    mode = mode.strip()
+    if mode == "major":
+        return key_signature, "*" + MAJOR_TONICS[fifths + 7] + ":"
+    if mode == "minor":
+        return key_signature, "*" + MINOR_TONICS[fifths + 7] + ":"
+    raise ValueError(f"Unsupported key mode {mode}")
+
+
+def _kern_time(time: ET.Element) -> Tuple[str, Fraction]:
+    """Returns the time signature and the measure length in quarter notes"""
+    beats = (time.findtext("beats") or "").strip()
+    beat_type = (time.findtext("beat-type") or "").strip()
+    if not beats.isdigit() or not beat_type.isdigit() \
+        or len(time.findall("beats")) != 1:
+        raise ValueError("Unsupported time signature")
+    measure_length = Fraction(int(beats) * 4, int(beat_type))
+    return "*M" + beats + "/" + beat_type, measure_length
@@ -11,12 +11,6 @@ BLACKLIST_PREFIXES = [
 
 
 def remove_excessive_kern_header_lines(lines: List[str]):
-    indices_to_remove: List[int] = []
-
-    for i, line in enumerate(lines):
-        for prefix in BLACKLIST_PREFIXES:
-            if line.startswith(prefix):
-                indices_to_remove.append(i)
-
-    for i in reversed(indices_to_remove):
-        del lines[i]
+    # rebuild the list in place (deleting one by one is quadratic)
+    prefixes = tuple(BLACKLIST_PREFIXES)
+    lines[:] = [line for line in lines if not line.startswith(prefixes)]
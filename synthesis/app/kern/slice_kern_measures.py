@@ -1,7 +1,4 @@
-from typing import List
-from .remove_kern_leading_and_trailing_barlines import \
-    remove_kern_leading_and_trailing_barlines
-from .set_skern_type import set_skern_type
+from .KernDocument import KernDocument
 
 
 def slice_kern_measures(
@@ -9,21 +6,9 @@ def slice_kern_measures(
     start_measure_index: int,
     end_measure_index: int
 ) -> str:
-    # assumes cleaned up kern for the whole page as input
-    assert end_measure_index >= start_measure_index
-    
-    current_measure = 0
-
-    out_lines: List[str] = []
-
-    for line in kern.splitlines():
-        if line.startswith("="):
-            current_measure += 1
-        if current_measure >= start_measure_index \
-            and current_measure <= end_measure_index:
-            out_lines.append(line)
-    
-    remove_kern_leading_and_trailing_barlines(out_lines)
-    set_skern_type(out_lines)
-
-    return "\n".join(out_lines)
+    # assumes cleaned up kern for the whole page as input,
+    # build a KernDocument once when slicing the same page repeatedly
+    return KernDocument.from_kern(kern).slice_measures(
+        start_measure_index,
+        end_measure_index
+    )
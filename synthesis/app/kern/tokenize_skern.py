@@ -0,0 +1,17 @@
+import re
+from typing import List
+
+
+# a run of non-whitespace characters, or a single whitespace character
+_TOKEN_PATTERN = re.compile(r"\S+|\s")
+
+
+def tokenize_skern(kern: str) -> List[str]:
+    """Splits the kern into tokens: the spine type, interpretations, notes,
+    rests and barlines, with each tab, space and newline being a token
+    of its own, so the tokenization is lossless (see detokenize_skern)"""
+    return _TOKEN_PATTERN.findall(kern)
+
+
+def detokenize_skern(tokens: List[str]) -> str:
+    return "".join(tokens)
@@ -0,0 +1,134 @@
+import logging
+import time
+from pathlib import Path
+from typing import Optional
+
+from ..primus.start_primus_musicxml_iterator import \
+    start_primus_musicxml_iterator
+from ..semantic.pull_page_from_musicxml_iterator import (_music21_to_kern,
+                                                         _parse_to_music21)
+from .clean_up_music21_kern_output import clean_up_music21_kern_output
+from .musicxml_to_skern import musicxml_to_skern
+
+
+def verify_musicxml_to_skern(
+    primus_tgz_path: Path,
+    tmp_folder: Path,
+    primus_container_folder: Optional[Path] = None,
+    musescore_cache_folder: Optional[Path] = None,
+    limit: Optional[int] = None,
+    print_mismatches: int = 10
+):
+    """Compares the direct **skern exporter with the (cleaned up) output
+    of the HumdrumWriter path on the refined MusicXML of PrIMuS incipits.
+    The strings must be exactly equal, whitespace included, since every
+    tab and newline is a token of the labels (see tokenize_skern)."""
+
+    _verify_key_signatures()
+
+    primus_musicxml_iterator = start_primus_musicxml_iterator(
+        primus_tgz_path=primus_tgz_path,
+        tmp_folder=tmp_folder,
+        musescore_batch_size=100,
+        with_tqdm=True,
+        primus_container_folder=primus_container_folder,
+        musescore_cache_folder=musescore_cache_folder
+    )
+
+    matches = 0
+    mismatches = 0
+    unsupported = 0
+    skern_seconds = 0.0
+    humdrum_writer_seconds = 0.0
+
+    for i, incipit in enumerate(primus_musicxml_iterator):
+        if limit is not None and i >= limit:
+            break
+
+        start_time = time.perf_counter()
+        try:
+            expected = clean_up_music21_kern_output(
+                _music21_to_kern(_parse_to_music21(incipit.musicxml))
+            )
+        except:
+            logging.exception("HumdrumWriter fails on incipit: " + \
+                incipit.original_incipit.incipit_id)
+            continue
+        humdrum_writer_seconds += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        try:
+            actual = musicxml_to_skern(incipit.musicxml)
+        except ValueError:
+            unsupported += 1
+            continue
+        skern_seconds += time.perf_counter() - start_time
+
+        if actual == expected:
+            matches += 1
+            continue
+
+        mismatches += 1
+        if mismatches <= print_mismatches:
+            print("Mismatch in incipit:", incipit.original_incipit.incipit_id)
+            print("Expected:", repr(expected))
+            print("Actual:  ", repr(actual))
+
+    print("Matching incipits:", matches)
+    print("Mismatching incipits:", mismatches)
+    print("Unsupported incipits:", unsupported)
+    total = max(matches + mismatches + unsupported, 1)
+    print(f"HumdrumWriter: {humdrum_writer_seconds / total * 1000:.2f} ms/incipit")
+    print(f"Direct **skern: {skern_seconds / total * 1000:.2f} ms/incipit")
+
+
+
+# a measure with the key signature and a whole rest
+KEY_SIGNATURE_MUSICXML = """<?xml version="1.0" encoding="UTF-8"?>
+<score-partwise version="3.1">
+  <part-list>
+    <score-part id="P1"><part-name>Music</part-name></score-part>
+  </part-list>
+  <part id="P1">
+    <measure number="1">
+      <attributes>
+        <divisions>1</divisions>
+        <key><fifths>{fifths}</fifths><mode>{mode}</mode></key>
+        <time><beats>4</beats><beat-type>4</beat-type></time>
+        <clef><sign>G</sign><line>2</line></clef>
+      </attributes>
+      <note><rest/><duration>4</duration><type>whole</type></note>
+    </measure>
+  </part>
+</score-partwise>
+"""
+
+
+def _verify_key_signatures():
+    """Compares the exporters on all the 15 key signatures in both modes,
+    as those are rare in the incipits"""
+    mismatches = 0
+    for mode in ["major", "minor"]:
+        for fifths in range(-7, 8):
+            musicxml = KEY_SIGNATURE_MUSICXML.format(fifths=fifths, mode=mode)
+            expected = clean_up_music21_kern_output(
+                _music21_to_kern(_parse_to_music21(musicxml))
+            )
+            actual = musicxml_to_skern(musicxml)
+            if actual != expected:
+                mismatches += 1
+                print(f"Mismatch in the key of {fifths} fifths, {mode}:")
+                print("Expected:", repr(expected))
+                print("Actual:  ", repr(actual))
+    print("Mismatching key signatures:", mismatches)
+
+# .venv/bin/python3 -m app.kern.verify_musicxml_to_skern
+if __name__ == "__main__":
+    from ..config import (MUSESCORE_CACHE_FOLDER, PRIMUS_CONTAINER_FOLDER,
+                          PRIMUS_TGZ_PATH, TMP_FOLDER)
+    verify_musicxml_to_skern(
+        primus_tgz_path=PRIMUS_TGZ_PATH,
+        tmp_folder=TMP_FOLDER,
+        primus_container_folder=PRIMUS_CONTAINER_FOLDER,
+        musescore_cache_folder=MUSESCORE_CACHE_FOLDER
+    )
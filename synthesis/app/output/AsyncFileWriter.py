@@ -0,0 +1,132 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Set
+
+import cv2
+import numpy as np
+
+
+class AsyncFileWriter:
+    """Encodes images and writes files in a pool of threads, so that
+    the caller can continue rendering in the meantime (cv2 releases the GIL
+    while encoding).
+
+    Created directories are remembered, so each directory is created
+    only once. The bytes of the data waiting to be written are bounded,
+    a write blocks the caller until there is room for it.
+
+    Each file is written under a temporary name and then renamed, so a
+    file either exists complete or not at all. Wait for the futures of
+    a sample's files before recording the sample in a manifest.
+
+    Without fsync, this holds when the process crashes or is killed,
+    but not when the machine loses power (the renamed file may then
+    be empty). With fsync, the file and then its directory are flushed
+    to the disk, which makes each write considerably slower.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_in_flight_bytes: int = 256 * 1024 * 1024,
+        fsync: bool = False
+    ):
+        self.max_in_flight_bytes = max_in_flight_bytes
+        "Upper bound on the bytes of data being encoded and written"
+
+        self.fsync = fsync
+        "Whether to flush each file and its directory entry to the disk"
+
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._in_flight_bytes = 0
+        self._in_flight_condition = threading.Condition()
+        self._created_directories: Set[Path] = set()
+        self._directories_lock = threading.Lock()
+        self._futures: List[Future] = []
+
+    def write_image(self, path: Path, bitmap: np.ndarray) -> Future:
+        """Encodes the bitmap by the path suffix (e.g. .jpg) and writes it"""
+        return self._submit(
+            path,
+            bitmap.nbytes,
+            lambda: _encode_image(path, bitmap)
+        )
+
+    def write_text(self, path: Path, text: str) -> Future:
+        data = text.encode("utf-8")
+        return self._submit(path, len(data), lambda: data)
+
+    def wait(self, futures: Iterable[Future]):
+        """Waits for the given writes, raises if any of them failed"""
+        for future in futures:
+            future.result()
+
+    def flush(self):
+        """Waits for all the writes submitted so far"""
+        futures, self._futures = self._futures, []
+        self.wait(futures)
+
+    def close(self):
+        self.flush()
+        self._pool.shutdown()
+
+    def _submit(self, path: Path, size: int, get_data) -> Future:
+        # a single oversized write is let through when nothing is in flight
+        with self._in_flight_condition:
+            self._in_flight_condition.wait_for(
+                lambda: self._in_flight_bytes == 0 \
+                    or self._in_flight_bytes + size <= self.max_in_flight_bytes
+            )
+            self._in_flight_bytes += size
+
+        future = self._pool.submit(self._write, path, size, get_data)
+        self._futures = [f for f in self._futures if not f.done()]
+        self._futures.append(future)
+        return future
+
+    def _write(self, path: Path, size: int, get_data):
+        try:
+            self._store(path, get_data())
+        finally:
+            with self._in_flight_condition:
+                self._in_flight_bytes -= size
+                self._in_flight_condition.notify_all()
+
+    def _store(self, path: Path, data: bytes):
+        """Puts the encoded data of a file to its destination"""
+        self._ensure_directory(path.parent)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        if self.fsync:
+            _fsync_directory(path.parent)
+
+    def _ensure_directory(self, directory: Path):
+        with self._directories_lock:
+            if directory in self._created_directories:
+                return
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._directories_lock:
+            self._created_directories.add(directory)
+
+
+def _fsync_directory(directory: Path):
+    """Flushes the renames within the directory to the disk"""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _encode_image(path: Path, bitmap: np.ndarray) -> bytes:
+    success, buffer = cv2.imencode(path.suffix, bitmap)
+    if not success:
+        raise Exception("Could not encode the image: " + str(path))
+    return buffer.tobytes()
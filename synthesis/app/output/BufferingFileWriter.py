@@ -0,0 +1,35 @@
+import threading
+from pathlib import Path
+from typing import Dict
+
+from .AsyncFileWriter import AsyncFileWriter
+
+
+class BufferingFileWriter(AsyncFileWriter):
+    """Encodes the files in the background like the AsyncFileWriter,
+    but keeps the encoded bytes in memory instead of writing them,
+    so that they can be sent to another process (e.g. to be put
+    into a shard by the main process)"""
+
+    def __init__(self, workers: int = 4):
+        super().__init__(workers=workers)
+        self._files: Dict[Path, bytes] = {}
+        self._files_lock = threading.Lock()
+
+    def take_files(self) -> Dict[Path, bytes]:
+        """Waits for all the submitted files and returns them
+        (in the order they were submitted), the buffer is emptied"""
+        self.flush()
+        with self._files_lock:
+            files, self._files = self._files, {}
+        return files
+
+    def _submit(self, path: Path, size: int, get_data):
+        # reserve the place, so that the files keep the submission order
+        with self._files_lock:
+            self._files[path] = b""
+        return super()._submit(path, size, get_data)
+
+    def _store(self, path: Path, data: bytes):
+        with self._files_lock:
+            self._files[path] = data
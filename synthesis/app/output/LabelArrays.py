@@ -0,0 +1,82 @@
+import json
+import os
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+
+class LabelArrays:
+    """Integer-encoded labels of the samples of one split, stored as one
+    concatenated int16 array of token ids and an int64 array of offsets
+    (the labels of sample i are labels[offsets[i]:offsets[i + 1]]).
+
+    The arrays are memory-mapped when loaded, so data loaders do not parse
+    any text. The keys (paths of the kern files) align the labels with
+    the samples, together with the vocabulary version they were encoded by.
+
+    Files: {name}.labels.npy, {name}.offsets.npy, {name}.labels.json
+    """
+
+    def __init__(
+        self,
+        keys: List[str],
+        labels: np.ndarray,
+        offsets: np.ndarray,
+        vocabulary_version: int
+    ):
+        assert len(offsets) == len(keys) + 1
+        self.keys = keys
+        self.labels = labels
+        self.offsets = offsets
+        self.vocabulary_version = vocabulary_version
+
+    @staticmethod
+    def from_sequences(
+        keys: List[str],
+        sequences: List[np.ndarray],
+        vocabulary_version: int
+    ) -> "LabelArrays":
+        offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+        np.cumsum([len(s) for s in sequences], out=offsets[1:])
+        labels = np.concatenate(sequences).astype(np.int16) \
+            if len(sequences) > 0 else np.zeros(0, dtype=np.int16)
+        return LabelArrays(keys, labels, offsets, vocabulary_version)
+
+    @staticmethod
+    def load(folder: Path, name: str) -> "LabelArrays":
+        with open(folder / (name + ".labels.json"), "r") as f:
+            metadata = json.load(f)
+        return LabelArrays(
+            keys=metadata["keys"],
+            labels=np.load(folder / (name + ".labels.npy"), mmap_mode="r"),
+            offsets=np.load(folder / (name + ".offsets.npy"), mmap_mode="r"),
+            vocabulary_version=metadata["vocabulary_version"]
+        )
+
+    def save(self, folder: Path, name: str):
+        folder.mkdir(parents=True, exist_ok=True)
+
+        # the metadata file is replaced last, it marks a complete write
+        for suffix, array in [
+            (".labels.npy", self.labels),
+            (".offsets.npy", self.offsets)
+        ]:
+            tmp_path = folder / (name + suffix + ".tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, folder / (name + suffix))
+
+        tmp_path = folder / (name + ".labels.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "vocabulary_version": self.vocabulary_version,
+                "keys": self.keys
+            }, f)
+        os.replace(tmp_path, folder / (name + ".labels.json"))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.labels[self.offsets[index]:self.offsets[index + 1]]
@@ -0,0 +1,145 @@
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Union
+
+import numpy as np
+
+
+# columns of the manifest and their types, list values (e.g. incipit ids)
+# are stored as space-separated strings
+MANIFEST_COLUMNS: Dict[str, Any] = {
+    "image_path": np.str_,
+    "kern_path": np.str_,
+    "dataset_domain": np.str_,
+    "page_identifier": np.str_,
+    "staff_index": np.int16, # -1 for pages
+    "view_index": np.int16, # 0 for the first rendering of the page
+    "variant_index": np.int16, # 0 for the original image, then augmented
+    "augmentation_seed": np.uint64, # 0 for the original image
+    "crashed": np.bool_, # only crashed pages, they have no files
+    "image_width": np.int32,
+    "image_height": np.int32,
+    "start_measure": np.int32, # measure range within the page, inclusive
+    "end_measure": np.int32,
+    "staff_count": np.int16, # staves with measures on the page
+    "kern_token_count": np.int32,
+    "incipit_ids": np.str_,
+    "measures_per_staff": np.str_, # the planned page layout
+    "page_seed": np.uint64,
+    "synthesis_seconds": np.float32, # building the scene of the page
+    "render_seconds": np.float32, # rasterizing the page
+    "page_seconds": np.float32, # the whole page, including the staves
+}
+
+# condition of a query, either a value to be equal to, an inclusive range
+# (with None for an open end) or a function giving a mask for the column
+Condition = Union[Any, tuple, Callable[[np.ndarray], np.ndarray]]
+
+
+class SampleManifest:
+    """Metadata of the samples of one split (e.g. M_staves_all), stored
+    column by column, so that loaders can filter and bucket the samples
+    without opening the sample files.
+
+    Example: staves narrower than 2000 pixels, from pages with 5 staves:
+
+        manifest = SampleManifest.load(path)
+        narrow = manifest.filter(image_width=(None, 1999), staff_count=5)
+        for row in narrow.rows():
+            print(row["image_path"], row["kern_token_count"])
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        assert list(columns.keys()) == list(MANIFEST_COLUMNS.keys())
+        self.columns = columns
+
+    @staticmethod
+    def from_records(records: List[Dict[str, Any]]) -> "SampleManifest":
+        """Builds the manifest from sample records (dicts with a value
+        for each column)"""
+        return SampleManifest({
+            name: np.array(
+                [_column_value(record[name]) for record in records],
+                dtype=dtype
+            )
+            for name, dtype in MANIFEST_COLUMNS.items()
+        })
+
+    @staticmethod
+    def load(path: Path) -> "SampleManifest":
+        with np.load(path, allow_pickle=False) as data:
+            return SampleManifest({
+                name: data[name] for name in MANIFEST_COLUMNS.keys()
+            })
+
+    def save(self, path: Path):
+        tmp_path = path.with_name(path.name + ".tmp.npz")
+        np.savez(tmp_path, **self.columns)
+        tmp_path.replace(path)
+
+    def __len__(self) -> int:
+        return len(self.columns["image_path"])
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.columns[column]
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        """Iterates over the samples as dicts of column values"""
+        for i in range(len(self)):
+            yield {
+                name: values[i].item()
+                for name, values in self.columns.items()
+            }
+
+    def select(self, indices_or_mask: np.ndarray) -> "SampleManifest":
+        """Manifest of the samples given by indices or a boolean mask"""
+        return SampleManifest({
+            name: values[indices_or_mask]
+            for name, values in self.columns.items()
+        })
+
+    def mask(self, **conditions: Condition) -> np.ndarray:
+        """Boolean mask of the samples that meet all the conditions"""
+        mask = np.ones(len(self), dtype=np.bool_)
+        for name, condition in conditions.items():
+            values = self.columns[name]
+            if callable(condition):
+                mask &= condition(values)
+            elif isinstance(condition, tuple):
+                low, high = condition
+                if low is not None:
+                    mask &= values >= low
+                if high is not None:
+                    mask &= values <= high
+            else:
+                mask &= values == condition
+        return mask
+
+    def filter(self, **conditions: Condition) -> "SampleManifest":
+        """Manifest of the samples that meet all the conditions"""
+        return self.select(self.mask(**conditions))
+
+    def with_incipit(self, incipit_id: str) -> "SampleManifest":
+        """Manifest of the samples whose page contains the incipit"""
+        return self.select(np.array([
+            incipit_id in ids.split(" ") for ids in self.columns["incipit_ids"]
+        ], dtype=np.bool_))
+
+    def buckets(
+        self,
+        column: str,
+        boundaries: List[float]
+    ) -> List[np.ndarray]:
+        """Splits the sample indices into buckets by the column value,
+        bucket i holds values in [boundaries[i-1], boundaries[i]),
+        so there is one more bucket than boundaries"""
+        bucket_ids = np.digitize(self.columns[column], boundaries)
+        return [
+            np.flatnonzero(bucket_ids == i)
+            for i in range(len(boundaries) + 1)
+        ]
+
+
+def _column_value(value: Any) -> Any:
+    if isinstance(value, list):
+        return " ".join(str(item) for item in value)
+    return value
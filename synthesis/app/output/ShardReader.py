@@ -0,0 +1,113 @@
+import json
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Tuple
+
+import cv2
+import numpy as np
+
+from .ShardWriter import INDEX_FILENAME, sample_key
+
+
+class ShardReader:
+    """Reads the samples written by the ShardWriter, either as a stream
+    (in the order they were written, each shard read sequentially),
+    or by random access to individual samples and members via the index.
+
+    A member is addressed by the same relative path as in the per-file
+    output layout (e.g. "M/staff/03/123_s2.jpg"), so the paths listed
+    in the CSV files can be resolved against the shards.
+    """
+
+    def __init__(self, folder: Path):
+        self.folder = folder
+
+        # sample key -> (shard name, suffix -> (offset, size))
+        self._index: Dict[str, Tuple[str, Dict[str, Tuple[int, int]]]] = {}
+        self._shard_files: Dict[str, BinaryIO] = {}
+        self._load_index()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def keys(self) -> List[str]:
+        """Keys of all the samples, in the order they were written"""
+        return list(self._index.keys())
+
+    def get(self, key: str) -> Dict[str, bytes]:
+        """Returns the members of a sample, keyed by their suffix"""
+        shard_name, members = self._index[key]
+        return {
+            suffix: self._read(shard_name, offset, size)
+            for suffix, (offset, size) in members.items()
+        }
+
+    def read(self, member_name: str) -> bytes:
+        """Returns the data of one member, e.g. "M/page/03/123.krn" """
+        key = sample_key(member_name)
+        suffix = member_name[len(key):]
+        shard_name, members = self._index[key]
+        offset, size = members[suffix]
+        return self._read(shard_name, offset, size)
+
+    def read_image(self, member_name: str) -> np.ndarray:
+        return cv2.imdecode(
+            np.frombuffer(self.read(member_name), dtype=np.uint8),
+            cv2.IMREAD_UNCHANGED
+        )
+
+    def read_text(self, member_name: str) -> str:
+        return self.read(member_name).decode("utf-8")
+
+    def read_metadata(self, key: str) -> Dict[str, Any]:
+        return json.loads(self.read(key + ".json"))
+
+    def __iter__(self) -> Iterator[Tuple[str, Dict[str, bytes]]]:
+        """Streams all the samples as (key, members by suffix) pairs,
+        reading each shard once from the start to the end"""
+        by_shard: Dict[str, List[str]] = {}
+        for key, (shard_name, _) in self._index.items():
+            by_shard.setdefault(shard_name, []).append(key)
+
+        for shard_name, keys in by_shard.items():
+            with open(self.folder / shard_name, "rb") as f:
+                for key in keys:
+                    _, members = self._index[key]
+                    sample: Dict[str, bytes] = {}
+                    for suffix, (offset, size) in members.items():
+                        # members are in the file order, so this
+                        # seek only skips the tar headers
+                        f.seek(offset)
+                        sample[suffix] = f.read(size)
+                    yield key, sample
+
+    def close(self):
+        for f in self._shard_files.values():
+            f.close()
+        self._shard_files = {}
+
+    def _read(self, shard_name: str, offset: int, size: int) -> bytes:
+        if shard_name not in self._shard_files:
+            self._shard_files[shard_name] = open(self.folder / shard_name, "rb")
+        f = self._shard_files[shard_name]
+        f.seek(offset)
+        return f.read(size)
+
+    def _load_index(self):
+        with open(self.folder / INDEX_FILENAME, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break # a truncated line written during a crash
+                record = json.loads(line)
+                # a sample written again by a resumed run overrides
+                # the earlier copy
+                self._index.pop(record["key"], None)
+                self._index[record["key"]] = (
+                    record["shard"],
+                    {
+                        suffix: (offset, size)
+                        for suffix, (offset, size) in record["members"].items()
+                    }
+                )
@@ -0,0 +1,141 @@
+import io
+import json
+import os
+import re
+import tarfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+
+INDEX_FILENAME = "index.jsonl"
+SHARD_NAME_PATTERN = re.compile(r"^shard-(\d+)\.tar$")
+
+
+def shard_filename(shard_number: int) -> str:
+    return "shard-" + str(shard_number).zfill(5) + ".tar"
+
+
+def sample_key(member_name: str) -> str:
+    """The sample a shard member belongs to, its name without the suffix
+    (e.g. "M/staff/03/123_s2.jpg" belongs to "M/staff/03/123_s2")"""
+    return os.path.splitext(member_name)[0]
+
+
+class ShardWriter:
+    """Writes samples into a sequence of tar shards of a bounded size,
+    instead of writing each file of each sample separately.
+
+    All the members of a sample (e.g. .jpg, .krn and .json) are stored
+    next to each other, named by the sample key and their suffix, so that
+    the shards can be read as a stream. An index file has a JSON line
+    for each sample with its shard and the data offset and size of each
+    member for random access. A sample is added to the index only once
+    its data is flushed into the shard.
+
+    A writer never appends to a shard of a previous run, it starts
+    a new shard instead, so shards left by an interrupted run stay valid.
+    """
+
+    def __init__(self, folder: Path, max_shard_bytes: int = 1024 ** 3):
+        self.folder = folder
+        self.max_shard_bytes = max_shard_bytes
+
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self._keys: Set[str] = set()
+        self._load_index()
+
+        self._next_shard_number = max([
+            int(match.group(1))
+            for match in (
+                SHARD_NAME_PATTERN.match(path.name)
+                for path in self.folder.iterdir()
+            )
+            if match is not None
+        ], default=-1) + 1
+        self._shard: Optional[tarfile.TarFile] = None
+        self._shard_name = ""
+
+        self._index_file = open(self.folder / INDEX_FILENAME, "a")
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add_sample(
+        self,
+        key: str,
+        files: Dict[str, bytes],
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        """Writes the files of a sample (keyed by their suffix, e.g. ".jpg")
+        and its metadata (as a .json member) into the current shard"""
+        members: List[Tuple[str, bytes]] = list(files.items())
+        if metadata is not None:
+            members.append((".json", json.dumps(metadata).encode("utf-8")))
+
+        # a sample is never split between two shards
+        if self._shard is None or self._shard.offset >= self.max_shard_bytes:
+            self._start_shard()
+        assert self._shard is not None
+
+        offsets: Dict[str, List[int]] = {}
+        for suffix, data in members:
+            info = tarfile.TarInfo(key + suffix)
+            info.size = len(data)
+            self._shard.addfile(info, io.BytesIO(data))
+            # the data block is padded to 512 bytes, the header precedes it
+            data_offset = self._shard.offset \
+                - _padded_size(len(data))
+            offsets[suffix] = [data_offset, len(data)]
+
+        self._flush_shard()
+        self._index_file.write(json.dumps({
+            "key": key,
+            "shard": self._shard_name,
+            "members": offsets
+        }) + "\n")
+        self._index_file.flush()
+        self._keys.add(key)
+
+    def close(self):
+        if self._shard is not None:
+            self._shard.close()
+            self._shard = None
+        self._index_file.close()
+
+    def _start_shard(self):
+        if self._shard is not None:
+            self._shard.close()
+        self._shard_name = shard_filename(self._next_shard_number)
+        self._next_shard_number += 1
+        self._shard = tarfile.open(
+            self.folder / self._shard_name, "w", format=tarfile.PAX_FORMAT
+        )
+
+    def _flush_shard(self):
+        assert self._shard is not None
+        assert self._shard.fileobj is not None
+        self._shard.fileobj.flush()
+
+    def _load_index(self):
+        index_path = self.folder / INDEX_FILENAME
+        if not index_path.is_file():
+            return
+
+        valid_length = 0
+        with open(index_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break # a truncated line written during a crash
+                self._keys.add(json.loads(line)["key"])
+                valid_length += len(line)
+
+        # drop any partially written line
+        os.truncate(index_path, valid_length)
+
+
+def _padded_size(size: int) -> int:
+    return (size + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE \
+        * tarfile.BLOCKSIZE
@@ -0,0 +1,39 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional, Tuple
+
+
+# kinds of executors a stage can run in
+STAGE_KINDS = ["thread", "process"]
+
+
+@dataclass
+class PipelineStage:
+    """One stage of a streaming pipeline, a function applied to each item"""
+
+    name: str
+    """Name of the stage, used in the statistics"""
+
+    function: Callable[[Any], Any]
+    """Turns an input item into an output item, must be picklable for
+    process stages. An exception drops the item from the stream."""
+
+    workers: int = 1
+    """How many items are processed concurrently"""
+
+    kind: str = "thread"
+    """Whether the workers are threads or processes"""
+
+    queue_size: int = 2
+    """How many processed items can wait for the next stage, before
+    the stage stops taking new items (backpressure)"""
+
+    initializer: Optional[Callable[..., None]] = None
+    """Called at the start of each worker process"""
+
+    initargs: Tuple[Any, ...] = field(default_factory=tuple)
+    """Arguments of the initializer"""
+
+    def __post_init__(self):
+        assert self.kind in STAGE_KINDS
+        assert self.workers >= 1
+        assert self.queue_size >= 1
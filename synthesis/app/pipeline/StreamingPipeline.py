@@ -0,0 +1,229 @@
+import logging
+import queue
+import threading
+from collections import deque
+from concurrent.futures import (BrokenExecutor, Executor, Future,
+                                ProcessPoolExecutor, ThreadPoolExecutor)
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Tuple
+
+from .PipelineStage import PipelineStage
+
+
+# marks the end of the stream in the queues
+_END = object()
+
+# how often blocked queue operations check whether the pipeline is stopping
+_POLL_SECONDS = 0.1
+
+
+class StreamingPipeline:
+    """Runs items through a sequence of stages, each stage in its own
+    pool of threads or processes, with bounded queues between the stages.
+
+    A stage only takes new items while its output queue has room, so
+    a slow stage makes the stages before it wait (backpressure) instead of
+    piling up items in memory, and the slowest stage sets the throughput.
+    Items leave the pipeline in the order in which they entered it.
+    Items whose processing fails are logged and dropped. A stage that
+    cannot go on (e.g. a worker process died and broke its pool) ends
+    the stream and its error is raised from run, and so does a source
+    that raises instead of ending.
+    """
+
+    def __init__(self, stages: List[PipelineStage], source_queue_size: int = 2):
+        assert len(stages) > 0
+        self.stages = stages
+        self.source_queue_size = source_queue_size
+
+        self._queues: List[queue.Queue] = []
+        self._stop = threading.Event()
+        self._stage_errors: List[Tuple[str, BaseException]] = []
+
+        self.processed: Dict[str, int] = {stage.name: 0 for stage in stages}
+        "How many items has each stage passed on"
+
+        self.failed: Dict[str, int] = {stage.name: 0 for stage in stages}
+        "How many items has each stage dropped"
+
+        self._depth_sums: Dict[str, int] = {stage.name: 0 for stage in stages}
+        self._depth_samples = 0
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Current number of items waiting in front of each stage
+        (the "source" queue is in front of the first stage)"""
+        names = [stage.name for stage in self.stages]
+        return {
+            name: q.qsize()
+            for name, q in zip(names, self._queues)
+        }
+
+    def stats(self) -> str:
+        """Item counts and mean queue depths, a stage whose input queue
+        is mostly full is the bottleneck of the pipeline"""
+        lines: List[str] = []
+        for stage in self.stages:
+            mean_depth = self._depth_sums[stage.name] \
+                / max(self._depth_samples, 1)
+            lines.append(
+                f"Pipeline stage {stage.name}: " + \
+                f"{self.processed[stage.name]} items, " + \
+                f"{self.failed[stage.name]} failed, " + \
+                f"{stage.workers} {stage.kind} workers, " + \
+                f"mean input queue depth {mean_depth:.1f}"
+            )
+        return "\n".join(lines)
+
+    def run(self, source: Iterable[Any]) -> Iterator[Any]:
+        """Feeds the source items through the stages and yields
+        the outputs of the last stage"""
+        self._stop.clear()
+        self._stage_errors = []
+        self._queues = [queue.Queue(maxsize=self.source_queue_size)] + [
+            queue.Queue(maxsize=stage.queue_size) for stage in self.stages
+        ]
+
+        executors: List[Executor] = [
+            _create_executor(stage) for stage in self.stages
+        ]
+        threads = [threading.Thread(
+            target=self._feed,
+            args=(source, self._queues[0]),
+            name="pipeline-source",
+            daemon=True
+        )] + [
+            threading.Thread(
+                target=self._drive_stage,
+                args=(stage, executor, self._queues[i], self._queues[i + 1]),
+                name="pipeline-" + stage.name,
+                daemon=True
+            )
+            for i, (stage, executor) in enumerate(zip(self.stages, executors))
+        ]
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            output_queue = self._queues[-1]
+            while True:
+                item = output_queue.get()
+                if item is _END:
+                    break
+                self._sample_queue_depths()
+                yield item
+            if len(self._stage_errors) > 0:
+                name, error = self._stage_errors[0]
+                raise RuntimeError(
+                    f"The {name} stage of the pipeline failed"
+                ) from error
+        finally:
+            self._stop.set()
+            for executor in executors:
+                executor.shutdown(wait=False, cancel_futures=True)
+            for thread in threads:
+                thread.join()
+            for executor in executors:
+                executor.shutdown(wait=True)
+
+    def _sample_queue_depths(self):
+        for name, depth in self.queue_depths().items():
+            self._depth_sums[name] += depth
+        self._depth_samples += 1
+
+    def _feed(self, source: Iterable[Any], output_queue: queue.Queue):
+        # a failed source must not look like a complete (but shorter) one
+        try:
+            for item in source:
+                if not self._put(output_queue, item):
+                    return
+        except BaseException as e:
+            logging.exception("Error in the pipeline source:")
+            self._stage_errors.append(("source", e))
+        self._put(output_queue, _END)
+
+    def _drive_stage(
+        self,
+        stage: PipelineStage,
+        executor: Executor,
+        input_queue: queue.Queue,
+        output_queue: queue.Queue
+    ):
+        # the end is always passed on, so that run does not wait forever
+        try:
+            self._process_stage_items(
+                stage, executor, input_queue, output_queue
+            )
+        except BaseException as e:
+            logging.exception(f"The {stage.name} stage failed:")
+            self._stage_errors.append((stage.name, e))
+        finally:
+            self._put(output_queue, _END)
+
+    def _process_stage_items(
+        self,
+        stage: PipelineStage,
+        executor: Executor,
+        input_queue: queue.Queue,
+        output_queue: queue.Queue
+    ):
+        # items being processed, in the order in which they were taken
+        pending: Deque[Future] = deque()
+        input_ended = False
+
+        while not self._stop.is_set():
+            # keep all the workers busy
+            if not input_ended and len(pending) < stage.workers:
+                try:
+                    item = input_queue.get(timeout=_POLL_SECONDS)
+                except queue.Empty:
+                    pass
+                else:
+                    if item is _END:
+                        input_ended = True
+                    else:
+                        pending.append(executor.submit(stage.function, item))
+                        continue
+
+            if len(pending) == 0:
+                if input_ended:
+                    break
+                continue
+
+            # pass on the oldest item, once it is done (or when we cannot
+            # take new items anyway, wait for it)
+            if not pending[0].done() and not input_ended \
+                and len(pending) < stage.workers:
+                continue
+            future = pending.popleft()
+            try:
+                result = future.result()
+            except BrokenExecutor:
+                raise # no item can be processed anymore
+            except:
+                logging.exception(f"Error in the {stage.name} stage:")
+                self.failed[stage.name] += 1
+                continue
+            if not self._put(output_queue, result):
+                return
+            self.processed[stage.name] += 1
+
+    def _put(self, output_queue: queue.Queue, item: Any) -> bool:
+        """Blocks until there is room in the queue, returns False
+        if the pipeline stops in the meantime"""
+        while not self._stop.is_set():
+            try:
+                output_queue.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+
+def _create_executor(stage: PipelineStage) -> Executor:
+    if stage.kind == "process":
+        return ProcessPoolExecutor(
+            max_workers=stage.workers,
+            initializer=stage.initializer,
+            initargs=stage.initargs
+        )
+    return ThreadPoolExecutor(max_workers=stage.workers)
@@ -0,0 +1,113 @@
+import functools
+import hashlib
+import os
+import re
+import threading
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from ..config import MSCORE_COMMAND
+
+
+# music21 exports random part IDs and the current date, these must not
+# influence the cache key, otherwise the cache would never hit
+VOLATILE_MUSICXML_PATTERNS = [
+    re.compile(r'"P[0-9a-f]{32}"'),
+    re.compile(r"<encoding-date>[^<]*</encoding-date>"),
+]
+
+
+class MuseScoreCache:
+    """Persistent content-addressed cache of MuseScore-refined MusicXML.
+
+    The refined output depends only on the crude MusicXML text and on the
+    MuseScore binary, so the cache key is a hash of both. Entries are stored
+    as individual files, in folders sharded by the key prefix.
+    """
+
+    def __init__(
+        self,
+        cache_folder: Path,
+        musescore_command: str = MSCORE_COMMAND
+    ):
+        self.cache_folder = cache_folder
+        self.musescore_identity = musescore_identity(musescore_command)
+
+        self.hits = 0
+        "How many lookups were answered from the cache"
+
+        self.misses = 0
+        "How many lookups had to be sent to MuseScore"
+
+        self._lock = threading.Lock()
+
+    def key(self, crude_musicxml: str) -> str:
+        h = hashlib.sha256()
+        h.update(self.musescore_identity.encode("utf-8"))
+        h.update(b"\0")
+        for pattern in VOLATILE_MUSICXML_PATTERNS:
+            crude_musicxml = pattern.sub("", crude_musicxml)
+        h.update(crude_musicxml.encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_folder / key[:2] / (key + ".musicxml")
+
+    def get(self, crude_musicxml: str) -> Optional[str]:
+        """Returns the refined MusicXML for a crude MusicXML or None"""
+        path = self._path(self.key(crude_musicxml))
+        try:
+            with open(path, "r") as f:
+                refined_musicxml = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return refined_musicxml
+
+    def put(self, crude_musicxml: str, refined_musicxml: str):
+        """Stores the refined MusicXML for a crude MusicXML"""
+        path = self._path(self.key(crude_musicxml))
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # write atomically, so that a crash never leaves a truncated entry
+        tmp_path = path.with_suffix(f".{uuid.uuid4()}.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(refined_musicxml)
+        os.replace(tmp_path, path)
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        ratio = self.hits / total if total > 0 else 0.0
+        return f"MuseScore cache: {self.hits} hits, " \
+            f"{self.misses} misses ({ratio:.1%} hit ratio)"
+
+
+# written by `make extract-musescore` next to the extracted AppRun
+EXTRACTED_APPIMAGE_HASH_FILENAME = "APPIMAGE_SHA256"
+
+
+@functools.lru_cache(maxsize=None)
+def musescore_identity(musescore_command: str) -> str:
+    """Returns a hash identifying the MuseScore binary
+    
+    For an extracted AppImage, this is the hash of the original AppImage,
+    so that the cache stays valid when switching between the two.
+    """
+    hash_path = Path(musescore_command).parent \
+        / EXTRACTED_APPIMAGE_HASH_FILENAME
+    if hash_path.is_file():
+        return hash_path.read_text().strip()
+
+    h = hashlib.sha256()
+    try:
+        with open(musescore_command, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                h.update(chunk)
+    except FileNotFoundError:
+        h.update(musescore_command.encode("utf-8"))
+    return h.hexdigest()
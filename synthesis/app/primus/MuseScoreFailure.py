@@ -0,0 +1,4 @@
+class MuseScoreFailure(Exception):
+    """MuseScore ran, but did not convert the documents (non-zero exit
+    code or a missing output file). Unlike environmental errors (e.g.
+    a missing binary or a full disk), this may be caused by the input."""
@@ -0,0 +1,92 @@
+import threading
+from typing import List, Optional, Tuple
+
+
+# bounds for the automatically tuned MuseScore batch size
+MIN_AUTO_BATCH_SIZE = 5
+MAX_AUTO_BATCH_SIZE = 1000
+
+# the batch size is chosen so that the per-call overhead (AppImage mount,
+# MuseScore startup) takes at most this fraction of the call duration
+TARGET_OVERHEAD_RATIO = 0.05
+
+
+class MuseScoreTimings:
+    """Collects timing statistics of MuseScore invocations.
+
+    The duration of a call is modelled as `overhead + per_file * file_count`
+    and both parameters are estimated by least squares from all the calls.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        "How many times was MuseScore invoked"
+
+        self.files = 0
+        "How many files were converted in total"
+
+        self.seconds = 0.0
+        "Total wall-clock time spent in MuseScore"
+
+        self._samples: List[Tuple[int, float]] = []
+        self._lock = threading.Lock()
+
+    def record(self, file_count: int, seconds: float):
+        """Records one MuseScore invocation"""
+        with self._lock:
+            self.calls += 1
+            self.files += file_count
+            self.seconds += seconds
+            self._samples.append((file_count, seconds))
+
+    def fit(self) -> Optional[Tuple[float, float]]:
+        """Returns the estimated (overhead, per_file) seconds, or None if
+        there are not enough distinct batch sizes to tell them apart"""
+        with self._lock:
+            samples = list(self._samples)
+
+        n = len(samples)
+        if len(set(count for count, _ in samples)) < 2:
+            return None
+
+        mean_x = sum(count for count, _ in samples) / n
+        mean_y = sum(seconds for _, seconds in samples) / n
+        var_x = sum((count - mean_x) ** 2 for count, _ in samples)
+        cov_xy = sum(
+            (count - mean_x) * (seconds - mean_y)
+            for count, seconds in samples
+        )
+        per_file = cov_xy / var_x
+        overhead = mean_y - per_file * mean_x
+
+        if per_file <= 0:
+            return None
+        return max(overhead, 0.0), per_file
+
+    def suggest_batch_size(self, current_batch_size: int) -> int:
+        """Suggests the batch size for the next MuseScore call"""
+        estimate = self.fit()
+
+        # explore larger batches until the model can be fitted
+        if estimate is None:
+            return min(max(current_batch_size, MIN_AUTO_BATCH_SIZE) * 2,
+                MAX_AUTO_BATCH_SIZE)
+
+        # throughput n / (overhead + per_file * n) only grows with n,
+        # so pick the smallest n where the overhead is small enough
+        overhead, per_file = estimate
+        ratio = TARGET_OVERHEAD_RATIO
+        batch_size = int(overhead * (1 - ratio) / (ratio * per_file))
+        return min(max(batch_size, MIN_AUTO_BATCH_SIZE), MAX_AUTO_BATCH_SIZE)
+
+    def stats(self) -> str:
+        text = f"MuseScore timings: {self.calls} calls, {self.files} files, " \
+            f"{self.seconds:.1f}s"
+        if self.seconds > 0:
+            text += f" ({self.files / self.seconds:.1f} files/s per worker)"
+        estimate = self.fit()
+        if estimate is not None:
+            overhead, per_file = estimate
+            text += f", estimated {overhead:.2f}s overhead per call" \
+                f" and {per_file:.3f}s per file"
+        return text
@@ -0,0 +1,139 @@
+import mmap
+from pathlib import Path
+from typing import Dict, Generator, List, Optional, Tuple
+
+from .Primus2018Iterable import Incipit
+
+
+# NOTE: the container is created by the ingest_primus.py script, it consists
+# of two files:
+# - incipits.bin: concatenated UTF-8 bytes of all the MEI and agnostic files
+# - index.tsv: one line per incipit with the incipit ID and byte offsets
+#   and lengths of its MEI and agnostic data inside the incipits.bin file
+# Optionally, there is also the measure index (see index_measure_counts.py):
+# - measure_counts.tsv: one line per incipit with its measure count
+
+
+BLOB_FILENAME = "incipits.bin"
+INDEX_FILENAME = "index.tsv"
+INDEX_HEADER = [
+    "incipit_id",
+    "mei_offset", "mei_length",
+    "agnostic_offset", "agnostic_length"
+]
+MEASURE_COUNTS_FILENAME = "measure_counts.tsv"
+MEASURE_COUNTS_HEADER = ["incipit_id", "measure_count"]
+
+
+class PrimusContainer:
+    """Provides random access to the ingested PrIMuS 2018 dataset.
+
+    Unlike the Primus2018Iterable, any incipit can be fetched by its ID
+    or ordinal without decompressing the whole archive. Ordinals follow
+    the order of the Primus2018Iterable (skipped incipits are not present).
+    """
+
+    def __init__(self, container_folder: Path):
+        self.container_folder = container_folder
+
+        self._incipit_ids: List[str] = []
+        self._ordinals: Dict[str, int] = {}
+        self._offsets: List[Tuple[int, int, int, int]] = []
+        self._load_index()
+
+        # loaded lazily, only when needed
+        self._measure_counts: Optional[Dict[str, int]] = None
+
+        # opened lazily, so that the container can be sent to other processes
+        self._blob: Optional[mmap.mmap] = None
+
+    @staticmethod
+    def is_ingested(container_folder: Path) -> bool:
+        """Returns true if the container exists and has been fully written"""
+        return (container_folder / INDEX_FILENAME).is_file() \
+            and (container_folder / BLOB_FILENAME).is_file()
+
+    def _load_index(self):
+        with open(self.container_folder / INDEX_FILENAME, "r") as f:
+            header = f.readline().rstrip("\n").split("\t")
+            assert header == INDEX_HEADER, "Unexpected container index header"
+            for line in f:
+                incipit_id, *offsets = line.rstrip("\n").split("\t")
+                self._ordinals[incipit_id] = len(self._incipit_ids)
+                self._incipit_ids.append(incipit_id)
+                self._offsets.append(tuple(int(o) for o in offsets))
+
+    @staticmethod
+    def has_measure_counts(container_folder: Path) -> bool:
+        """Returns true if the measure count index has been computed"""
+        return (container_folder / MEASURE_COUNTS_FILENAME).is_file()
+
+    @property
+    def measure_counts(self) -> Dict[str, int]:
+        """Measure counts of incipits by their ID, from the measure index"""
+        if self._measure_counts is None:
+            measure_counts: Dict[str, int] = {}
+            with open(self.container_folder / MEASURE_COUNTS_FILENAME) as f:
+                header = f.readline().rstrip("\n").split("\t")
+                assert header == MEASURE_COUNTS_HEADER, \
+                    "Unexpected measure count index header"
+                for line in f:
+                    incipit_id, count = line.rstrip("\n").split("\t")
+                    measure_counts[incipit_id] = int(count)
+            self._measure_counts = measure_counts
+        return self._measure_counts
+
+    def _get_blob(self) -> mmap.mmap:
+        if self._blob is None:
+            with open(self.container_folder / BLOB_FILENAME, "rb") as f:
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._blob
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_blob"] = None
+        return state
+
+    def __len__(self) -> int:
+        return len(self._incipit_ids)
+
+    def __contains__(self, incipit_id: str) -> bool:
+        return incipit_id in self._ordinals
+
+    def __getitem__(self, ordinal: int) -> Incipit:
+        mei_offset, mei_length, agnostic_offset, agnostic_length \
+            = self._offsets[ordinal]
+        blob = self._get_blob()
+        return Incipit(
+            incipit_id=self._incipit_ids[ordinal],
+            mei=blob[mei_offset:mei_offset + mei_length].decode("utf-8"),
+            agnostic=blob[
+                agnostic_offset:agnostic_offset + agnostic_length
+            ].decode("utf-8")
+        )
+
+    def __iter__(self) -> Generator[Incipit, None, None]:
+        return self.iter_slice(0, len(self))
+
+    @property
+    def incipit_ids(self) -> List[str]:
+        """IDs of all the incipits, in the order of their ordinals"""
+        return self._incipit_ids
+
+    def ordinal_of(self, incipit_id: str) -> int:
+        """Returns the ordinal of an incipit, given its ID"""
+        return self._ordinals[incipit_id]
+
+    def get(self, incipit_id: str) -> Incipit:
+        """Fetches an incipit by its ID"""
+        return self[self._ordinals[incipit_id]]
+
+    def iter_slice(
+        self,
+        start: int,
+        stop: int
+    ) -> Generator[Incipit, None, None]:
+        """Iterates over a contiguous range of ordinals. Disjoint slices
+        can be read by parallel workers independently."""
+        for ordinal in range(max(start, 0), min(stop, len(self))):
+            yield self[ordinal]
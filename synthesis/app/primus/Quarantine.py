@@ -0,0 +1,40 @@
+import threading
+from pathlib import Path
+from typing import Set
+
+
+class Quarantine:
+    """Persistent list of incipit IDs that MuseScore fails on.
+
+    The list is stored as a text file with one incipit ID per line
+    and new IDs are appended as they are discovered, so that later runs
+    can skip these incipits up front.
+    """
+
+    def __init__(self, quarantine_path: Path):
+        self.quarantine_path = quarantine_path
+        self._incipit_ids: Set[str] = set()
+        self._lock = threading.Lock()
+
+        if quarantine_path.is_file():
+            with open(quarantine_path, "r") as f:
+                self._incipit_ids = set(
+                    line.strip() for line in f if line.strip() != ""
+                )
+
+    def __contains__(self, incipit_id: str) -> bool:
+        return incipit_id in self._incipit_ids
+
+    def __len__(self) -> int:
+        return len(self._incipit_ids)
+
+    def add(self, incipit_id: str):
+        """Quarantines an incipit and persists the change immediately"""
+        with self._lock:
+            if incipit_id in self._incipit_ids:
+                return
+            self._incipit_ids.add(incipit_id)
+
+            self.quarantine_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.quarantine_path, "a") as f:
+                print(incipit_id, file=f)
@@ -0,0 +1,17 @@
+import xml.etree.ElementTree as ET
+
+from .mei_remove_multirests import MEI_XMLNS
+
+
+MEASURE_TAG = "{" + MEI_XMLNS + "}measure"
+
+
+def count_mei_measures(mei: str) -> int:
+    """Counts measures of a PrIMuS MEI document without music21.
+
+    Multi-measure rests are replaced by one-measure rests during the
+    conversion to MusicXML, so each MEI measure element is one measure
+    of the resulting MusicXML as well.
+    """
+    root = ET.fromstring(mei)
+    return sum(1 for _ in root.iter(MEASURE_TAG))
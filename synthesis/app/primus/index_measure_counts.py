@@ -0,0 +1,36 @@
+import os
+from pathlib import Path
+
+import tqdm
+
+from .count_mei_measures import count_mei_measures
+from .PrimusContainer import (MEASURE_COUNTS_FILENAME, MEASURE_COUNTS_HEADER,
+                              PrimusContainer)
+
+
+def index_measure_counts(container_folder: Path):
+    """Computes the measure count of each incipit of an ingested container
+    and stores it next to the container index. Page planning then does not
+    need to parse any MusicXML to know how many measures an incipit has."""
+
+    container = PrimusContainer(container_folder)
+    counts_path = container_folder / MEASURE_COUNTS_FILENAME
+    tmp_counts_path = counts_path.with_suffix(".tsv.tmp")
+
+    with open(tmp_counts_path, "w") as f:
+        print(*MEASURE_COUNTS_HEADER, sep="\t", file=f)
+        for incipit in tqdm.tqdm(container, desc="Counting measures"):
+            print(
+                incipit.incipit_id,
+                count_mei_measures(incipit.mei),
+                sep="\t",
+                file=f
+            )
+    
+    os.replace(tmp_counts_path, counts_path)
+
+
+# .venv/bin/python3 -m app.primus.index_measure_counts
+if __name__ == "__main__":
+    from ..config import PRIMUS_CONTAINER_FOLDER
+    index_measure_counts(PRIMUS_CONTAINER_FOLDER)
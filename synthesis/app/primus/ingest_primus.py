@@ -0,0 +1,65 @@
+import os
+from pathlib import Path
+
+import tqdm
+
+from .index_measure_counts import index_measure_counts
+from .Primus2018Iterable import Primus2018Iterable
+from .PrimusContainer import (BLOB_FILENAME, INDEX_FILENAME, INDEX_HEADER,
+                              PrimusContainer)
+
+
+def ingest_primus(primus_tgz_path: Path, container_folder: Path):
+    """Converts the PrIMuS tgz archive into an indexed PrimusContainer.
+
+    This is a one-time step, that lets all the subsequent runs access
+    incipits at random, without going through the gzip stream again.
+    The measure count index is computed as well.
+    """
+
+    container_folder.mkdir(parents=True, exist_ok=True)
+    blob_path = container_folder / BLOB_FILENAME
+    index_path = container_folder / INDEX_FILENAME
+
+    # write into temporary files first, so that an interrupted ingest
+    # is not mistaken for a finished one
+    tmp_blob_path = blob_path.with_suffix(".bin.tmp")
+    tmp_index_path = index_path.with_suffix(".tsv.tmp")
+
+    primus = Primus2018Iterable(primus_tgz_path)
+
+    offset = 0
+    with open(tmp_blob_path, "wb") as blob_file, \
+        open(tmp_index_path, "w") as index_file:
+        print(*INDEX_HEADER, sep="\t", file=index_file)
+
+        for incipit in tqdm.tqdm(primus, desc="Ingesting PrIMuS"):
+            mei = incipit.mei.encode("utf-8")
+            agnostic = incipit.agnostic.encode("utf-8")
+
+            blob_file.write(mei)
+            blob_file.write(agnostic)
+
+            print(
+                incipit.incipit_id,
+                offset, len(mei),
+                offset + len(mei), len(agnostic),
+                sep="\t",
+                file=index_file
+            )
+            offset += len(mei) + len(agnostic)
+
+    os.replace(tmp_blob_path, blob_path)
+    os.replace(tmp_index_path, index_path)
+
+    index_measure_counts(container_folder)
+
+
+# .venv/bin/python3 -m app.primus.ingest_primus
+if __name__ == "__main__":
+    from ..config import PRIMUS_CONTAINER_FOLDER, PRIMUS_TGZ_PATH
+    ingest_primus(
+        primus_tgz_path=PRIMUS_TGZ_PATH,
+        container_folder=PRIMUS_CONTAINER_FOLDER
+    )
+    print("Ingested incipits:", len(PrimusContainer(PRIMUS_CONTAINER_FOLDER)))
@@ -2,69 +2,198 @@ import json
 import os
 import subprocess
 import tempfile
-import uuid
+import time
 from pathlib import Path
-from typing import List, Sequence, Tuple
+from typing import Callable, List, Optional, Sequence, Tuple
 
 from ..config import MSCORE_COMMAND
+from .MuseScoreCache import MuseScoreCache
+from .MuseScoreFailure import MuseScoreFailure
+from .MuseScoreTimings import MuseScoreTimings
 
 
 def refine_musicxml_batch_via_musescore(
     musicxml_batch: Sequence[str],
-    tmp_folder: Path
+    tmp_folder: Path,
+    cache: Optional[MuseScoreCache] = None,
+    timings: Optional[MuseScoreTimings] = None
 ) -> List[str]:
     """Refines a list of musicxml strings by passing them through MuseScore
     
     This cleans up voice numbers, measure numbers, fills in stem orientations,
     and much more. Acts as MusicXML canonicalization for the synthesizer.
+
+    If a cache is given, only the cache misses are sent to MuseScore.
+    If timings are given, each MuseScore invocation is recorded there.
     """
+    return _refine_through_cache( # type: ignore
+        musicxml_batch=musicxml_batch,
+        tmp_folder=tmp_folder,
+        cache=cache,
+        timings=timings,
+        run_musescore=_run_musescore_on_batch
+    )
 
-    tmp_folder.mkdir(parents=True, exist_ok=True)
 
-    # generate pairs of paths "crude_file", "refined_file"
-    prefix = str(uuid.uuid4())
-    conversions = [
-        (
-            tmp_folder / f"{prefix}_crude_{i}.musicxml",
-            tmp_folder / f"{prefix}_refined_{i}.musicxml"
-        )
-        for i in range(len(musicxml_batch))
+def refine_musicxml_batch_with_bisection(
+    musicxml_batch: Sequence[str],
+    tmp_folder: Path,
+    cache: Optional[MuseScoreCache] = None,
+    timings: Optional[MuseScoreTimings] = None
+) -> List[Optional[str]]:
+    """Refines a list of musicxml strings just like the
+    `refine_musicxml_batch_via_musescore` function, but when MuseScore
+    fails, the batch is split in halves recursively, so that only the
+    documents that fail on their own are lost. These are returned as None.
+
+    Only failures of MuseScore itself are bisected, other errors (e.g.
+    a missing binary or a full disk) are raised, as are the failures
+    of batches in which no document converts at all, because then
+    the environment is to blame rather than the documents.
+    """
+    return _refine_through_cache(
+        musicxml_batch=musicxml_batch,
+        tmp_folder=tmp_folder,
+        cache=cache,
+        timings=timings,
+        run_musescore=_run_musescore_with_bisection
+    )
+
+
+def _refine_through_cache(
+    musicxml_batch: Sequence[str],
+    tmp_folder: Path,
+    cache: Optional[MuseScoreCache],
+    timings: Optional[MuseScoreTimings],
+    run_musescore: Callable[
+        [Sequence[str], Path, Optional[MuseScoreTimings]],
+        Sequence[Optional[str]]
     ]
+) -> List[Optional[str]]:
+    if cache is None:
+        return list(run_musescore(musicxml_batch, tmp_folder, timings))
+
+    # look up the cache
+    refined_batch: List[Optional[str]] = [
+        cache.get(xml) for xml in musicxml_batch
+    ]
+    miss_indices = [
+        i for i, refined in enumerate(refined_batch) if refined is None
+    ]
+
+    # refine the misses and store them in the cache
+    if len(miss_indices) > 0:
+        refined_misses = run_musescore(
+            [musicxml_batch[i] for i in miss_indices],
+            tmp_folder,
+            timings
+        )
+        for i, refined in zip(miss_indices, refined_misses):
+            if refined is None:
+                continue
+            cache.put(musicxml_batch[i], refined)
+            refined_batch[i] = refined
+
+    return refined_batch
+
+
+def _run_musescore_with_bisection(
+    musicxml_batch: Sequence[str],
+    tmp_folder: Path,
+    timings: Optional[MuseScoreTimings]
+) -> List[Optional[str]]:
+    refined_batch = _bisect_musescore_failures(
+        musicxml_batch, tmp_folder, timings
+    )
+    if len(refined_batch) > 1 \
+        and all(refined is None for refined in refined_batch):
+        raise MuseScoreFailure(
+            "MuseScore failed on every document of the batch"
+        )
+    return refined_batch
 
-    # write the batch to filesystem
-    for i, xml in enumerate(musicxml_batch):
-        with open(conversions[i][0], "w") as f:
-            f.write(xml)
 
+def _bisect_musescore_failures(
+    musicxml_batch: Sequence[str],
+    tmp_folder: Path,
+    timings: Optional[MuseScoreTimings]
+) -> List[Optional[str]]:
     try:
+        return list(_run_musescore_on_batch(
+            musicxml_batch, tmp_folder, timings
+        ))
+    except MuseScoreFailure:
+        if len(musicxml_batch) == 1:
+            return [None]
+    
+    middle = len(musicxml_batch) // 2
+    return _bisect_musescore_failures(
+        musicxml_batch[:middle], tmp_folder, timings
+    ) + _bisect_musescore_failures(
+        musicxml_batch[middle:], tmp_folder, timings
+    )
+
+
+def _run_musescore_on_batch(
+    musicxml_batch: Sequence[str],
+    tmp_folder: Path,
+    timings: Optional[MuseScoreTimings]
+) -> List[str]:
+    tmp_folder.mkdir(parents=True, exist_ok=True)
+
+    # each batch gets its own folder, so that multiple MuseScore
+    # processes can run concurrently
+    with tempfile.TemporaryDirectory(
+        prefix="musescore_", dir=tmp_folder
+    ) as batch_folder_name:
+        batch_folder = Path(batch_folder_name)
+
+        # generate pairs of paths "crude_file", "refined_file"
+        conversions = [
+            (
+                batch_folder / f"crude_{i}.musicxml",
+                batch_folder / f"refined_{i}.musicxml"
+            )
+            for i in range(len(musicxml_batch))
+        ]
+
+        # write the batch to filesystem
+        for i, xml in enumerate(musicxml_batch):
+            with open(conversions[i][0], "w") as f:
+                f.write(xml)
 
         # execute musescore
         execute_musescore_conversions(
             conversions=conversions,
-            soft=False
+            soft=False,
+            job_folder=batch_folder,
+            timings=timings
         )
 
         # load the refined batch
         refined_batch: List[str] = []
         for i, xml in enumerate(musicxml_batch):
+            if not conversions[i][1].is_file():
+                raise MuseScoreFailure(
+                    "MuseScore did not produce " + conversions[i][1].name
+                )
             with open(conversions[i][1], "r") as f:
                 refined_batch.append(f.read())
-        
-    finally:
-
-        # delete all files
-        for crude, refined in conversions:
-            crude.unlink()
-            refined.unlink()
     
     return refined_batch
 
 
 def execute_musescore_conversions(
     conversions: List[Tuple[Path, Path]],
-    soft: bool
+    soft: bool,
+    job_folder: Optional[Path] = None,
+    timings: Optional[MuseScoreTimings] = None
 ):
-    """Executes MuseScore on a conversions.json file"""
+    """Executes MuseScore on a conversions.json file
+    
+    The job JSON file is created in the given folder,
+    or in the system temporary folder by default.
+    """
 
     # create the conversion json file
     batch_instructions = []
@@ -80,20 +209,28 @@ def execute_musescore_conversions(
         return
 
     # run musescore conversion
-    tmp = tempfile.NamedTemporaryFile(mode="w", delete=False)
+    tmp = tempfile.NamedTemporaryFile(
+        mode="w", suffix=".json", dir=job_folder, delete=False
+    )
     try:
         json.dump(batch_instructions, tmp)
         tmp.close()
 
+        start_time = time.monotonic()
         result = subprocess.run(
             [MSCORE_COMMAND, "-j", tmp.name],
             capture_output=True,
             text=True
         )
+        if timings is not None:
+            timings.record(
+                file_count=len(batch_instructions),
+                seconds=time.monotonic() - start_time
+            )
         if result.returncode != 0:
             print("MUSESCORE STANDARD ERROR OUTPUT:")
             print(result.stderr)
-            raise Exception("MuseScore did not terminate successfully")
+            raise MuseScoreFailure("MuseScore did not terminate successfully")
     finally:
         tmp.close()
         os.unlink(tmp.name)
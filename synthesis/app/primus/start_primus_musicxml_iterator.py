@@ -1,15 +1,23 @@
 import itertools
 import logging
+from collections import deque
+from concurrent.futures import (Executor, Future, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterator
+from typing import Deque, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 import tqdm
 
 from .mei_to_crude_musicxml import mei_to_crude_musicxml
+from .MuseScoreCache import MuseScoreCache
+from .MuseScoreTimings import MuseScoreTimings
 from .Primus2018Iterable import Incipit, Primus2018Iterable
+from .PrimusContainer import PrimusContainer
+from .Quarantine import Quarantine
 from .refine_musicxml_batch_via_musescore import \
-    refine_musicxml_batch_via_musescore
+    refine_musicxml_batch_with_bisection
+from ..stages.StageStore import StageStore
 
 
 @dataclass
@@ -22,44 +30,289 @@ def start_primus_musicxml_iterator(
     primus_tgz_path: Path,
     tmp_folder: Path,
     musescore_batch_size: int,
-    with_tqdm: bool = False
+    with_tqdm: bool = False,
+    primus_container_folder: Optional[Path] = None,
+    mei_conversion_workers: int = 0,
+    musescore_cache_folder: Optional[Path] = None,
+    musescore_workers: int = 1,
+    prefetch_batches: Optional[int] = None,
+    quarantine_path: Optional[Path] = None,
+    auto_tune_batch_size: bool = False,
+    crude_store: Optional[StageStore] = None,
+    refined_store: Optional[StageStore] = None,
+    incipit_ids: Optional[Sequence[str]] = None
 ) -> Iterator[MusicXmlIncipit]:
-    """Returns an iterator that returns MusicXML incipits"""
+    """Returns an iterator that returns MusicXML incipits
+    
+    If the ingested PrIMuS container folder is given and exists,
+    incipits are read from it instead of the tgz archive.
+
+    With a positive number of MEI conversion workers, each batch of MEI
+    documents is converted to crude MusicXML in a pool of processes.
+    The order of yielded incipits stays the same.
+
+    If a MuseScore cache folder is given, refined MusicXML is persisted
+    there and MuseScore is only invoked on cache misses.
+
+    Batches are processed by a pool of MuseScore workers in the background,
+    each running its own MuseScore process. At most `prefetch_batches`
+    batches (twice the number of workers by default) are being processed
+    or waiting to be consumed at any time.
+
+    When MuseScore fails on a batch, the batch is bisected to isolate
+    the failing incipits. These are dropped and, if a quarantine path
+    is given, remembered there, so that later runs skip them up front.
+
+    MuseScore invocations are timed and the statistics are printed at the
+    end. With batch size auto-tuning, the given batch size is only the
+    initial one and later batches are sized from the measured per-call
+    overhead and per-file cost.
+
+    Stage stores materialize the crude and refined MusicXML per incipit,
+    so that a resumed build does not convert the same incipits again.
+
+    If incipit IDs are given, only these incipits are yielded, in the given
+    order. This requires the ingested PrIMuS container.
+    """
 
-    primus = Primus2018Iterable(primus_tgz_path)
+    if prefetch_batches is None:
+        prefetch_batches = 2 * musescore_workers
+    assert musescore_workers >= 1
+    assert prefetch_batches >= 1
 
+    primus: Iterable[Incipit]
+    if primus_container_folder is not None \
+        and PrimusContainer.is_ingested(primus_container_folder):
+        primus = PrimusContainer(primus_container_folder)
+    else:
+        primus = Primus2018Iterable(primus_tgz_path)
+
+    if incipit_ids is not None:
+        assert isinstance(primus, PrimusContainer), \
+            "Selecting incipits by ID requires the ingested PrIMuS container"
+        primus = _SelectedIncipits(primus, incipit_ids)
+
+    progress_bar: Optional[tqdm.tqdm] = None
     if with_tqdm:
         progress_bar = tqdm.tqdm(total=len(primus))
 
+    quarantine: Optional[Quarantine] = None
+    if quarantine_path is not None:
+        quarantine = Quarantine(quarantine_path)
+
     primus_iterator = iter(primus)
+    if quarantine is not None and len(quarantine) > 0:
+        primus_iterator = (
+            incipit for incipit in primus_iterator
+            if incipit.incipit_id not in quarantine
+        )
+
+    cache: Optional[MuseScoreCache] = None
+    if musescore_cache_folder is not None:
+        cache = MuseScoreCache(musescore_cache_folder)
+
+    mei_pool: Optional[Executor] = None
+    if mei_conversion_workers > 0:
+        mei_pool = ProcessPoolExecutor(max_workers=mei_conversion_workers)
     
-    while incipit_batch := tuple(
-        itertools.islice(primus_iterator, musescore_batch_size)
-    ):
-        try:
-            crude_musicxml_batch = tuple(
-                mei_to_crude_musicxml(incipit.mei)
-                for incipit in incipit_batch
-            )
-            
-            refined_musicxml_batch = refine_musicxml_batch_via_musescore(
-                musicxml_batch=crude_musicxml_batch,
-                tmp_folder=tmp_folder
-            )
+    musescore_pool = ThreadPoolExecutor(max_workers=musescore_workers)
 
-            for musicxml, incipit in zip(
-                refined_musicxml_batch, incipit_batch
-            ):
-                if with_tqdm:
-                    progress_bar.update(1)
+    timings = MuseScoreTimings()
+    
+    try:
+        yield from _iterate_batches(
+            primus_iterator=primus_iterator,
+            tmp_folder=tmp_folder,
+            musescore_batch_size=musescore_batch_size,
+            mei_pool=mei_pool,
+            musescore_pool=musescore_pool,
+            prefetch_batches=prefetch_batches,
+            cache=cache,
+            quarantine=quarantine,
+            timings=timings,
+            auto_tune_batch_size=auto_tune_batch_size,
+            crude_store=crude_store,
+            refined_store=refined_store,
+            progress_bar=progress_bar
+        )
+    finally:
+        musescore_pool.shutdown(cancel_futures=True)
+        if mei_pool is not None:
+            mei_pool.shutdown(cancel_futures=True)
+        if cache is not None:
+            print(cache.stats())
+        print(timings.stats())
+    
+    if progress_bar is not None:
+        progress_bar.close()
 
-                yield MusicXmlIncipit(
-                    musicxml=musicxml,
-                    original_incipit=incipit
-                )
+
+class _SelectedIncipits:
+    """Incipits of a container, selected and ordered by their IDs"""
+    def __init__(self, container: PrimusContainer, incipit_ids: Sequence[str]):
+        self.container = container
+        self.incipit_ids = incipit_ids
+    
+    def __len__(self) -> int:
+        return len(self.incipit_ids)
+    
+    def __iter__(self) -> Iterator[Incipit]:
+        for incipit_id in self.incipit_ids:
+            yield self.container.get(incipit_id)
+
+
+def _iterate_batches(
+    primus_iterator: Iterator[Incipit],
+    tmp_folder: Path,
+    musescore_batch_size: int,
+    mei_pool: Optional[Executor],
+    musescore_pool: Executor,
+    prefetch_batches: int,
+    cache: Optional[MuseScoreCache],
+    quarantine: Optional[Quarantine],
+    timings: MuseScoreTimings,
+    auto_tune_batch_size: bool,
+    crude_store: Optional[StageStore],
+    refined_store: Optional[StageStore],
+    progress_bar: Optional[tqdm.tqdm]
+) -> Iterator[MusicXmlIncipit]:
+    # batches being processed, in the order in which they were read
+    pending: Deque[Tuple[Tuple[Incipit, ...], Future]] = deque()
+
+    batch_size = musescore_batch_size
+
+    while True:
+        # keep the pool busy, but do not read ahead too far
+        while len(pending) < prefetch_batches and (incipit_batch := tuple(
+            itertools.islice(primus_iterator, batch_size)
+        )):
+            pending.append((incipit_batch, musescore_pool.submit(
+                _process_batch,
+                incipit_batch=incipit_batch,
+                tmp_folder=tmp_folder,
+                mei_pool=mei_pool,
+                cache=cache,
+                timings=timings,
+                crude_store=crude_store,
+                refined_store=refined_store
+            )))
+
+            if auto_tune_batch_size and timings.calls > 0:
+                batch_size = timings.suggest_batch_size(batch_size)
+        
+        if len(pending) == 0:
+            break
+
+        incipit_batch, future = pending.popleft()
+        try:
+            refined_musicxml_batch = future.result()
         except:
             logging.exception("Error in primus musicxml iterator:")
             continue
+
+        if progress_bar is not None:
+            progress_bar.set_postfix(
+                batch_size=batch_size,
+                **(dict(
+                    cache_hits=cache.hits,
+                    cache_misses=cache.misses
+                ) if cache is not None else {})
+            )
+
+        for musicxml, incipit in zip(
+            refined_musicxml_batch, incipit_batch
+        ):
+            if progress_bar is not None:
+                progress_bar.update(1)
+
+            if musicxml is None:
+                logging.error(
+                    "MuseScore fails on incipit: " + incipit.incipit_id
+                )
+                if quarantine is not None:
+                    quarantine.add(incipit.incipit_id)
+                continue
+
+            yield MusicXmlIncipit(
+                musicxml=musicxml,
+                original_incipit=incipit
+            )
+
+
+def _process_batch(
+    incipit_batch: Sequence[Incipit],
+    tmp_folder: Path,
+    mei_pool: Optional[Executor],
+    cache: Optional[MuseScoreCache],
+    timings: MuseScoreTimings,
+    crude_store: Optional[StageStore],
+    refined_store: Optional[StageStore]
+) -> List[Optional[str]]:
+    """Turns a batch of incipits into refined MusicXML,
+    runs in a MuseScore pool worker thread"""
+    refined_batch: List[Optional[str]] = [None] * len(incipit_batch)
+
+    # reuse refined MusicXML materialized by previous runs
+    todo_indices: List[int] = []
+    for i, incipit in enumerate(incipit_batch):
+        if refined_store is not None and incipit.incipit_id in refined_store:
+            refined_batch[i] = refined_store.get(incipit.incipit_id)
+        else:
+            todo_indices.append(i)
     
-    if with_tqdm:
-        progress_bar.close()
+    if len(todo_indices) == 0:
+        return refined_batch
+    todo_incipits = [incipit_batch[i] for i in todo_indices]
+
+    crude_musicxml_batch = _convert_mei_batch(
+        incipit_batch=todo_incipits,
+        mei_pool=mei_pool,
+        crude_store=crude_store
+    )
+    
+    refined_todo = refine_musicxml_batch_with_bisection(
+        musicxml_batch=crude_musicxml_batch,
+        tmp_folder=tmp_folder,
+        cache=cache,
+        timings=timings
+    )
+
+    for i, incipit, refined in zip(todo_indices, todo_incipits, refined_todo):
+        refined_batch[i] = refined
+        if refined_store is not None and refined is not None:
+            refined_store.put(incipit.incipit_id, refined)
+
+    return refined_batch
+
+
+def _convert_mei_batch(
+    incipit_batch: Sequence[Incipit],
+    mei_pool: Optional[Executor],
+    crude_store: Optional[StageStore]
+) -> Tuple[str, ...]:
+    """Converts MEI of a batch of incipits to crude MusicXML,
+    either on the current thread, or in the given process pool"""
+    crude_batch: List[Optional[str]] = [None] * len(incipit_batch)
+    
+    # reuse crude MusicXML materialized by previous runs
+    todo_indices: List[int] = []
+    for i, incipit in enumerate(incipit_batch):
+        if crude_store is not None and incipit.incipit_id in crude_store:
+            crude_batch[i] = crude_store.get(incipit.incipit_id)
+        else:
+            todo_indices.append(i)
+    
+    meis = [incipit_batch[i].mei for i in todo_indices]
+
+    if mei_pool is None:
+        converted = [mei_to_crude_musicxml(mei) for mei in meis]
+    else:
+        # executor.map preserves the order of the input
+        converted = list(mei_pool.map(mei_to_crude_musicxml, meis))
+    
+    for i, crude in zip(todo_indices, converted):
+        crude_batch[i] = crude
+        if crude_store is not None:
+            crude_store.put(incipit_batch[i].incipit_id, crude)
+
+    return tuple(crude_batch) # type: ignore
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
 import music21.stream.base
 
 import smashcima as sc
@@ -21,8 +21,9 @@ class PageContent:
     incipits: List[MusicXmlIncipit]
     """Primus MusicXml incipits that make up the content of this page"""
 
-    music21_score: music21.stream.base.Score
-    """The Music21 score of the content"""
+    music21_score: Optional[music21.stream.base.Score]
+    """The Music21 score of the content (not present when the content
+    is loaded from the page content stage store)"""
 
     musicxml: str
     """MusicXML contents of the page"""
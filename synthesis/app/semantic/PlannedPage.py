@@ -0,0 +1,42 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from .PageLayout import PageLayout
+
+
+@dataclass
+class PlannedPage:
+    """Assignment of a domain, a layout and incipits to a page"""
+
+    identifier: str
+    """String identifier of the page, used for resulting file names"""
+
+    dataset_domain: str
+    """The domain of the page, either "M" or "C" """
+
+    layout: PageLayout
+    """Layout of the page"""
+
+    incipit_ids: List[str]
+    """IDs of the Primus incipits that make up the content of this page"""
+
+    def to_record(self) -> Dict[str, Any]:
+        """Serializes the plan into a JSON record"""
+        return {
+            "identifier": self.identifier,
+            "dataset_domain": self.dataset_domain,
+            "measures_per_staff": self.layout.measures_per_staff,
+            "incipit_ids": self.incipit_ids
+        }
+    
+    @staticmethod
+    def from_record(record: Dict[str, Any]) -> "PlannedPage":
+        """Deserializes the plan from a JSON record"""
+        return PlannedPage(
+            identifier=record["identifier"],
+            dataset_domain=record["dataset_domain"],
+            layout=PageLayout(
+                measures_per_staff=record["measures_per_staff"]
+            ),
+            incipit_ids=record["incipit_ids"]
+        )
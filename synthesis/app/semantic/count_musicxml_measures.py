@@ -0,0 +1,11 @@
+import xml.etree.ElementTree as ET
+
+
+def count_musicxml_measures(musicxml: str) -> int:
+    """Returns the number of measures in the first part of a MusicXML,
+    reads the XML tree directly, as music21 parsing is way too slow"""
+    root = ET.fromstring(musicxml)
+    part = root.find("part")
+    if part is None:
+        return 0
+    return len(part.findall("measure"))
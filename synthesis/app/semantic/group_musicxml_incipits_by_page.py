@@ -0,0 +1,29 @@
+from typing import Iterable, Iterator, List, Tuple
+
+from ..primus.start_primus_musicxml_iterator import MusicXmlIncipit
+from .PlannedPage import PlannedPage
+
+
+def group_musicxml_incipits_by_page(
+    primus_musicxml_iterator: Iterator[MusicXmlIncipit],
+    planned_pages: Iterable[PlannedPage]
+) -> Iterator[Tuple[PlannedPage, List[MusicXmlIncipit]]]:
+    """Groups a stream of incipits into the planned pages.
+
+    The stream must follow the order of incipits in the plan, but some
+    incipits may be missing (e.g. those that MuseScore fails on). Pages
+    get only the incipits that are available and pages left with no
+    incipits are skipped.
+    """
+    head = next(primus_musicxml_iterator, None)
+
+    for planned_page in planned_pages:
+        incipit_ids = set(planned_page.incipit_ids)
+        incipits: List[MusicXmlIncipit] = []
+        while head is not None \
+            and head.original_incipit.incipit_id in incipit_ids:
+            incipits.append(head)
+            head = next(primus_musicxml_iterator, None)
+        
+        if len(incipits) > 0:
+            yield planned_page, incipits
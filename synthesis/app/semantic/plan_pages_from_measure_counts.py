@@ -0,0 +1,106 @@
+import random
+from collections import deque
+from typing import Container, Deque, Dict, List, Mapping, Optional
+
+from .PageLayout import PageLayout
+from .PlannedPage import PlannedPage
+from .pull_page_from_musicxml_iterator import build_page_identifier
+
+
+def plan_pages_from_measure_counts(
+    measure_counts: Mapping[str, int],
+    seed: int,
+    excluded_incipit_ids: Optional[Container[str]] = None
+) -> List[PlannedPage]:
+    """Plans all the pages of the dataset up front, from the measure count
+    index alone. Each page samples its domain and layout from its own RNG,
+    derived from the seed and the page ordinal.
+
+    Incipits are bin-packed into pages to minimize the measures clipped
+    away at the end of each page. To fill the remaining measures of a page
+    the planner takes an incipit that fits exactly, otherwise the longest
+    one that fits, and otherwise the shortest one that overflows. Within
+    the same measure count, incipits are taken in the order of the index,
+    so the plan is deterministic.
+    """
+
+    # unassigned incipits, bucketed by their measure count
+    buckets: Dict[int, Deque[str]] = {}
+    for incipit_id, measure_count in measure_counts.items():
+        if measure_count <= 0:
+            continue # nothing to put on a page
+        if excluded_incipit_ids is not None \
+            and incipit_id in excluded_incipit_ids:
+            continue
+        buckets.setdefault(measure_count, deque()).append(incipit_id)
+
+    planned_pages: List[PlannedPage] = []
+
+    while len(buckets) > 0:
+        rng = random.Random(f"{seed}/page_plan/{len(planned_pages)}")
+        dataset_domain = rng.choice(["C", "M"])
+        page_layout = (
+            PageLayout.sample_M_domain(rng)
+            if dataset_domain == "M"
+            else PageLayout.sample_C_domain(rng)
+        )
+
+        incipit_ids: List[str] = []
+        missing_measures = page_layout.total_measures
+        while missing_measures > 0 and len(buckets) > 0:
+            measure_count = _pick_measure_count(buckets, missing_measures)
+            incipit_ids.append(buckets[measure_count].popleft())
+            if len(buckets[measure_count]) == 0:
+                del buckets[measure_count]
+            missing_measures -= measure_count
+
+        planned_pages.append(PlannedPage(
+            identifier=build_page_identifier(incipit_ids),
+            dataset_domain=dataset_domain,
+            layout=page_layout,
+            incipit_ids=incipit_ids
+        ))
+    
+    return planned_pages
+
+
+def _pick_measure_count(
+    buckets: Dict[int, Deque[str]],
+    missing_measures: int
+) -> int:
+    if missing_measures in buckets:
+        return missing_measures
+    fitting = [count for count in buckets if count < missing_measures]
+    if len(fitting) > 0:
+        return max(fitting)
+    return min(buckets)
+
+
+def wasted_measures(
+    planned_pages: List[PlannedPage],
+    measure_counts: Mapping[str, int]
+) -> int:
+    """How many measures of the planned incipits get clipped away"""
+    return sum(
+        max(
+            sum(measure_counts[i] for i in page.incipit_ids)
+                - page.layout.total_measures,
+            0
+        )
+        for page in planned_pages
+    )
+
+
+# .venv/bin/python3 -m app.semantic.plan_pages_from_measure_counts
+if __name__ == "__main__":
+    from ..config import PRIMUS_CONTAINER_FOLDER
+    from ..primus.PrimusContainer import PrimusContainer
+    
+    measure_counts = PrimusContainer(PRIMUS_CONTAINER_FOLDER).measure_counts
+    planned_pages = plan_pages_from_measure_counts(measure_counts, seed=42)
+    
+    total_measures = sum(measure_counts.values())
+    waste = wasted_measures(planned_pages, measure_counts)
+    print("Planned pages:", len(planned_pages))
+    print("Total measures:", total_measures)
+    print(f"Wasted measures: {waste} ({waste / total_measures:.2%})")
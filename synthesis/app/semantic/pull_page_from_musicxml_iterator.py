@@ -1,4 +1,5 @@
 import io
+import logging
 import sys
 from typing import Iterator, List, Optional
 
@@ -8,9 +9,15 @@ import smashcima as sc
 from converter21.humdrum.humdrumwriter import HumdrumWriter
 
 from ..kern.clean_up_music21_kern_output import clean_up_music21_kern_output
+from ..kern.concatenate_kern_fragments import concatenate_kern_fragments
+from ..kern.KernFragment import KernFragment
+from ..kern.musicxml_to_skern import musicxml_to_kern_fragment
 from ..primus.start_primus_musicxml_iterator import MusicXmlIncipit
+from ..stages.StageStore import StageStore
+from .count_musicxml_measures import count_musicxml_measures
 from .PageContent import PageContent
 from .PageLayout import PageLayout
+from .splice_musicxml_measures import splice_musicxml_measures
 
 
 def pull_page_from_musicxml_iterator(
@@ -20,15 +27,12 @@ def pull_page_from_musicxml_iterator(
     """Pulls incipits from an iterator to build the desired page content"""
     
     incipits: List[MusicXmlIncipit] = []
-    music21_scores: List[music21.stream.base.Score] = []
     taken_measures = 0
 
     # take incipits until we have desired measure count
     for incipit in primus_musicxml_iterator:
         incipits.append(incipit)
-        music21_score = _parse_to_music21(incipit.musicxml)
-        taken_measures += _count_measures(music21_score)
-        music21_scores.append(music21_score)
+        taken_measures += count_musicxml_measures(incipit.musicxml)
 
         if taken_measures >= page_layout.total_measures:
             break
@@ -37,16 +41,67 @@ def pull_page_from_musicxml_iterator(
     if taken_measures == 0:
         return None
 
-    # build the complete music21 score
-    music21_score = _concatenate_music21_scores_and_clip(
-        music21_scores,
-        desired_measures=page_layout.total_measures
+    return assemble_page_content(
+        incipits=incipits,
+        page_layout=page_layout
     )
-    _introduce_system_breaks(music21_score, page_layout)
 
-    # get the complete score MusicXML
-    musicxml_exporter = music21.musicxml.m21ToXml.GeneralObjectExporter()
-    musicxml = musicxml_exporter.parse(music21_score).decode("utf-8")
+
+# engines that can build the page MusicXML from incipits
+SPLICE_ENGINES = ["xml", "music21"]
+
+# exporters that can produce the page kern
+KERN_EXPORTERS = ["skern", "humdrum_writer"]
+
+
+def assemble_page_content(
+    incipits: List[MusicXmlIncipit],
+    page_layout: PageLayout,
+    splice_engine: str = "xml",
+    kern_exporter: str = "skern",
+    kern_fragment_store: Optional[StageStore] = None
+) -> PageContent:
+    """Builds the page content from the given incipits, the last incipit
+    is clipped to match the measure count of the page layout.
+    
+    The "xml" splice engine splices measure elements of the incipits
+    directly. The "music21" engine parses each incipit with music21 and
+    concatenates the streams (the original, much slower, approach).
+
+    The "skern" exporter converts each incipit into a kern fragment
+    directly from its MusicXML and concatenates the fragments. It falls
+    back to the "humdrum_writer" exporter (converter21 over the page
+    music21 score) when an incipit contains notation it does not support.
+    With the "xml" splice engine and no fallback, music21 is not used at all.
+
+    If a kern fragment store is given, the fragment of each incipit
+    is converted only once and reused by all the pages that contain it.
+    """
+    assert len(incipits) > 0
+    assert splice_engine in SPLICE_ENGINES
+    assert kern_exporter in KERN_EXPORTERS
+
+    music21_score: Optional[music21.stream.base.Score] = None
+    if splice_engine == "xml":
+        musicxml = splice_musicxml_measures(
+            [incipit.musicxml for incipit in incipits],
+            page_layout
+        )
+    else:
+        music21_scores = [
+            _parse_to_music21(incipit.musicxml) for incipit in incipits
+        ]
+
+        # build the complete music21 score
+        music21_score = _concatenate_music21_scores_and_clip(
+            music21_scores,
+            desired_measures=page_layout.total_measures
+        )
+        _introduce_system_breaks(music21_score, page_layout)
+
+        # get the complete score MusicXML
+        musicxml_exporter = music21.musicxml.m21ToXml.GeneralObjectExporter()
+        musicxml = musicxml_exporter.parse(music21_score).decode("utf-8")
 
     # parse to smashcima score
     # NOTE: nope, let the synthesizer, because it might crash occasionally
@@ -54,11 +109,24 @@ def pull_page_from_musicxml_iterator(
     # smashcima_score = smashcima_loader.load_xml(musicxml)
 
     # export the score to kern
-    kern = _music21_to_kern(music21_score)
-    kern = clean_up_music21_kern_output(kern)
+    kern: Optional[str] = None
+    if kern_exporter == "skern":
+        fragments = _load_kern_fragments(incipits, kern_fragment_store)
+        if fragments is not None:
+            kern = concatenate_kern_fragments(
+                fragments,
+                total_measures=page_layout.total_measures
+            )
+    if kern is None:
+        if music21_score is None:
+            music21_score = _parse_to_music21(musicxml)
+        kern = _music21_to_kern(music21_score)
+        kern = clean_up_music21_kern_output(kern)
 
     return PageContent(
-        identifier=_build_page_identifier(incipits),
+        identifier=build_page_identifier([
+            incipit.original_incipit.incipit_id for incipit in incipits
+        ]),
         layout=page_layout,
         incipits=incipits,
         music21_score=music21_score,
@@ -68,18 +136,57 @@ def pull_page_from_musicxml_iterator(
     )
 
 
+def _load_kern_fragments(
+    incipits: List[MusicXmlIncipit],
+    kern_fragment_store: Optional[StageStore]
+) -> Optional[List[KernFragment]]:
+    """Returns kern fragments of the incipits, or None if any of them
+    cannot be converted directly (unsupported incipits are remembered
+    in the store as None)"""
+    fragments: List[KernFragment] = []
+    tuplet_state = (False, False)
+    for incipit in incipits:
+        incipit_id = incipit.original_incipit.incipit_id
+        if kern_fragment_store is not None and incipit_id in kern_fragment_store:
+            record = kern_fragment_store.get(incipit_id)
+            if record is None:
+                return None
+            fragment = KernFragment.from_record(record)
+        else:
+            try:
+                fragment = musicxml_to_kern_fragment(incipit.musicxml)
+            except ValueError as e:
+                logging.info(
+                    f"Incipit {incipit_id} needs HumdrumWriter: {e}"
+                )
+                fragment = None
+            if kern_fragment_store is not None:
+                kern_fragment_store.put(
+                    incipit_id,
+                    None if fragment is None else fragment.to_record()
+                )
+            if fragment is None:
+                return None
+        
+        # fragments are stored as converted from the initial tuplet state
+        if fragment.has_tuplets:
+            if tuplet_state != (False, False):
+                fragment = musicxml_to_kern_fragment(
+                    incipit.musicxml,
+                    tuplet_state=tuplet_state
+                )
+            tuplet_state = fragment.tuplet_state
+        
+        fragments.append(fragment)
+    return fragments
+
+
 def _parse_to_music21(musicxml: str) -> music21.stream.base.Score:
     score = music21.converter.parseData(musicxml, format="musicxml")
     assert type(score) is music21.stream.base.Score
     return score
 
 
-def _count_measures(score: music21.stream.base.Score) -> int:
-    return len(
-        score.parts[0].getElementsByClass(music21.stream.Measure)
-    )
-
-
 def _concatenate_music21_scores_and_clip(
     scores: List[music21.stream.base.Score],
     desired_measures: int
@@ -128,8 +235,9 @@ def _music21_to_kern(score: music21.stream.base.Score) -> str:
     dummy_file.seek(0)
     return dummy_file.read()
 
-def _build_page_identifier(incipits: List[MusicXmlIncipit]) -> str:
-    id = incipits[0].original_incipit.incipit_id
+
+def build_page_identifier(incipit_ids: List[str]) -> str:
+    id = incipit_ids[0]
     id = id.replace(".", "")
     id = id.strip("/").replace("/", "_")
-    return id + "_len" + str(len(incipits))
+    return id + "_len" + str(len(incipit_ids))
@@ -0,0 +1,70 @@
+import xml.etree.ElementTree as ET
+from typing import List
+
+from .PageLayout import PageLayout
+
+
+MUSICXML_DECLARATION = '<?xml version="1.0" encoding="utf-8"?>\n'
+
+
+def splice_musicxml_measures(
+    musicxml_documents: List[str],
+    page_layout: PageLayout
+) -> str:
+    """Builds the page MusicXML by splicing measures of the given
+    single-part MusicXML documents, without going through music21.
+
+    The header and the part of the first document are kept. Measures
+    of the other documents are appended to the part, the result is
+    clipped to the measure count of the page layout, measures are
+    renumbered and system breaks are placed at the start of each staff.
+    The attributes (divisions, key, time, clef) of each document stay
+    in its first measure, so they carry over to the following measures.
+    """
+    assert len(musicxml_documents) > 0
+
+    root = ET.fromstring(musicxml_documents[0])
+    part = _first_part(root)
+
+    # append measures of the other documents
+    for musicxml in musicxml_documents[1:]:
+        for measure in _first_part(ET.fromstring(musicxml)).findall("measure"):
+            # remove the system layout of the appended document,
+            # as that introduces problems when inserting our breaks
+            for print_element in measure.findall("print"):
+                measure.remove(print_element)
+            part.append(measure)
+
+    # clip to the desired measure count
+    measures = part.findall("measure")
+    for measure in measures[page_layout.total_measures:]:
+        part.remove(measure)
+    measures = measures[:page_layout.total_measures]
+
+    # renumber
+    for i, measure in enumerate(measures):
+        measure.set("number", str(i + 1))
+
+    # introduce system breaks
+    current_measure = 0
+    for step in page_layout.measures_per_staff:
+        current_measure += step
+        if current_measure >= len(measures):
+            break
+        _set_new_system(measures[current_measure])
+
+    return MUSICXML_DECLARATION + ET.tostring(root, encoding="unicode")
+
+
+def _first_part(root: ET.Element) -> ET.Element:
+    part = root.find("part")
+    assert part is not None, "The MusicXML document has no part"
+    return part
+
+
+def _set_new_system(measure: ET.Element):
+    print_element = measure.find("print")
+    if print_element is None:
+        print_element = ET.Element("print")
+        measure.insert(0, print_element)
+    print_element.set("new-system", "yes")
@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+MANIFEST_FILENAME = "manifest.json"
+RECORDS_FILENAME = "records.jsonl"
+
+
+class StageStore:
+    """Materialized output of one stage of the dataset build.
+
+    The output consists of records (JSON values) keyed by the unit of work
+    they belong to (an incipit, a page, ...). Records are appended to a
+    JSON-lines file as soon as they are produced, so an interrupted build
+    loses at most the unit that was being processed.
+
+    The manifest file stores the fingerprint of the stage (its version
+    and all the settings its output depends on). When the fingerprint
+    changes, the previous records are discarded and the stage starts over.
+    """
+
+    def __init__(self, folder: Path, fingerprint: Dict[str, Any]):
+        self.folder = folder
+        self.fingerprint = fingerprint
+
+        self._offsets: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self.folder.mkdir(parents=True, exist_ok=True)
+        if self._read_manifest_fingerprint() != fingerprint:
+            self._reset()
+        self._load_offsets()
+
+        self._file = open(self._records_path, "r+b")
+        self._file.seek(0, os.SEEK_END)
+
+    @property
+    def _records_path(self) -> Path:
+        return self.folder / RECORDS_FILENAME
+
+    @property
+    def _manifest_path(self) -> Path:
+        return self.folder / MANIFEST_FILENAME
+
+    def _read_manifest_fingerprint(self) -> Optional[Dict[str, Any]]:
+        if not self._manifest_path.is_file():
+            return None
+        with open(self._manifest_path, "r") as f:
+            return json.load(f)["fingerprint"]
+
+    def _reset(self):
+        with open(self._records_path, "w"):
+            pass # truncate
+        tmp_path = self._manifest_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "stage": self.folder.name,
+                "fingerprint": self.fingerprint
+            }, f, indent=2)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _load_offsets(self):
+        if not self._records_path.is_file():
+            open(self._records_path, "w").close()
+
+        valid_length = 0
+        with open(self._records_path, "rb") as f:
+            for line in f:
+                try:
+                    key = json.loads(line)["key"]
+                except (json.JSONDecodeError, KeyError):
+                    break # a truncated line written during a crash
+                if not line.endswith(b"\n"):
+                    break
+                self._offsets[key] = valid_length
+                valid_length += len(line)
+
+        # drop any partially written record
+        os.truncate(self._records_path, valid_length)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def keys(self) -> List[str]:
+        """Keys of all the records, in the order they were first stored"""
+        return list(self._offsets.keys())
+
+    def get(self, key: str) -> Any:
+        """Returns the record stored under the given key"""
+        with self._lock:
+            self._file.flush()
+            with open(self._records_path, "rb") as f:
+                f.seek(self._offsets[key])
+                return json.loads(f.readline())["value"]
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """Iterates over all the records in the order they were stored"""
+        with self._lock:
+            self._file.flush()
+            offsets = dict(self._offsets)
+
+        offset = 0
+        with open(self._records_path, "rb") as f:
+            for line in f:
+                line_offset = offset
+                offset += len(line)
+                record = json.loads(line)
+                # skip records that have been overwritten later
+                if offsets.get(record["key"]) != line_offset:
+                    continue
+                yield record["key"], record["value"]
+
+    def put(self, key: str, value: Any):
+        """Stores a record (overwriting the previous value if present)"""
+        line = json.dumps({"key": key, "value": value}) + "\n"
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write(line.encode("utf-8"))
+            self._file.flush()
+            self._offsets[key] = offset
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,113 @@
+import hashlib
+from importlib.metadata import version
+from typing import Any, Dict, Mapping, Optional, Type
+
+from ..config import MSCORE_COMMAND, PAPER_TEXTURE_BANKS_FOLDER
+from ..primus.MuseScoreCache import musescore_identity
+from ..synthesis.PaperTextureBank import PaperTextureBank
+
+
+# Bump a stage version whenever the code of the stage changes in a way
+# that changes its outputs. The fingerprint of each stage includes the
+# fingerprint of the stage it consumes, so the change propagates down.
+CRUDE_MUSICXML_STAGE_VERSION = 1
+REFINED_MUSICXML_STAGE_VERSION = 1
+KERN_FRAGMENT_STAGE_VERSION = 1
+PAGE_PLAN_STAGE_VERSION = 2
+PAGE_CONTENT_STAGE_VERSION = 3
+RENDERED_STAGE_VERSION = 12
+
+
+def crude_musicxml_fingerprint() -> Dict[str, Any]:
+    """MEI to crude MusicXML conversion (music21 + converter21)"""
+    return {
+        "version": CRUDE_MUSICXML_STAGE_VERSION,
+        "music21": version("music21"),
+        "converter21": version("converter21"),
+    }
+
+
+def refined_musicxml_fingerprint(
+    musescore_command: str = MSCORE_COMMAND
+) -> Dict[str, Any]:
+    """Crude MusicXML refinement via MuseScore"""
+    return {
+        "version": REFINED_MUSICXML_STAGE_VERSION,
+        "musescore": musescore_identity(musescore_command),
+        "upstream": crude_musicxml_fingerprint(),
+    }
+
+
+def kern_fragment_fingerprint() -> Dict[str, Any]:
+    """Refined MusicXML to per-incipit kern fragments"""
+    return {
+        "version": KERN_FRAGMENT_STAGE_VERSION,
+        "upstream": refined_musicxml_fingerprint(),
+    }
+
+
+def page_plan_fingerprint(
+    seed: int,
+    measure_counts: Mapping[str, int]
+) -> Dict[str, Any]:
+    """Assignment of incipits, domains and layouts to pages,
+    planned from the measure count index"""
+    h = hashlib.sha256()
+    for incipit_id, measure_count in measure_counts.items():
+        h.update(f"{incipit_id}\t{measure_count}\n".encode("utf-8"))
+    return {
+        "version": PAGE_PLAN_STAGE_VERSION,
+        "seed": seed,
+        "measure_counts": h.hexdigest(),
+    }
+
+
+def page_content_fingerprint(
+    seed: int,
+    measure_counts: Mapping[str, int]
+) -> Dict[str, Any]:
+    """Page MusicXML and kern assembled from the planned incipits"""
+    return {
+        "version": PAGE_CONTENT_STAGE_VERSION,
+        "music21": version("music21"),
+        "converter21": version("converter21"),
+        "upstream": {
+            "page_plan": page_plan_fingerprint(seed, measure_counts),
+            "refined_musicxml": refined_musicxml_fingerprint(),
+            "kern_fragments": kern_fragment_fingerprint(),
+        },
+    }
+
+
+def rendered_fingerprint(
+    model_class: Type,
+    seed: int,
+    measure_counts: Mapping[str, int],
+    output_backend: str = "files",
+    augmentation: Optional[Dict[str, Any]] = None,
+    page_views: int = 1,
+    grayscale: bool = False
+) -> Dict[str, Any]:
+    """Rendering of pages of one domain with the given synthesis model,
+    depends on the render settings (upper-case class attributes), the
+    paper texture bank, the color mode, the number of views of each page,
+    the augmentation of the rendered images and on where the samples
+    are written (the rows point into the output)"""
+    return {
+        "version": RENDERED_STAGE_VERSION,
+        "model": model_class.__name__,
+        "output_backend": output_backend,
+        "augmentation": augmentation,
+        "page_views": page_views,
+        "grayscale": grayscale,
+        "settings": {
+            name: repr(getattr(model_class, name))
+            for name in dir(model_class)
+            if name.isupper()
+        },
+        "paper_texture_bank": PaperTextureBank.metadata(
+            PAPER_TEXTURE_BANKS_FOLDER, model_class.PAPER_TEXTURE_BANK
+        ),
+        "smashcima": version("smashcima"),
+        "upstream": page_content_fingerprint(seed, measure_counts),
+    }
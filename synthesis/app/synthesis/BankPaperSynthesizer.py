@@ -0,0 +1,86 @@
+import random
+from typing import Tuple
+
+import cv2
+import numpy as np
+import smashcima as sc
+from smashcima.geometry.units import mm_to_px
+
+from .PaperTextureBank import PaperTextureBank
+
+
+class BankPaperSynthesizer(sc.synthesis.PaperSynthesizer):
+    """Paper synthesizer that crops a random window out of a random tile
+    of a pre-generated texture bank and tints it to the paper color.
+    Unlike quilting a texture for every page, this costs about as much
+    as a solid color paper. The window is resampled when the paper DPI
+    differs from the DPI of the bank."""
+
+    def __init__(self, bank: PaperTextureBank, rng: random.Random):
+        self.bank = bank
+        self.rng = rng
+
+        self.dpi = bank.dpi
+        "Resolution of the paper sprite"
+
+        self.color: Tuple[int, int, int, int] = (255, 255, 255, 255)
+        "Mean color of the paper, BGRA uint8 format"
+
+        self.tint_jitter = 0.03
+        "Relative deviation of each channel from the color, drawn per page"
+
+    def synthesize_paper(
+        self,
+        page_space: sc.AffineSpace,
+        placement: sc.Rectangle
+    ):
+        width = int(mm_to_px(placement.width, self.bank.dpi))
+        height = int(mm_to_px(placement.height, self.bank.dpi))
+        tile_count, tile_height, tile_width, _ = self.bank.tiles.shape
+        assert width <= tile_width and height <= tile_height, \
+            "The paper texture tiles are smaller than the page"
+
+        # only the cropped window is read from the memory-mapped bank
+        tile = self.bank.tiles[self.rng.randrange(tile_count)]
+        top = self.rng.randint(0, tile_height - height)
+        left = self.rng.randint(0, tile_width - width)
+        texture = np.ascontiguousarray(
+            tile[top:top + height, left:left + width]
+        )
+
+        # scale each channel so that the mean of the page is the color
+        # (with a little jitter), applied as a lookup table
+        means = texture[::8, ::8].reshape(-1, 3).mean(axis=0)
+        targets = np.array(self.color[:3], dtype=np.float64) * np.array([
+            1 + self.rng.uniform(-self.tint_jitter, self.tint_jitter)
+            for _ in range(3)
+        ])
+        lut = np.clip(
+            np.arange(256, dtype=np.float64)[:, None]
+                * (targets / np.maximum(means, 1.0)),
+            0, 255
+        ).astype(np.uint8)
+        texture = cv2.LUT(texture, lut.reshape(256, 1, 3))
+        if self.dpi != self.bank.dpi:
+            texture = cv2.resize(
+                texture,
+                (
+                    int(mm_to_px(placement.width, self.dpi)),
+                    int(mm_to_px(placement.height, self.dpi))
+                ),
+                interpolation=cv2.INTER_AREA if self.dpi < self.bank.dpi \
+                    else cv2.INTER_LINEAR
+            )
+        bitmap = cv2.cvtColor(texture, cv2.COLOR_BGR2BGRA)
+        bitmap[:, :, 3] = self.color[3]
+
+        # create the sprite scene object
+        sc.Sprite(
+            space=page_space,
+            bitmap=bitmap,
+            bitmap_origin=sc.Point(0, 0),
+            dpi=self.dpi,
+            transform=sc.Transform.translate(
+                sc.Vector2(placement.x, placement.y)
+            )
+        )
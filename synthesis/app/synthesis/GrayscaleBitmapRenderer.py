@@ -0,0 +1,111 @@
+from math import ceil
+from typing import Tuple
+
+import cv2
+import numpy as np
+from smashcima.exporting.BitmapRenderer import BitmapRenderer
+from smashcima.geometry import Quad, Rectangle, Transform, mm_to_px
+from smashcima.scene import Sprite, ViewBox
+
+
+class GrayscaleBitmapRenderer(BitmapRenderer):
+    """Renders a scene into a single-channel uint8 bitmap, the gray level
+    is the luma of the colors (as in the cv2 BGR to gray conversion).
+
+    Follows the BitmapRenderer, but the canvas holds only the (alpha
+    premultiplied) gray level and each sprite is warped as a gray and
+    an alpha plane, instead of four BGRA channels. Transparent parts
+    of the canvas come out black, the page backgrounds are opaque."""
+
+    def render(self, view_box: ViewBox) -> np.ndarray:
+        # bounding box of the canvas in pixel space
+        canvas_px_bbox = Rectangle(
+            x=0,
+            y=0,
+            width=ceil(mm_to_px(view_box.rectangle.width, dpi=self.dpi)),
+            height=ceil(mm_to_px(view_box.rectangle.height, dpi=self.dpi)),
+        )
+
+        # the canvas gray level, premultiplied by the background alpha
+        background, _ = _premultiplied_gray_and_alpha(
+            np.array([[self.background_color]], dtype=np.uint8)
+        )
+        canvas = np.full(
+            shape=(int(canvas_px_bbox.height), int(canvas_px_bbox.width)),
+            fill_value=background[0, 0],
+            dtype=np.float32
+        )
+
+        # converts from scene millimeter coordinate system
+        # to the canvas pixel coordinate system
+        scene_to_canvas_transform = (
+            Transform.translate(-view_box.rectangle.top_left_corner.vector)
+                .then(Transform.scale(mm_to_px(1, dpi=self.dpi)))
+        )
+
+        for (sprite, sprite_transform) in Sprite.traverse_sprites(
+            view_box.space.get_root(),
+            include_pixels_transform=True,
+            include_sprite_transform=True,
+            include_root_space_transform=False
+        ):
+            to_canvas_transform = sprite_transform.then(
+                scene_to_canvas_transform
+            )
+
+            # the window in the canvas to paint over (grown by a pixel
+            # for the aliasing blur), sprites outside the canvas are culled
+            canvas_window: Rectangle = (
+                to_canvas_transform.apply_to(
+                    Quad.from_rectangle(sprite.pixels_bbox.dilate(1.0))
+                )
+                .bbox()
+                .snap_grow()
+                .intersect_with(canvas_px_bbox)
+            )
+            if canvas_window.has_no_area:
+                continue
+            to_window_transform = to_canvas_transform.then(
+                Transform.translate(-canvas_window.top_left_corner.vector)
+            )
+
+            # the planes are warped one by one, as cv2 interpolates
+            # two-channel images less precisely than one or four channels
+            gray, alpha = [
+                cv2.warpAffine(
+                    src=plane,
+                    M=to_window_transform.matrix,
+                    dsize=(int(canvas_window.width), int(canvas_window.height)),
+                    flags=(
+                        cv2.INTER_AREA # used for downscaling
+                        if to_window_transform.determinant < 1.0
+                        else cv2.INTER_LINEAR # used for upscaling
+                    ),
+                    borderMode=cv2.BORDER_CONSTANT
+                )
+                for plane in _premultiplied_gray_and_alpha(sprite.bitmap)
+            ]
+
+            # composite the layer over the canvas in the window
+            window = canvas[
+                int(canvas_window.top):int(canvas_window.bottom),
+                int(canvas_window.left):int(canvas_window.right)
+            ]
+            window *= 1 - alpha
+            window += gray
+
+        canvas *= 255
+        return canvas.astype(np.uint8)
+
+
+def _premultiplied_gray_and_alpha(
+    bitmap: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Converts a BGRA uint8 bitmap into float32 planes of the gray level
+    premultiplied by alpha and of the alpha (both from 0 to 1)"""
+    alpha = bitmap[:, :, 3].astype(np.float32)
+    alpha /= 255
+    gray = cv2.cvtColor(bitmap, cv2.COLOR_BGRA2GRAY).astype(np.float32)
+    gray /= 255
+    gray *= alpha
+    return gray, alpha
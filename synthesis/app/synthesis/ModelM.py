@@ -1,25 +1,50 @@
 import random
+from typing import Optional
 
 import smashcima as sc
 from smashcima.orchestration.BaseHandwrittenModel import BaseHandwrittenScene
 from smashcima.synthesis.page.SimplePageSynthesizer import PageSetup
 
+from ..config import PAPER_TEXTURE_BANKS_FOLDER
+from .BankPaperSynthesizer import BankPaperSynthesizer
+from .downscale_sprites import downscale_sprites
+from .GrayscaleBitmapRenderer import GrayscaleBitmapRenderer
+from .PaperTextureBank import PaperTextureBank
+from .RenderProfile import RenderProfile
+
 
 class ModelM(sc.orchestration.BaseHandwrittenModel):
     # rasterization
     DPI = 124.6
+
+    # the glyphs are downscaled to the output resolution before rendering
+    RENDER_PROFILE = RenderProfile(dpi=DPI, paper_dpi=DPI, sprite_dpi=DPI)
     
     # stafflines
     STAFF_LINE_THICKNESS = sc.px_to_mm(2, dpi=DPI)
     STAFF_SPACE_UNIT = sc.px_to_mm(10.75, dpi=DPI)
     STAFF_LINE_COLOR = (0, 0, 0, 105)
     
+    # colors (BGRA), the background shows around the tilted page
+    PAPER_COLOR = (187, 221, 234, 255)
+    BACKGROUND_COLOR = (242, 244, 244, 255)
+
     # page tilt and positioning
     TILT_ANGLE_DEG = 0.2
     PAGE_SHIFT = sc.px_to_mm(3, dpi=DPI)
 
-    def __init__(self, rng: random.Random):
+    # paper texture bank (see build_paper_texture_bank),
+    # the tiles (width, height in pixels) cover the page with a margin
+    PAPER_TEXTURE_BANK = "M_paper"
+    PAPER_TILE_SIZE = (1_100, 800)
+
+    def __init__(
+        self,
+        rng: random.Random,
+        render_profile: Optional[RenderProfile] = None
+    ):
         self._rng = rng
+        self.render_profile = render_profile or self.RENDER_PROFILE
         super().__init__()
 
     def register_services(self):
@@ -28,10 +53,22 @@ class ModelM(sc.orchestration.BaseHandwrittenModel):
         # use the externally-given RNG
         self.container.instance(random.Random, self._rng)
 
-        # TODO: DBEUG: disable the background texture temporarily
-        paper_synth = sc.synthesis.SolidColorPaperSynthesizer()
-        paper_synth.color = (187, 221, 234, 255)
-        paper_synth.dpi = self.DPI
+        # textured paper from the pre-generated bank, or a solid color
+        # of the same mean if the bank has not been built
+        paper_synth: sc.synthesis.PaperSynthesizer
+        if PaperTextureBank.exists(
+            PAPER_TEXTURE_BANKS_FOLDER, self.PAPER_TEXTURE_BANK
+        ):
+            paper_synth = BankPaperSynthesizer(
+                PaperTextureBank.load(
+                    PAPER_TEXTURE_BANKS_FOLDER, self.PAPER_TEXTURE_BANK
+                ),
+                self._rng
+            )
+        else:
+            paper_synth = sc.synthesis.SolidColorPaperSynthesizer()
+        paper_synth.dpi = self.render_profile.paper_dpi
+        paper_synth.color = self.PAPER_COLOR
         self.container.instance(
             sc.synthesis.PaperSynthesizer,
             paper_synth
@@ -82,23 +119,7 @@ class ModelM(sc.orchestration.BaseHandwrittenModel):
         page.space = zoomed_out_space
         original_page_space.parent_space = zoomed_out_space
 
-        # center the page on origin and scale down, tilt, and shift
-        original_page_space.transform = sc.Transform.translate(
-            sc.Vector2(
-                -page.view_box.rectangle.width / 2,
-                -page.view_box.rectangle.height / 2
-            )
-        ) \
-            .then(sc.Transform.scale(1_000 / 1_024)) \
-            .then(sc.Transform.rotateDegCC(
-                self.rng.normalvariate(0, self.TILT_ANGLE_DEG)
-            )) \
-            .then(sc.Transform.translate(
-                sc.Vector2(
-                    self.rng.normalvariate(0, self.PAGE_SHIFT),
-                    self.rng.normalvariate(0, self.PAGE_SHIFT)
-                )
-            ))
+        self._place_page(original_page_space)
 
         # the new viewport is 1024x761 pixels in the model DPI
         view_width = sc.px_to_mm(1024, dpi=self.DPI)
@@ -115,7 +136,40 @@ class ModelM(sc.orchestration.BaseHandwrittenModel):
         page.view_box = view_box
 
         # set the scene renderrer properties
-        scene.renderer.dpi = self.DPI
-        scene.renderer.background_color = (242, 244, 244, 255)
+        if self.render_profile.grayscale:
+            scene.renderer = GrayscaleBitmapRenderer()
+        scene.renderer.dpi = self.render_profile.dpi
+        scene.renderer.background_color = self.BACKGROUND_COLOR
+
+        # bring the glyph bitmaps down to about the output resolution
+        if self.render_profile.sprite_dpi is not None:
+            downscale_sprites(zoomed_out_space, self.render_profile.sprite_dpi)
 
         return scene
+
+    def resample_page_view(self, scene: BaseHandwrittenScene):
+        """Samples a new tilt and shift of the page of a scene created
+        by this model, the laid-out page can then be rendered again
+        without repeating the synthesis"""
+        assert len(scene.pages) == 1, "Expected only one page"
+        for original_page_space in scene.pages[0].space.get_children():
+            self._place_page(original_page_space)
+
+    def _place_page(self, original_page_space: sc.AffineSpace):
+        # center the page on origin and scale down, tilt, and shift
+        page_size = self.container.resolve(
+            sc.synthesis.SimplePageSynthesizer
+        ).page_setup.size
+        original_page_space.transform = sc.Transform.translate(
+            sc.Vector2(-page_size.x / 2, -page_size.y / 2)
+        ) \
+            .then(sc.Transform.scale(1_000 / 1_024)) \
+            .then(sc.Transform.rotateDegCC(
+                self.rng.normalvariate(0, self.TILT_ANGLE_DEG)
+            )) \
+            .then(sc.Transform.translate(
+                sc.Vector2(
+                    self.rng.normalvariate(0, self.PAGE_SHIFT),
+                    self.rng.normalvariate(0, self.PAGE_SHIFT)
+                )
+            ))
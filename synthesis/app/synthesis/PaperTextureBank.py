@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+class PaperTextureBank:
+    """Pre-generated paper texture tiles of one DPI, stored as a single
+    (tiles, height, width, 3) BGR uint8 array. The array is memory-mapped
+    when loaded, so a page reads only the window it crops out of a tile
+    and the textures are shared by all the synthesis processes.
+
+    Files: {name}.npy, {name}.json
+
+    The metadata holds the SHA-256 of the tiles, so that the fingerprints
+    of the rendered pages change whenever the textures do.
+    """
+
+    def __init__(self, tiles: np.ndarray, dpi: float, seed: int):
+        assert tiles.ndim == 4 and tiles.shape[3] == 3
+        assert tiles.dtype == np.uint8
+        self.tiles = tiles
+        self.dpi = dpi
+        self.seed = seed
+
+    @staticmethod
+    def metadata(folder: Path, name: str) -> Optional[Dict[str, Any]]:
+        """Metadata of the bank, None if it has not been (fully) built"""
+        path = folder / (name + ".json")
+        if not path.is_file():
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    @staticmethod
+    def exists(folder: Path, name: str) -> bool:
+        return PaperTextureBank.metadata(folder, name) is not None
+
+    @staticmethod
+    def load(folder: Path, name: str) -> "PaperTextureBank":
+        metadata = PaperTextureBank.metadata(folder, name)
+        assert metadata is not None, f"Paper texture bank {name} is missing"
+        return PaperTextureBank(
+            tiles=np.load(folder / (name + ".npy"), mmap_mode="r"),
+            dpi=metadata["dpi"],
+            seed=metadata["seed"]
+        )
+
+    def save(self, folder: Path, name: str):
+        folder.mkdir(parents=True, exist_ok=True)
+
+        # the metadata file is replaced last, it marks a complete write
+        tmp_path = folder / (name + ".npy.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, self.tiles)
+        os.replace(tmp_path, folder / (name + ".npy"))
+
+        tmp_path = folder / (name + ".json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "dpi": self.dpi,
+                "seed": self.seed,
+                "sha256": hashlib.sha256(
+                    np.ascontiguousarray(self.tiles).data
+                ).hexdigest(),
+                "tile_count": self.tiles.shape[0],
+                "tile_height": self.tiles.shape[1],
+                "tile_width": self.tiles.shape[2]
+            }, f)
+        os.replace(tmp_path, folder / (name + ".json"))
+
+    def __len__(self) -> int:
+        return self.tiles.shape[0]
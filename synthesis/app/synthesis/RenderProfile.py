@@ -0,0 +1,21 @@
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class RenderProfile:
+    """Resolutions at which the scene of a page is rasterized"""
+
+    dpi: float
+    """DPI of the rendered page bitmap"""
+
+    paper_dpi: float
+    """DPI at which the paper texture is created"""
+
+    sprite_dpi: Optional[float] = None
+    """Sprites (glyphs, stafflines) with a higher DPI are downscaled to this
+    DPI before rendering (see downscale_sprites), None keeps their own"""
+
+    grayscale: bool = False
+    """Renders single-channel uint8 bitmaps (see GrayscaleBitmapRenderer),
+    the colors of the model become their gray levels (luma)"""
@@ -0,0 +1,69 @@
+import random
+from pathlib import Path
+
+import cv2
+import numpy as np
+import tqdm
+from smashcima.assets.AssetRepository import AssetRepository
+from smashcima.assets.textures.MzkPaperPatches import MzkPaperPatches
+from smashcima.synthesis.page.Quilter import Quilter
+
+from .PaperTextureBank import PaperTextureBank
+
+
+def build_paper_texture_bank(
+    folder: Path,
+    name: str,
+    dpi: float,
+    tile_width_px: int,
+    tile_height_px: int,
+    tile_count: int = 8,
+    seed: int = 42
+):
+    """Quilts the MZK paper patches (rescaled to the DPI) into tiles
+    of the given size and stores them as a paper texture bank.
+    This is the expensive part of the textured paper, done once
+    instead of for every page."""
+    rng = random.Random(seed)
+    bundle = AssetRepository.default().resolve_bundle(MzkPaperPatches)
+    patches = bundle.load_patch_index()
+    quilter = Quilter(rng)
+
+    # the quilter picks its blocks from the global numpy generator
+    np.random.seed(seed)
+
+    tiles = np.empty(
+        (tile_count, tile_height_px, tile_width_px, 3),
+        dtype=np.uint8
+    )
+    for i in tqdm.tqdm(range(tile_count), desc="Quilting " + name):
+        patch = rng.choice(patches)
+        source_texture = bundle.load_bitmap_for_patch(patch)
+        source_texture = cv2.resize(
+            source_texture, None,
+            fx=dpi / patch.dpi, fy=dpi / patch.dpi,
+            interpolation=cv2.INTER_AREA
+        )
+        texture = quilter.quilt_texture_to_dimensions(
+            source_texture=source_texture,
+            target_width_px=tile_width_px,
+            target_height_px=tile_height_px
+        )
+        tiles[i] = texture[:tile_height_px, :tile_width_px, :3]
+
+    PaperTextureBank(tiles, dpi, seed).save(folder, name)
+
+
+# .venv/bin/python3 -m app.synthesis.build_paper_texture_bank
+if __name__ == "__main__":
+    from ..config import PAPER_TEXTURE_BANKS_FOLDER
+    from .ModelC import ModelC
+    from .ModelM import ModelM
+    for model_class in [ModelM, ModelC]:
+        build_paper_texture_bank(
+            folder=PAPER_TEXTURE_BANKS_FOLDER,
+            name=model_class.PAPER_TEXTURE_BANK,
+            dpi=model_class.RENDER_PROFILE.paper_dpi,
+            tile_width_px=model_class.PAPER_TILE_SIZE[0],
+            tile_height_px=model_class.PAPER_TILE_SIZE[1]
+        )
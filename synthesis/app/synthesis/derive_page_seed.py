@@ -0,0 +1,11 @@
+import hashlib
+
+
+def derive_page_seed(seed: int, page_identifier: str) -> int:
+    """Derives the seed of the random generators used to render a page
+    from the master seed and the page identifier, so that the rendering
+    of a page does not depend on the pages rendered before it"""
+    digest = hashlib.sha256(
+        f"{seed}/render/{page_identifier}".encode("utf-8")
+    ).digest()
+    return int.from_bytes(digest[:8], "big")
@@ -0,0 +1,49 @@
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+import smashcima as sc
+
+
+# sprites this close to the target DPI are kept as they are
+DPI_TOLERANCE = 0.05
+
+
+def downscale_sprites(root_space: sc.AffineSpace, dpi: float) -> int:
+    """Resamples the bitmaps of the sprites with a higher DPI down to the
+    given DPI (with area interpolation), so that the renderer converts
+    and warps bitmaps of about the output resolution, instead of those
+    of the glyph assets. Sprites that share a bitmap share the downscaled
+    one as well. Returns the number of downscaled sprites."""
+    # the original bitmaps are kept alive, so that their ids stay unique
+    downscaled: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+    count = 0
+    for sprite, _ in sc.Sprite.traverse_sprites(root_space):
+        if sprite.dpi <= dpi * (1 + DPI_TOLERANCE):
+            continue
+        bitmap = sprite.bitmap
+        if id(bitmap) not in downscaled:
+            downscaled[id(bitmap)] = (
+                bitmap, _downscale_bitmap(bitmap, dpi / sprite.dpi)
+            )
+        _, small_bitmap = downscaled[id(bitmap)]
+
+        # the DPI keeps the physical size along the longer side exact,
+        # the shorter side may differ by rounding to whole pixels
+        if bitmap.shape[1] >= bitmap.shape[0]:
+            sprite.dpi *= small_bitmap.shape[1] / bitmap.shape[1]
+        else:
+            sprite.dpi *= small_bitmap.shape[0] / bitmap.shape[0]
+        sprite.bitmap = small_bitmap
+        count += 1
+    return count
+
+
+def _downscale_bitmap(bitmap: np.ndarray, factor: float) -> np.ndarray:
+    """Resizes a BGRA bitmap, in the premultiplied form, so that
+    the color of transparent pixels does not bleed into the edges"""
+    height, width = bitmap.shape[:2]
+    size = (max(1, round(width * factor)), max(1, round(height * factor)))
+    premultiplied = cv2.cvtColor(bitmap, cv2.COLOR_RGBA2mRGBA)
+    resized = cv2.resize(premultiplied, size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(resized, cv2.COLOR_mRGBA2RGBA)
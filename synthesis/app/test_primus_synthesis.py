@@ -22,7 +22,8 @@ class TestModel(sc.orchestration.BaseHandwrittenModel):
 def test_primus_synthesis(
     primus_tgz_path: Path,
     tmp_folder: Path,
-    problematic_xml_folder: Path
+    problematic_xml_folder: Path,
+    musescore_cache_folder: Path
 ):
     """Goes through the primus dataset and tries synthesizing each incipit,
     logging those that fail and their corresponding exceptions"""
@@ -34,7 +35,9 @@ def test_primus_synthesis(
     primus_musicxml_iterator = start_primus_musicxml_iterator(
         primus_tgz_path=primus_tgz_path,
         tmp_folder=tmp_folder,
-        musescore_batch_size=10
+        musescore_batch_size=10,
+        musescore_cache_folder=musescore_cache_folder,
+        auto_tune_batch_size=True
     )
 
     model = TestModel()
@@ -71,10 +74,12 @@ def test_primus_synthesis(
 
 # .venv/bin/python3 -m app.test_primus_synthesis
 if __name__ == "__main__":
-    from .config import DATA_FOLDER, PRIMUS_TGZ_PATH, TMP_FOLDER
+    from .config import (DATA_FOLDER, MUSESCORE_CACHE_FOLDER, PRIMUS_TGZ_PATH,
+                         TMP_FOLDER)
     test_primus_synthesis(
         primus_tgz_path=PRIMUS_TGZ_PATH,
         tmp_folder=TMP_FOLDER,
-        problematic_xml_folder=DATA_FOLDER / "primus_problematic"
+        problematic_xml_folder=DATA_FOLDER / "primus_problematic",
+        musescore_cache_folder=MUSESCORE_CACHE_FOLDER
     )
 
@@ -1,12 +1,22 @@
 from smashcima.assets.download_file import download_file
 from pathlib import Path
+from typing import Optional
 import tarfile
 import json
 import cv2
 
+from .kern.KernVocabulary import KernVocabulary
+from .kern.tokenize_skern import tokenize_skern
+from .output.LabelArrays import LabelArrays
 
-def unpack_fmt_dataset(fmt_tgz_path: Path, fmt_folder: Path):
-    """Goes through the fmt.tgz file and downloads the referenced images"""
+
+def unpack_fmt_dataset(
+    fmt_tgz_path: Path,
+    fmt_folder: Path,
+    vocabulary_path: Optional[Path] = None
+):
+    """Goes through the fmt.tgz file and downloads the referenced images,
+    given a vocabulary path, also encodes the staff labels"""
 
     fmt_folder.mkdir(exist_ok=True)
 
@@ -34,6 +44,9 @@ def unpack_fmt_dataset(fmt_tgz_path: Path, fmt_folder: Path):
                 json_metadata = json.load(f)
                 unpack_page(json_metadata, fmt_folder)
 
+    if vocabulary_path is not None:
+        encode_staff_labels(fmt_folder, vocabulary_path)
+
 
 def get_partition(metadata: dict) -> str:
     """Returns 'C' or 'M' based on the FMT dataset partition name."""
@@ -133,10 +146,39 @@ def extract_staves(metadata: dict, fmt_folder: Path, jpg_path: Path):
         cv2.imwrite(str(output_jpg_path), staff_img)
 
 
-# .venv/bin/python3 unpack_fmt_dataset.py
+def encode_staff_labels(fmt_folder: Path, vocabulary_path: Path):
+    """Encodes the kern of the extracted staves of each partition into
+    label arrays (e.g. FMT/M/staves/staves.labels.npy), with the same
+    tokenization and vocabulary as the synthetic data"""
+    vocabulary = KernVocabulary.load_or_create(vocabulary_path)
+    encoded = {}
+    for partition in ["M", "C"]:
+        staves_folder = fmt_folder / partition / "staves"
+        krn_paths = sorted((staves_folder / "krn").glob("*.krn"))
+        encoded[partition] = (
+            [str(path.relative_to(staves_folder)) for path in krn_paths],
+            [
+                vocabulary.encode(
+                    tokenize_skern(path.read_text()),
+                    extend=True
+                )
+                for path in krn_paths
+            ]
+        )
+
+    # the vocabulary is saved before the labels that use its new tokens
+    vocabulary.save(vocabulary_path)
+    for partition, (keys, sequences) in encoded.items():
+        LabelArrays.from_sequences(
+            keys, sequences, vocabulary.version
+        ).save(fmt_folder / partition / "staves", "staves")
+
+
+# .venv/bin/python3 -m app.unpack_fmt_dataset
 if __name__ == "__main__":
-    data_folder = (Path(__file__).parent / ".." / "data").resolve()
+    from .config import DATA_FOLDER, SKERN_VOCABULARY_PATH
     unpack_fmt_dataset(
-        fmt_tgz_path=data_folder / "fmt.tgz",
-        fmt_folder=data_folder / "FMT"
+        fmt_tgz_path=DATA_FOLDER / "fmt.tgz",
+        fmt_folder=DATA_FOLDER / "FMT",
+        vocabulary_path=SKERN_VOCABULARY_PATH
     )